@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+"""
+Wall time and peak memory of the onnx.GraphProto fast path
+and the onnx_graphsurgeon path of snd4onnx.remove().
+
+    python benchmarks/benchmark_fast_path.py --num_nodes 20000 --weight_elements 65536
+
+Each measurement runs in a fresh process so that ru_maxrss is the peak RSS of that run alone.
+"""
+
+import io
+import os
+import time
+import tempfile
+import resource
+import contextlib
+import multiprocessing
+from argparse import ArgumentParser
+from typing import List, Tuple
+import onnx
+from graph_generators import make_chain_model
+
+TEST_MODEL_REMOVALS = [
+    ('test1.onnx', ['PartitionedCall:0__10']),
+    ('test3.onnx', ['model/tf.math.multiply/Mul']),
+    ('test6.onnx', ['model/tf.math.multiply/Mul']),
+    ('test7.onnx', ['Identity']),
+    ('test8.onnx', ['Identity']),
+    ('test9.onnx', ['Identity']),
+]
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is reset by exec, ru_maxrss is inherited from the parent process on Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(
+    input_onnx_file_path: str,
+    output_onnx_file_path: str,
+    remove_node_names: List[str],
+    disable_fast_path: bool,
+) -> Tuple[float, float]:
+    from snd4onnx import remove
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        remove(
+            remove_node_names=remove_node_names,
+            input_onnx_file_path=input_onnx_file_path,
+            output_onnx_file_path=output_onnx_file_path,
+            non_verbose=True,
+            disable_fast_path=disable_fast_path,
+            shape_inference='none',
+        )
+    elapsed = time.perf_counter() - start
+    return elapsed, _peak_rss_mb()
+
+
+def measure(
+    input_onnx_file_path: str,
+    remove_node_names: List[str],
+    disable_fast_path: bool,
+    output_dir: str,
+) -> Tuple[float, float]:
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(
+            _run,
+            (
+                input_onnx_file_path,
+                os.path.join(output_dir, 'output.onnx'),
+                remove_node_names,
+                disable_fast_path,
+            ),
+        )
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        '--num_nodes',
+        type=int,
+        default=20000,
+        help='Number of nodes of the generated model.'
+    )
+    parser.add_argument(
+        '--weight_elements',
+        type=int,
+        default=16384,
+        help='Number of float32 elements of each Add weight of the generated model.'
+    )
+    parser.add_argument(
+        '--num_removals',
+        type=int,
+        default=300,
+        help='Number of Identity nodes removed from the generated model.'
+    )
+    args = parser.parse_args()
+
+    test_model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_model')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cases = []
+        for file_name, remove_node_names in TEST_MODEL_REMOVALS:
+            cases.append((file_name, os.path.join(test_model_dir, file_name), remove_node_names))
+
+        model, identity_names = make_chain_model(args.num_nodes, weight_elements=args.weight_elements)
+        step = max(1, len(identity_names) // args.num_removals)
+        synthetic_path = os.path.join(tmp_dir, 'synthetic.onnx')
+        onnx.save(model, synthetic_path)
+        del model
+        cases.append(
+            (
+                f'synthetic({args.num_nodes} nodes, {os.path.getsize(synthetic_path) / 1024 / 1024:.0f}MB)',
+                synthetic_path,
+                identity_names[::step][:args.num_removals],
+            )
+        )
+
+        print(f'{"model":>36} {"path":>14} {"seconds":>10} {"peak RSS MB":>12}')
+        for label, path, remove_node_names in cases:
+            for path_label, disable_fast_path in (('graphsurgeon', True), ('fast path', False)):
+                elapsed, peak_rss_mb = measure(path, remove_node_names, disable_fast_path, tmp_dir)
+                print(f'{label:>36} {path_label:>14} {elapsed:>10.3f} {peak_rss_mb:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+"""
+Synthetic large-graph benchmark for snd4onnx.remove().
+
+    python benchmarks/benchmark_remove.py --num_nodes 5000 20000 50000 --num_removals 300 --num_branches 500
+
+The same OPs are deleted with the fast path and with the onnx_graphsurgeon path of remove(),
+and for comparison with the remove() the index replaced (baseline_remove.py),
+which rewires the OPs one after another on the gs.Graph.
+"""
+
+import io
+import sys
+import time
+import contextlib
+from argparse import ArgumentParser
+from typing import Callable, List
+import onnx
+from snd4onnx import remove
+from baseline_remove import remove as baseline_remove
+from graph_generators import make_chain_model
+
+
+def time_remove(
+    remove_function: Callable,
+    model: onnx.ModelProto,
+    remove_node_names: List[str],
+    repeat: int,
+    **kwargs,
+) -> float:
+    """
+    Best time of deleting remove_node_names from model with remove_function.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            remove_function(
+                remove_node_names=remove_node_names,
+                onnx_graph=model,
+                non_verbose=True,
+                **kwargs,
+            )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        '--num_nodes',
+        type=int,
+        nargs='+',
+        default=[5000, 20000, 50000],
+        help='Number of nodes of the generated graphs.'
+    )
+    parser.add_argument(
+        '--num_removals',
+        type=int,
+        default=300,
+        help='Number of Identity nodes removed from each graph.'
+    )
+    parser.add_argument(
+        '--num_branches',
+        type=int,
+        default=500,
+        help='Number of independent chains, i.e. number of graph inputs and graph outputs.'
+    )
+    parser.add_argument(
+        '--cleanup_once',
+        action='store_true',
+        help='Pass cleanup_once=True to remove(). The baseline always cleans up three times.'
+    )
+    parser.add_argument(
+        '--shape_inference',
+        type=str,
+        default='full',
+        choices=['none', 'local', 'full'],
+        help='shape_inference mode passed to remove(). The baseline always runs the full shape inference.'
+    )
+    parser.add_argument(
+        '--skip_baseline',
+        action='store_true',
+        help='Do not time the baseline remove(), which takes much longer on large graphs.'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='Number of timed runs per graph. The best time is reported.'
+    )
+    args = parser.parse_args()
+
+    print(
+        f'{"nodes":>10} {"removals":>10} {"fast path [s]":>14} {"us/node":>10} '+
+        f'{"graphsurgeon [s]":>17} {"us/node":>10} {"baseline [s]":>13} {"speedup fast/gs":>17}'
+    )
+    for num_nodes in args.num_nodes:
+        model, identity_names = make_chain_model(num_nodes, args.num_branches)
+        step = max(1, len(identity_names) // args.num_removals)
+        remove_node_names = identity_names[::step][:args.num_removals]
+        kwargs = dict(
+            cleanup_once=args.cleanup_once,
+            shape_inference=args.shape_inference,
+        )
+        graph_nodes = len(model.graph.node)
+        fast_path = time_remove(remove, model, remove_node_names, args.repeat, **kwargs)
+        graphsurgeon = time_remove(remove, model, remove_node_names, args.repeat, disable_fast_path=True, **kwargs)
+        line = \
+            f'{graph_nodes:>10} {len(remove_node_names):>10} '+\
+            f'{fast_path:>14.3f} {fast_path / graph_nodes * 1e6:>10.2f} '+\
+            f'{graphsurgeon:>17.3f} {graphsurgeon / graph_nodes * 1e6:>10.2f}'
+        if not args.skip_baseline:
+            baseline = time_remove(baseline_remove, model, remove_node_names, args.repeat)
+            line += f' {baseline:>13.3f} {baseline / fast_path:>7.1f}x {baseline / graphsurgeon:>7.1f}x'
+        print(line)
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+"""
+Startup time of snd4onnx, and the cost of converting small models one process per file
+compared with a single server process (snd4onnx -srv).
+
+    python benchmarks/benchmark_startup.py --num_requests 20
+
+Measured with the installed or checked out snd4onnx, in fresh processes:
+- python -c "import snd4onnx"
+- python -m snd4onnx -h
+- python -c "import onnx, onnx_graphsurgeon" (for reference)
+- num_requests runs of python -m snd4onnx -if ... -of ...
+- python -m snd4onnx -srv with num_requests requests on stdin
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+from typing import List
+
+TEST_MODEL_REMOVAL = ('test1.onnx', ['PartitionedCall:0__10'])
+
+
+def _run(
+    args: List[str],
+    stdin: str = None,
+) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable] + args,
+        input=stdin,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def _best(
+    args: List[str],
+    repeat: int,
+) -> float:
+    return min(_run(args) for _ in range(repeat))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        '--num_requests',
+        type=int,
+        default=20,
+        help='Number of conversions in the one process per file and server measurements.'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of runs of the startup measurements. The fastest run is reported.'
+    )
+    args = parser.parse_args()
+
+    print(f'{"case":<40} {"wall time [sec]":>16}')
+    for name, command in [
+        ('import snd4onnx', ['-c', 'import snd4onnx']),
+        ('snd4onnx -h', ['-m', 'snd4onnx', '-h']),
+        ('import onnx, onnx_graphsurgeon', ['-c', 'import onnx, onnx_graphsurgeon']),
+    ]:
+        print(f'{name:<40} {_best(command, args.repeat):>16.3f}')
+
+    test_model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_model')
+    file_name, remove_node_names = TEST_MODEL_REMOVAL
+    input_onnx_file_path = os.path.join(test_model_dir, file_name)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_onnx_file_paths = [
+            os.path.join(tmp_dir, f'{idx}.onnx') for idx in range(args.num_requests)
+        ]
+
+        process_per_file = sum(
+            _run(
+                [
+                    '-m', 'snd4onnx',
+                    '-if', input_onnx_file_path,
+                    '-of', output_onnx_file_path,
+                    '-rn', *remove_node_names,
+                    '-n',
+                ]
+            ) for output_onnx_file_path in output_onnx_file_paths
+        )
+        print(f'{f"{args.num_requests} x snd4onnx -if -of":<40} {process_per_file:>16.3f}')
+
+        requests = ''.join(
+            json.dumps(
+                {
+                    'id': idx,
+                    'input_onnx_file_path': input_onnx_file_path,
+                    'output_onnx_file_path': output_onnx_file_path,
+                    'remove_node_names': remove_node_names,
+                    'non_verbose': True,
+                }
+            ) + '\n' for idx, output_onnx_file_path in enumerate(output_onnx_file_paths)
+        )
+        server = _run(['-m', 'snd4onnx', '-srv'], stdin=requests)
+        print(f'{f"snd4onnx -srv, {args.num_requests} requests":<40} {server:>16.3f}')
+
+
+if __name__ == '__main__':
+    main()
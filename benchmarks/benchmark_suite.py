@@ -0,0 +1,367 @@
+#! /usr/bin/env python
+"""
+Benchmark suite of snd4onnx.remove() on generated large graphs, CPU only.
+
+    python benchmarks/benchmark_suite.py --output results.json
+    python benchmarks/benchmark_suite.py --num_nodes 10000 100000 500000 --num_removals 1 100 1000
+    python benchmarks/benchmark_suite.py --num_nodes 10000 --paths fast_path graphsurgeon
+    python benchmarks/benchmark_suite.py --baseline results.json --tolerance 0.3
+
+Graphs are generated with onnx.helper, no framework is needed:
+- deep_chain: a single chain of Relu and Identity OPs.
+- fan_out: one tensor consumed by many Relu -> Identity -> Relu branches, summed in groups of 32.
+- many_io: many short chains, each with its own graph input and graph output.
+- large_initializers: a chain of Add OPs with their own float32 weights, and Identity OPs.
+
+For every graph, number of removals and path (fast path / onnx_graphsurgeon),
+the end to end time of remove() from input file to output file is measured (best of --repeat),
+followed by one run with profile=True for the time of each phase.
+Phase times include the overhead of tracemalloc, compare them with each other, not with the end to end time.
+
+The results are written as JSON with --output. With --baseline, every case is compared
+with the same case of an earlier result file, and the exit code is 1 if any case is
+slower than the baseline by more than --tolerance and by more than --min_slowdown seconds.
+Cases that take less than a second vary by tens of percent from run to run,
+so a single run above the tolerance is not reported without the absolute slowdown.
+"""
+
+import io
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import tempfile
+import contextlib
+from argparse import ArgumentParser
+from typing import Callable, Dict, List, Tuple
+import onnx
+from onnx import helper, TensorProto
+import snd4onnx
+from snd4onnx import remove
+from graph_generators import OPSET, make_chain_model
+
+
+def make_deep_chain(
+    num_nodes: int,
+    weight_elements: int,
+) -> Tuple[onnx.ModelProto, List[str]]:
+    """
+    A single chain of Relu and Identity OPs.
+    """
+    return make_chain_model(num_nodes, graph_name='deep_chain')
+
+
+def make_fan_out(
+    num_nodes: int,
+    weight_elements: int,
+) -> Tuple[onnx.ModelProto, List[str]]:
+    """
+    One Relu whose output is consumed by num_nodes / 3 Relu -> Identity -> Relu branches,
+    summed in groups of 32 into the graph outputs.
+    Returns the model and the names of the removable Identity OPs.
+    """
+    group_size = 32
+    num_branches = max(1, (num_nodes - 1) * group_size // (3 * group_size + 1))
+    nodes = [helper.make_node('Relu', ['input'], ['hub'], name='hub')]
+    outputs = []
+    identity_names = []
+    branch_names = []
+    for b in range(num_branches):
+        head_name = f'b{b}/head'
+        identity_name = f'b{b}/identity'
+        relu_name = f'b{b}/relu'
+        nodes.append(helper.make_node('Relu', ['hub'], [head_name], name=head_name))
+        nodes.append(helper.make_node('Identity', [head_name], [identity_name], name=identity_name))
+        nodes.append(helper.make_node('Relu', [identity_name], [relu_name], name=relu_name))
+        identity_names.append(identity_name)
+        branch_names.append(relu_name)
+    for g in range(0, len(branch_names), group_size):
+        sum_name = f'sum{g // group_size}'
+        nodes.append(helper.make_node('Sum', branch_names[g:g + group_size], [sum_name], name=sum_name))
+        outputs.append(helper.make_tensor_value_info(sum_name, TensorProto.FLOAT, [1, 8]))
+    graph = helper.make_graph(
+        nodes,
+        'fan_out',
+        [helper.make_tensor_value_info('input', TensorProto.FLOAT, [1, 8])],
+        outputs,
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', OPSET)]), identity_names
+
+
+def make_many_io(
+    num_nodes: int,
+    weight_elements: int,
+) -> Tuple[onnx.ModelProto, List[str]]:
+    """
+    num_nodes / 4 chains of Relu -> Identity -> Relu -> Identity,
+    each with its own graph input and graph output.
+    """
+    return make_chain_model(num_nodes, num_branches=max(1, num_nodes // 4), graph_name='many_io')
+
+
+def make_large_initializers(
+    num_nodes: int,
+    weight_elements: int,
+) -> Tuple[onnx.ModelProto, List[str]]:
+    """
+    A single chain of Add OPs, each with its own float32 weight of weight_elements elements,
+    and Identity OPs.
+    """
+    return make_chain_model(num_nodes, weight_elements=weight_elements, graph_name='large_initializers')
+
+
+GRAPH_GENERATORS: Dict[str, Callable[[int, int], Tuple[onnx.ModelProto, List[str]]]] = {
+    'deep_chain': make_deep_chain,
+    'fan_out': make_fan_out,
+    'many_io': make_many_io,
+    'large_initializers': make_large_initializers,
+}
+
+PATHS = {
+    'fast_path': False,
+    'graphsurgeon': True,
+}
+
+
+def _spread(
+    names: List[str],
+    count: int,
+) -> List[str]:
+    # count names spread evenly over the graph
+    if count >= len(names):
+        return list(names)
+    step = len(names) / count
+    return [names[int(i * step)] for i in range(count)]
+
+
+def measure(
+    input_onnx_file_path: str,
+    output_onnx_file_path: str,
+    remove_node_names: List[str],
+    disable_fast_path: bool,
+    shape_inference: str,
+    repeat: int,
+) -> Dict:
+    kwargs = dict(
+        remove_node_names=remove_node_names,
+        input_onnx_file_path=input_onnx_file_path,
+        output_onnx_file_path=output_onnx_file_path,
+        non_verbose=True,
+        disable_fast_path=disable_fast_path,
+        shape_inference=shape_inference,
+    )
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            remove(**kwargs)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, remove_profile = remove(profile=True, **kwargs)
+    # A phase can be entered more than once, e.g. index before and after import_graph
+    phases = {}
+    for phase in remove_profile.phases:
+        totals = phases.setdefault(phase.name, {'seconds': 0.0, 'peak_memory_bytes': 0})
+        totals['seconds'] += phase.wall_time_sec
+        totals['peak_memory_bytes'] = max(totals['peak_memory_bytes'], phase.peak_memory_bytes or 0)
+    return {
+        'seconds': best,
+        'fast_path': remove_profile.fast_path,
+        'nodes_before': remove_profile.nodes_before,
+        'nodes_after': remove_profile.nodes_after,
+        'output_bytes': os.path.getsize(output_onnx_file_path),
+        'phases': phases,
+    }
+
+
+def case_key(
+    result: Dict,
+) -> Tuple:
+    return (result['graph'], result['num_nodes'], result['num_removals'], result['path'])
+
+
+def compare_with_baseline(
+    results: List[Dict],
+    baseline_results: List[Dict],
+    tolerance: float,
+    min_slowdown: float,
+) -> bool:
+    """
+    Print the time of each case relative to the baseline.
+    Returns False if any case is slower than the baseline by more than tolerance
+    and by more than min_slowdown seconds.
+    """
+    baseline_by_key = {case_key(result): result for result in baseline_results}
+    passed = True
+    print()
+    print(f'{"graph":<20} {"nodes":>8} {"removals":>9} {"path":<13} {"baseline":>10} {"seconds":>10} {"ratio":>7}')
+    for result in results:
+        baseline = baseline_by_key.get(case_key(result), None)
+        if baseline is None:
+            continue
+        ratio = result['seconds'] / baseline['seconds'] if baseline['seconds'] > 0 else float('inf')
+        regressed = ratio > 1.0 + tolerance and result['seconds'] - baseline['seconds'] > min_slowdown
+        passed = passed and not regressed
+        print(
+            f'{result["graph"]:<20} {result["num_nodes"]:>8} {result["num_removals"]:>9} {result["path"]:<13} '+
+            f'{baseline["seconds"]:>10.3f} {result["seconds"]:>10.3f} {ratio:>7.2f}'+
+            (' REGRESSION' if regressed else '')
+        )
+    return passed
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        '--graphs',
+        type=str,
+        nargs='+',
+        default=list(GRAPH_GENERATORS),
+        choices=list(GRAPH_GENERATORS),
+        help='Kinds of generated graphs.'
+    )
+    parser.add_argument(
+        '--num_nodes',
+        type=int,
+        nargs='+',
+        default=[10000, 100000],
+        help='Approximate number of OPs of the generated graphs, e.g. 10000 100000 500000.'
+    )
+    parser.add_argument(
+        '--num_removals',
+        type=int,
+        nargs='+',
+        default=[1, 100, 1000],
+        help='Numbers of Identity OPs removed from each graph, spread evenly over the graph.'
+    )
+    parser.add_argument(
+        '--paths',
+        type=str,
+        nargs='+',
+        default=['fast_path'],
+        choices=list(PATHS),
+        help=\
+            'fast_path: default remove(). graphsurgeon: remove(disable_fast_path=True). '+
+            'The graphsurgeon path takes minutes on the larger graphs.'
+    )
+    parser.add_argument(
+        '--weight_elements',
+        type=int,
+        default=4096,
+        help='Number of float32 elements of each weight of the large_initializers graphs.'
+    )
+    parser.add_argument(
+        '--shape_inference',
+        type=str,
+        default='full',
+        choices=['none', 'local', 'full'],
+        help='shape_inference mode passed to remove().'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Number of timed runs per case. The best time is reported.'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Path of the JSON file the results are written to.'
+    )
+    parser.add_argument(
+        '--baseline',
+        type=str,
+        help='Path of a JSON file written by an earlier run with --output to compare with.'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.3,
+        help='Allowed slowdown relative to --baseline, e.g. 0.3 for 30%%.'
+    )
+    parser.add_argument(
+        '--min_slowdown',
+        type=float,
+        default=0.05,
+        help='Slowdowns relative to --baseline of this many seconds or less are never reported as regressions.'
+    )
+    args = parser.parse_args()
+
+    results = []
+    print(
+        f'{"graph":<20} {"nodes":>8} {"removals":>9} {"path":<13} {"seconds":>10} {"us/node":>9}  '+
+        'slowest phases (profiled)'
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_onnx_file_path = os.path.join(tmp_dir, 'input.onnx')
+        output_onnx_file_path = os.path.join(tmp_dir, 'output.onnx')
+        for graph_kind in args.graphs:
+            for num_nodes in args.num_nodes:
+                model, identity_names = GRAPH_GENERATORS[graph_kind](num_nodes, args.weight_elements)
+                onnx.save(model, input_onnx_file_path)
+                actual_num_nodes = len(model.graph.node)
+                del model
+                for num_removals in args.num_removals:
+                    remove_node_names = _spread(identity_names, num_removals)
+                    for path in args.paths:
+                        result = {
+                            'graph': graph_kind,
+                            'num_nodes': actual_num_nodes,
+                            'num_removals': len(remove_node_names),
+                            'path': path,
+                            'input_bytes': os.path.getsize(input_onnx_file_path),
+                        }
+                        result.update(
+                            measure(
+                                input_onnx_file_path=input_onnx_file_path,
+                                output_onnx_file_path=output_onnx_file_path,
+                                remove_node_names=remove_node_names,
+                                disable_fast_path=PATHS[path],
+                                shape_inference=args.shape_inference,
+                                repeat=args.repeat,
+                            )
+                        )
+                        results.append(result)
+                        slowest_phases = sorted(
+                            result['phases'].items(), key=lambda item: item[1]['seconds'], reverse=True,
+                        )[:3]
+                        print(
+                            f'{graph_kind:<20} {actual_num_nodes:>8} {len(remove_node_names):>9} {path:<13} '+
+                            f'{result["seconds"]:>10.3f} {result["seconds"] / actual_num_nodes * 1e6:>9.2f}  '+
+                            ', '.join(f'{name} {phase["seconds"]:.3f}' for name, phase in slowest_phases)
+                        )
+                        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {
+                    'snd4onnx': snd4onnx.__version__,
+                    'onnx': onnx.__version__,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'cpu_count': os.cpu_count(),
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'shape_inference': args.shape_inference,
+                    'repeat': args.repeat,
+                    'results': results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare_with_baseline(results, baseline['results'], args.tolerance, args.min_slowdown):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
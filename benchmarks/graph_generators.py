@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+"""
+Graphs generated with onnx.helper for the benchmarks.
+"""
+
+from typing import List, Tuple
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+OPSET = 13
+
+
+def make_chain_model(
+    num_nodes: int,
+    num_branches: int = 1,
+    weight_elements: int = 0,
+    graph_name: str = 'chain',
+) -> Tuple[onnx.ModelProto, List[str]]:
+    """
+    num_branches independent chains of num_nodes / num_branches OPs, each with its own graph input and output.
+    Every other OP is an Identity that can be removed, the others are Relu,
+    or Add with its own float32 weight of weight_elements elements if weight_elements is 1 or more.
+    Returns the model and the names of the removable Identity OPs (all but the last OP of each chain).
+    """
+    shape = [weight_elements] if weight_elements > 0 else [1, 8]
+    nodes = []
+    inputs = []
+    outputs = []
+    initializers = []
+    identity_names = []
+    chain_length = max(2, num_nodes // num_branches)
+    for b in range(num_branches):
+        prev = f'input_{b}'
+        inputs.append(helper.make_tensor_value_info(prev, TensorProto.FLOAT, shape))
+        for n in range(chain_length):
+            name = f'b{b}/n{n}'
+            if n % 2 == 1:
+                nodes.append(helper.make_node('Identity', [prev], [name], name=name))
+                if n < chain_length - 1:
+                    identity_names.append(name)
+            elif weight_elements > 0:
+                weight_name = f'{name}/w'
+                initializers.append(
+                    numpy_helper.from_array(np.full([weight_elements], n, dtype=np.float32), weight_name)
+                )
+                nodes.append(helper.make_node('Add', [prev, weight_name], [name], name=name))
+            else:
+                nodes.append(helper.make_node('Relu', [prev], [name], name=name))
+            prev = name
+        outputs.append(helper.make_tensor_value_info(prev, TensorProto.FLOAT, shape))
+    graph = helper.make_graph(nodes, graph_name, inputs, outputs, initializer=initializers)
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', OPSET)]), identity_names
@@ -26,7 +26,7 @@ setup(
     license="MIT License",
     packages=find_packages(),
     platforms=["linux", "unix"],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     entry_points={
         'console_scripts': [
             "snd4onnx=snd4onnx:main"
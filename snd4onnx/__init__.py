@@ -1,3 +1,39 @@
-from snd4onnx.onnx_remove_node import remove, main
+from snd4onnx.cli import main
+from snd4onnx.exceptions import (
+    SndError,
+    InvalidArgumentError,
+    ModelFileNotFound,
+    NodeNotFound,
+    NodeCountError,
+    ReconnectError,
+)
 
 __version__ = '1.1.6'
+
+# Modules that import onnx and onnx_graphsurgeon are loaded on first access,
+# so that importing snd4onnx and running snd4onnx -h stay fast.
+_LAZY_ATTRIBUTES = {
+    'remove': 'snd4onnx.onnx_remove_node',
+    'remove_batch': 'snd4onnx.batch',
+    'ModelCache': 'snd4onnx.model_cache',
+    'RemoveProfile': 'snd4onnx.profiling',
+    'PhaseProfile': 'snd4onnx.profiling',
+    'VerificationReport': 'snd4onnx.verification',
+    'RemovalDiff': 'snd4onnx.removal_diff',
+    'verify_models': 'snd4onnx.verification',
+    'SHAPE_PRESERVING_OP_TYPES': 'snd4onnx.local_shape_inference',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name, None)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+
+import io
+import os
+import glob
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class BatchResult(NamedTuple):
+    """
+    Result of processing one file with remove_batch().
+    """
+    input_onnx_file_path: str
+    output_onnx_file_path: str
+    success: bool
+    elapsed_sec: float
+    input_bytes: int
+    error: str
+
+
+def expand_input_paths(
+    input_onnx_file_paths: Iterable[str],
+) -> List[str]:
+    """
+    Expand glob patterns (e.g. 'models/*.onnx') that were not expanded by the shell.
+    Paths without wildcards are kept as they are, duplicates are dropped.
+    """
+    expanded_paths = []
+    for input_onnx_file_path in input_onnx_file_paths:
+        if glob.has_magic(input_onnx_file_path):
+            expanded_paths.extend(sorted(glob.glob(input_onnx_file_path, recursive=True)))
+        else:
+            expanded_paths.append(input_onnx_file_path)
+    return list(dict.fromkeys(expanded_paths))
+
+
+def _remove_one(
+    input_onnx_file_path: str,
+    output_onnx_file_path: str,
+    remove_kwargs: Dict,
+) -> BatchResult:
+    """
+    Runs in a worker process. Never raises, so that one bad model does not stop the worker.
+    """
+    from snd4onnx.exceptions import SndError
+    from snd4onnx.onnx_remove_node import remove
+
+    input_bytes = os.path.getsize(input_onnx_file_path) if os.path.isfile(input_onnx_file_path) else 0
+    log = io.StringIO()
+    start = time.perf_counter()
+    success = True
+    error = ''
+    try:
+        # Warnings of concurrent workers would interleave on the console
+        with contextlib.redirect_stdout(log):
+            remove(
+                input_onnx_file_path=input_onnx_file_path,
+                output_onnx_file_path=output_onnx_file_path,
+                **remove_kwargs,
+            )
+    except SndError as ex:
+        success = False
+        error = ' '.join(str(ex).splitlines())
+    except Exception as ex:
+        success = False
+        error = f'{type(ex).__name__}: {ex}'
+    elapsed_sec = time.perf_counter() - start
+    return BatchResult(
+        input_onnx_file_path=input_onnx_file_path,
+        output_onnx_file_path=output_onnx_file_path,
+        success=success,
+        elapsed_sec=elapsed_sec,
+        input_bytes=input_bytes,
+        error=error,
+    )
+
+
+def remove_batch(
+    input_onnx_file_paths: List[str],
+    output_dir: str,
+    num_workers: Optional[int] = None,
+    **remove_kwargs,
+):
+    """
+    Apply remove() with the same arguments to many onnx files in a process pool.
+
+    Each worker imports onnx and onnx_graphsurgeon once and processes many files.
+    Failures are reported per file and never stop the other files.
+
+    Parameters
+    ----------
+    input_onnx_file_paths: List[str]
+        Input onnx file paths. Glob patterns are expanded.
+
+    output_dir: str
+        Output directory. Each output has the file name of its input.
+
+    num_workers: Optional[int]
+        Number of worker processes.\n\
+        Default: os.cpu_count()
+
+    remove_kwargs
+        Keyword arguments of remove(). They must be picklable.
+
+    Returns
+    -------
+    results: Iterator[BatchResult]
+        One result per input file, in completion order.
+    """
+    input_onnx_file_paths = expand_input_paths(input_onnx_file_paths)
+    os.makedirs(output_dir, exist_ok=True)
+    output_onnx_file_paths = [
+        os.path.join(output_dir, os.path.basename(input_onnx_file_path))
+        for input_onnx_file_path in input_onnx_file_paths
+    ]
+    if len(set(output_onnx_file_paths)) != len(output_onnx_file_paths):
+        raise ValueError(
+            'Input files with the same file name would overwrite each other in the output directory.'
+        )
+
+    num_workers = max(1, min(num_workers or os.cpu_count() or 1, len(input_onnx_file_paths) or 1))
+    if num_workers == 1:
+        for input_onnx_file_path, output_onnx_file_path in zip(input_onnx_file_paths, output_onnx_file_paths):
+            yield _remove_one(input_onnx_file_path, output_onnx_file_path, remove_kwargs)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(_remove_one, input_onnx_file_path, output_onnx_file_path, remove_kwargs)
+            for input_onnx_file_path, output_onnx_file_path in zip(input_onnx_file_paths, output_onnx_file_paths)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
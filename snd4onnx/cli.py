@@ -0,0 +1,517 @@
+#! /usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import contextlib
+from argparse import ArgumentParser
+from typing import List, Optional
+from snd4onnx.color import Color
+from snd4onnx.exceptions import SndError
+
+# onnx and onnx_graphsurgeon are imported on first use,
+# so that --help and the start of the server do not wait for them.
+
+
+def _print_error(
+    error: SndError,
+    prefix: Optional[str] = '',
+):
+    for message in str(error).splitlines():
+        print(
+            f'{Color.RED}ERROR:{Color.RESET} '+
+            f'{prefix}{message}'
+        )
+
+
+def _dry_run_main(
+    input_onnx_file_paths: List[str],
+    non_verbose: bool,
+    **remove_kwargs,
+) -> int:
+    """
+    Check all input files with remove(dry_run=True) and print every problem found.
+
+    Returns
+    -------
+    exit_code: int
+        0 if no problem was found, 1 otherwise.
+    """
+    from snd4onnx.batch import expand_input_paths
+    from snd4onnx.onnx_remove_node import remove
+
+    input_onnx_file_paths = expand_input_paths(input_onnx_file_paths)
+    exit_code = 0
+    for input_onnx_file_path in input_onnx_file_paths:
+        prefix = f'{input_onnx_file_path}: ' if len(input_onnx_file_paths) > 1 else ''
+        errors = remove(
+            input_onnx_file_path=input_onnx_file_path,
+            non_verbose=True,
+            dry_run=True,
+            **remove_kwargs,
+        )
+        for error in errors:
+            _print_error(error, prefix)
+        if errors:
+            exit_code = 1
+        elif not non_verbose:
+            print(
+                f'{Color.GREEN}INFO:{Color.RESET} '+
+                f'{prefix}No problems found.'
+            )
+    return exit_code
+
+
+def _batch_main(
+    input_onnx_file_paths: List[str],
+    output_dir: str,
+    num_workers: int,
+    non_verbose: bool,
+    **remove_kwargs,
+) -> int:
+    """
+    Convert multiple files with remove_batch() and print the result of each file and a summary.
+
+    Returns
+    -------
+    exit_code: int
+        0 if all files were converted, 1 otherwise.
+    """
+    from snd4onnx.batch import expand_input_paths, remove_batch
+
+    input_onnx_file_paths = expand_input_paths(input_onnx_file_paths)
+    if not input_onnx_file_paths:
+        print(
+            f'{Color.RED}ERROR:{Color.RESET} '+
+            f'No input onnx file matched.'
+        )
+        return 1
+
+    start = time.perf_counter()
+    num_success = 0
+    num_failure = 0
+    total_bytes = 0
+    reported_paths = set()
+    try:
+        for result in remove_batch(
+            input_onnx_file_paths=input_onnx_file_paths,
+            output_dir=output_dir,
+            num_workers=num_workers,
+            non_verbose=True,
+            **remove_kwargs,
+        ):
+            reported_paths.add(result.input_onnx_file_path)
+            total_bytes += result.input_bytes
+            if result.success:
+                num_success += 1
+                if not non_verbose:
+                    print(
+                        f'{Color.GREEN}OK:{Color.RESET} '+
+                        f'{result.input_onnx_file_path} -> {result.output_onnx_file_path} '+
+                        f'({result.elapsed_sec:.2f} sec)'
+                    )
+            else:
+                num_failure += 1
+                print(
+                    f'{Color.RED}ERROR:{Color.RESET} '+
+                    f'{result.input_onnx_file_path}: {result.error}'
+                )
+    except ValueError as ex:
+        print(
+            f'{Color.RED}ERROR:{Color.RESET} '+
+            f'{ex}'
+        )
+        return 1
+    except Exception as ex:
+        # e.g. BrokenProcessPool when a worker process was killed. No results of the other files follow.
+        print(
+            f'{Color.RED}ERROR:{Color.RESET} '+
+            f'{type(ex).__name__}: {ex}'
+        )
+        for input_onnx_file_path in input_onnx_file_paths:
+            if input_onnx_file_path not in reported_paths:
+                num_failure += 1
+                print(
+                    f'{Color.RED}ERROR:{Color.RESET} '+
+                    f'{input_onnx_file_path}: Not converted.'
+                )
+    elapsed_sec = time.perf_counter() - start
+
+    if not non_verbose or num_failure > 0:
+        print(
+            f'{Color.GREEN}INFO:{Color.RESET} '+
+            f'{num_success} succeeded, {num_failure} failed, '+
+            f'{elapsed_sec:.2f} sec, '+
+            f'{(num_success + num_failure) / elapsed_sec:.2f} files/sec, '+
+            f'{total_bytes / 1024 / 1024 / elapsed_sec:.2f} MB/sec'
+        )
+    return 0 if num_failure == 0 else 1
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        '-rn',
+        '--remove_node_names',
+        type=str,
+        nargs='+',
+        help='ONNX node name to be deleted.'
+    )
+    parser.add_argument(
+        '-rot',
+        '--remove_op_types',
+        type=str,
+        nargs='+',
+        help='ONNX op type to be deleted. All OPs of the specified op types are deleted. e.g. Identity Dropout'
+    )
+    parser.add_argument(
+        '-rnp',
+        '--remove_node_name_patterns',
+        type=str,
+        nargs='+',
+        help='Regular expression of the ONNX node names to be deleted. e.g. "/Dropout_\\d+$"'
+    )
+    parser.add_argument(
+        '-rgi',
+        '--region_input_names',
+        type=str,
+        nargs='+',
+        help=\
+            'Names of the tensors a region of OPs starts from. Used with -rgo. \n'+
+            'If not specified, the region reaches up to the graph inputs.'
+    )
+    parser.add_argument(
+        '-rgo',
+        '--region_output_names',
+        type=str,
+        nargs='+',
+        help=\
+            'Names of the tensors a region of OPs ends at. \n'+
+            'All OPs between -rgi and -rgo are deleted at once. \n'+
+            '-rgi tensors that are still produced become graph outputs, \n'+
+            'and -rgo tensors that are still read become graph inputs.'
+    )
+    parser.add_argument(
+        '-erg',
+        '--extract_region',
+        action='store_true',
+        help=\
+            'Keep only the region of OPs between -rgi and -rgo instead of deleting it. \n'+
+            '-rgi become the graph inputs and -rgo the graph outputs.'
+    )
+    parser.add_argument(
+        '-if',
+        '--input_onnx_file_path',
+        type=str,
+        nargs='+',
+        help=\
+            'Input onnx file path. Required unless -srv is specified. \n'+
+            'Multiple files or glob patterns (e.g. "models/*.onnx") can be specified together with -od.'
+    )
+    parser.add_argument(
+        '-of',
+        '--output_onnx_file_path',
+        type=str,
+        help=\
+            'Output onnx file path. Required when a single input file is specified without -od. \n'+
+            '- writes the model to stdout and the logs to stderr.'
+    )
+    parser.add_argument(
+        '-suo',
+        '--skip_unchanged_output',
+        action='store_true',
+        help='Do not write output files that already have the same content.'
+    )
+    parser.add_argument(
+        '-od',
+        '--output_dir',
+        type=str,
+        help=\
+            'Output directory. Each output file has the file name of its input file. \n'+
+            'Required when multiple input files are specified.'
+    )
+    parser.add_argument(
+        '-j',
+        '--num_workers',
+        type=int,
+        help=\
+            'Number of worker processes used to convert multiple input files, \n'+
+            'or to process the requests of -srv concurrently. \n'+
+            'Default: number of CPUs, 1 with -srv'
+    )
+    parser.add_argument(
+        '-n',
+        '--non_verbose',
+        action='store_true',
+        help='Do not show all information logs. Only error logs are displayed.'
+    )
+    parser.add_argument(
+        '-led',
+        '--load_external_data',
+        action='store_true',
+        help=\
+            'Load the weights of a model stored with external data into memory. \n'+
+            'By default they stay on disk and the output refers to the same external data files.'
+    )
+    parser.add_argument(
+        '-dfp',
+        '--disable_fast_path',
+        action='store_true',
+        help='Always convert the model with onnx_graphsurgeon instead of editing the onnx graph directly.'
+    )
+    parser.add_argument(
+        '-co',
+        '--cleanup_once',
+        action='store_true',
+        help='Run cleanup and toposort of the graph only once, after all OPs have been deleted.'
+    )
+    parser.add_argument(
+        '-prn',
+        '--prune',
+        action='store_true',
+        help=\
+            'After deletion, delete everything that does not contribute to the graph outputs \n'+
+            'and merge identical initializers.'
+    )
+    parser.add_argument(
+        '-dr',
+        '--dry_run',
+        action='store_true',
+        help=\
+            'Only check whether the OPs can be deleted and report all problems at once. \n'+
+            'No file is output and -of/-od are not required.'
+    )
+    parser.add_argument(
+        '-prf',
+        '--profile',
+        type=str,
+        nargs='?',
+        const='',
+        metavar='PROFILE_JSON_FILE_PATH',
+        help=\
+            'Measure the wall time and peak memory of each phase and the number of OPs and tensors. \n'+
+            'The report is printed, or written as JSON if a file path is specified.'
+    )
+    parser.add_argument(
+        '-df',
+        '--diff',
+        type=str,
+        nargs='?',
+        const='',
+        metavar='DIFF_JSON_FILE_PATH',
+        help=\
+            'Report what was changed: deleted OPs, reconnected edges, added and deleted graph inputs and outputs, \n'+
+            'changed shapes and deleted initializers. \n'+
+            'The report is printed, or written as JSON if a file path is specified.'
+    )
+    parser.add_argument(
+        '-vf',
+        '--verify',
+        action='store_true',
+        help=\
+            'Run the input and the generated model with onnxruntime on CPU on the same random inputs \n'+
+            'and print the max abs/rel error of each graph output that both models have. \n'+
+            'Requires onnxruntime.'
+    )
+    parser.add_argument(
+        '-vns',
+        '--verify_num_samples',
+        type=int,
+        default=8,
+        help=\
+            'Number of random inputs of -vf. \n'+
+            'Default: 8'
+    )
+    parser.add_argument(
+        '-srv',
+        '--serve',
+        type=str,
+        nargs='?',
+        const='-',
+        metavar='ADDRESS',
+        help=\
+            'Keep running and process one JSON request per line, e.g. \n'+
+            '{"input_onnx_file_path": "a.onnx", "output_onnx_file_path": "b.onnx", "remove_op_types": ["Identity"]} \n'+
+            'The keys are the keyword arguments of remove(). One JSON response is returned per line, \n'+
+            'with the elapsed time, the number of OPs before and after, the output file size or the error. \n'+
+            'Requests are read from stdin, or from connections to ADDRESS (HOST:PORT or a Unix domain socket path). \n'+
+            'With -j N, N requests are processed at once and responses are returned as they finish.'
+    )
+    parser.add_argument(
+        '-si',
+        '--shape_inference',
+        type=str,
+        default='full',
+        choices=['none', 'local', 'full'], # SHAPE_INFERENCE_MODES, without importing onnx
+        help=\
+            'Shape inference performed on the generated model. \n'+
+            'none: No shape inference. \n'+
+            'local: Only the OPs downstream of the reconnected tensors are re-inferred, \n'+
+            'until the shapes stop changing. Edges whose shapes do not fit are reported. \n'+
+            'full: Shape inference of the whole model. \n'+
+            'Default: full'
+    )
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        if args.num_workers is not None and args.num_workers < 1:
+            parser.error('-j must be 1 or more.')
+        from snd4onnx.server import serve
+        serve(
+            address=None if args.serve == '-' else args.serve,
+            num_workers=args.num_workers or 1,
+        )
+        return
+
+    if not args.input_onnx_file_path:
+        parser.error('-if is required.')
+    selects_nodes = args.remove_node_names or args.remove_op_types or args.remove_node_name_patterns
+    if not selects_nodes and not args.region_output_names:
+        parser.error('one of -rn, -rot, -rnp or -rgo is required.')
+    if selects_nodes and args.region_output_names:
+        parser.error('-rgo cannot be used with -rn, -rot or -rnp.')
+    if (args.region_input_names or args.extract_region) and not args.region_output_names:
+        parser.error('-rgi and -erg require -rgo.')
+
+    remove_node_names = args.remove_node_names
+    remove_op_types = args.remove_op_types
+    remove_node_name_patterns = args.remove_node_name_patterns
+    region_input_names = args.region_input_names
+    region_output_names = args.region_output_names
+    extract_region = args.extract_region
+    input_onnx_file_paths = args.input_onnx_file_path
+    output_onnx_file_path = args.output_onnx_file_path
+    output_dir = args.output_dir
+    num_workers = args.num_workers if args.num_workers is not None else os.cpu_count() or 1
+    non_verbose = args.non_verbose
+    cleanup_once = args.cleanup_once
+    prune = args.prune
+    shape_inference = args.shape_inference
+    load_external_data = args.load_external_data
+    disable_fast_path = args.disable_fast_path
+    dry_run = args.dry_run
+    profile = args.profile
+    diff = args.diff
+    verify = args.verify
+    verify_num_samples = args.verify_num_samples
+    skip_unchanged_output = args.skip_unchanged_output
+
+    if profile is not None and (dry_run or output_dir):
+        parser.error('-prf cannot be used with -dr or -od.')
+    if diff is not None and (dry_run or output_dir):
+        parser.error('-df cannot be used with -dr or -od.')
+    if verify and (dry_run or output_dir):
+        parser.error('-vf cannot be used with -dr or -od.')
+    if verify_num_samples < 1:
+        parser.error('-vns must be 1 or more.')
+
+    if dry_run:
+        sys.exit(
+            _dry_run_main(
+                input_onnx_file_paths=input_onnx_file_paths,
+                non_verbose=non_verbose,
+                remove_node_names=remove_node_names,
+                remove_op_types=remove_op_types,
+                remove_node_name_patterns=remove_node_name_patterns,
+                region_input_names=region_input_names,
+                region_output_names=region_output_names,
+                extract_region=extract_region,
+                shape_inference=shape_inference,
+                load_external_data=load_external_data,
+                disable_fast_path=disable_fast_path,
+            )
+        )
+
+    if output_dir:
+        if output_onnx_file_path:
+            parser.error('-of and -od cannot be specified together.')
+        if num_workers < 1:
+            parser.error('-j must be 1 or more.')
+        sys.exit(
+            _batch_main(
+                input_onnx_file_paths=input_onnx_file_paths,
+                output_dir=output_dir,
+                num_workers=num_workers,
+                non_verbose=non_verbose,
+                remove_node_names=remove_node_names,
+                remove_op_types=remove_op_types,
+                remove_node_name_patterns=remove_node_name_patterns,
+                region_input_names=region_input_names,
+                region_output_names=region_output_names,
+                extract_region=extract_region,
+                cleanup_once=cleanup_once,
+                shape_inference=shape_inference,
+                load_external_data=load_external_data,
+                disable_fast_path=disable_fast_path,
+                prune=prune,
+                skip_unchanged_output=skip_unchanged_output,
+            )
+        )
+
+    if len(input_onnx_file_paths) > 1:
+        parser.error('-od is required when multiple input files are specified.')
+    if not output_onnx_file_path:
+        parser.error('one of -of or -od is required.')
+    input_onnx_file_path = input_onnx_file_paths[0]
+
+    from snd4onnx.onnx_remove_node import remove
+    output_onnx_file_object = None
+    log_redirect = contextlib.nullcontext()
+    if output_onnx_file_path == '-':
+        # The model goes to stdout, so the logs must not
+        output_onnx_file_object = sys.stdout.buffer
+        output_onnx_file_path = ''
+        log_redirect = contextlib.redirect_stdout(sys.stderr)
+    removal_diffs = []
+    with log_redirect:
+        try:
+            onnx_graph = remove(
+                remove_node_names=remove_node_names,
+                input_onnx_file_path=input_onnx_file_path,
+                output_onnx_file_path=output_onnx_file_path,
+                output_onnx_file_object=output_onnx_file_object,
+                skip_unchanged_output=skip_unchanged_output,
+                non_verbose=non_verbose,
+                cleanup_once=cleanup_once,
+                shape_inference=shape_inference,
+                remove_op_types=remove_op_types,
+                remove_node_name_patterns=remove_node_name_patterns,
+                region_input_names=region_input_names,
+                region_output_names=region_output_names,
+                extract_region=extract_region,
+                load_external_data=load_external_data,
+                disable_fast_path=disable_fast_path,
+                prune=prune,
+                profile=profile is not None,
+                verify=verify,
+                verify_num_samples=verify_num_samples,
+                diff_callback=removal_diffs.append if diff is not None else None,
+            )
+        except SndError as ex:
+            _print_error(ex)
+            sys.exit(1)
+        except ImportError as ex:
+            # onnxruntime for -vf
+            print(
+                f'{Color.RED}ERROR:{Color.RESET} '+
+                f'{ex}'
+            )
+            sys.exit(1)
+
+        if profile is not None:
+            onnx_graph, remove_profile = onnx_graph
+            if profile:
+                with open(profile, 'w') as f:
+                    json.dump(remove_profile.to_dict(), f, indent=2)
+            else:
+                print(remove_profile.format())
+
+        if removal_diffs:
+            if diff:
+                with open(diff, 'w') as f:
+                    json.dump(removal_diffs[0].to_dict(), f, indent=2)
+            else:
+                print(removal_diffs[0].format())
+
+
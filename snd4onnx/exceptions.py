@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+
+from typing import List, Optional
+
+
+class SndError(Exception):
+    """
+    Base class of the errors raised by remove().
+
+    Attributes
+    ----------
+    message: str
+        Error message. Additional details are on the following lines.
+
+    node_names: List[str]
+        Names of the OPs the error is about.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        node_names: Optional[List[str]] = None,
+    ):
+        super().__init__(message)
+        self.message = message
+        self.node_names = list(node_names or [])
+
+
+class InvalidArgumentError(SndError):
+    """
+    The arguments of remove() are invalid.
+    """
+
+
+class ModelFileNotFound(SndError):
+    """
+    The input .onnx file does not exist or is not an onnx file.
+
+    Attributes
+    ----------
+    file_path: str
+        The specified input onnx file path.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        file_path: str,
+    ):
+        super().__init__(message)
+        self.file_path = file_path
+
+
+class NodeNotFound(SndError):
+    """
+    OP names specified in remove_node_names do not exist in the graph.
+    """
+
+
+class NodeCountError(SndError):
+    """
+    The graph has too few OPs or outputs before or after deletion.
+
+    Attributes
+    ----------
+    num_nodes: int
+        Number of OPs in the graph.
+
+    num_remove_nodes: int
+        Number of OPs to be deleted.
+
+    num_graph_outputs: int
+        Number of graph outputs.
+
+    num_remove_graph_outputs: int
+        Number of graph outputs to be deleted.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        num_nodes: int,
+        num_remove_nodes: int,
+        num_graph_outputs: int,
+        num_remove_graph_outputs: int,
+    ):
+        super().__init__(message)
+        self.num_nodes = num_nodes
+        self.num_remove_nodes = num_remove_nodes
+        self.num_graph_outputs = num_graph_outputs
+        self.num_remove_graph_outputs = num_remove_graph_outputs
+
+
+class ReconnectError(SndError):
+    """
+    The OPs before and after an OP to be deleted cannot be reconnected.
+
+    Attributes
+    ----------
+    num_remove_op_inputs: Optional[int]
+        Number of inputs (Variable) of the OP to be deleted, if the counts did not match.
+
+    num_next_op_inputs: Optional[int]
+        Number of inputs (Variable) of the next OP, if the counts did not match.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        node_names: Optional[List[str]] = None,
+        num_remove_op_inputs: Optional[int] = None,
+        num_next_op_inputs: Optional[int] = None,
+    ):
+        if num_remove_op_inputs is not None or num_next_op_inputs is not None:
+            message = \
+                f'{message}\n'+ \
+                f'Remove OP inputs: {num_remove_op_inputs}, Next OP inputs: {num_next_op_inputs}'
+        super().__init__(message, node_names)
+        self.num_remove_op_inputs = num_remove_op_inputs
+        self.num_next_op_inputs = num_next_op_inputs
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+
+import io
+import os
+import sys
+import stat
+import shutil
+import hashlib
+import tempfile
+import uuid
+from typing import IO, Callable, List, Optional, Union
+import onnx
+from onnx.external_data_helper import (
+    load_external_data_for_model,
+    set_external_data,
+    uses_external_data,
+    write_external_data_tensors,
+)
+from onnx.serialization import registry
+
+# Protocol Buffers cannot serialize a message of 2GB or more
+MAXIMUM_PROTOBUF_BYTES = 2 * 1024 * 1024 * 1024 - 1
+
+
+def _model_tensors(
+    model: onnx.ModelProto,
+) -> List[onnx.TensorProto]:
+    """
+    Initializers and tensor attributes (e.g. Constant.value) of the main graph.
+    """
+    tensors = list(model.graph.initializer)
+    for node in model.graph.node:
+        for attribute in node.attribute:
+            if attribute.type == onnx.AttributeProto.TENSOR:
+                tensors.append(attribute.t)
+    return tensors
+
+
+def external_data_locations(
+    model: onnx.ModelProto,
+) -> List[str]:
+    """
+    Relative paths of the external data files referenced by the model, without duplicates.
+    """
+    locations = []
+    for tensor in _model_tensors(model):
+        if not uses_external_data(tensor):
+            continue
+        for entry in tensor.external_data:
+            if entry.key == 'location' and entry.value not in locations:
+                locations.append(entry.value)
+    return locations
+
+
+def tensor_data_bytes(
+    tensor: onnx.TensorProto,
+) -> int:
+    """
+    Size of the data of tensor, wherever it is stored: the length recorded for external data,
+    or the size of the data held in the TensorProto, without the rest of the message.
+    """
+    if uses_external_data(tensor):
+        for entry in tensor.external_data:
+            if entry.key == 'length':
+                return int(entry.value)
+    elif tensor.raw_data:
+        return len(tensor.raw_data)
+    if tensor.data_type == onnx.TensorProto.STRING:
+        return sum(len(string_data) for string_data in tensor.string_data)
+    num_elements = 1
+    for dim in tensor.dims:
+        num_elements *= dim
+    return num_elements * onnx.helper.tensor_dtype_to_np_dtype(tensor.data_type).itemsize
+
+
+def embedded_data_bytes(
+    model: onnx.ModelProto,
+) -> int:
+    """
+    Total serialized size of the tensors held in the ModelProto itself.
+    ByteSize() is used so that the tensor data is not copied.
+    """
+    return sum(
+        tensor.ByteSize() for tensor in _model_tensors(model) if not uses_external_data(tensor)
+    )
+
+
+def _set_external_data_location(
+    model: onnx.ModelProto,
+    location: str,
+):
+    """
+    Mark the initializers of model and its subgraphs whose data is 1KB or more as external data in location,
+    as onnx.save(save_as_external_data=True) does, without its check for an existing location
+    relative to the working directory.
+    """
+    graphs = [model.graph]
+    while graphs:
+        graph = graphs.pop()
+        for initializer in graph.initializer:
+            if initializer.HasField('raw_data') and sys.getsizeof(initializer.raw_data) >= 1024:
+                set_external_data(initializer, location)
+        for node in graph.node:
+            for attribute in node.attribute:
+                if attribute.HasField('g'):
+                    graphs.append(attribute.g)
+                graphs.extend(attribute.graphs)
+
+
+def _write_atomic(
+    file_path: str,
+    write: Callable[[str], None],
+):
+    """
+    Create file_path by calling write with the path of a temporary file in the same directory,
+    which then replaces file_path in a single rename. Readers see either the old or the new file,
+    never a partially written one, and the temporary file is deleted if write fails.
+    The permissions of an existing file_path are kept.
+    """
+    file_path = os.path.abspath(file_path)
+    tmp_file_path = os.path.join(
+        os.path.dirname(file_path),
+        f'.{os.path.basename(file_path)}.{uuid.uuid4().hex}.tmp',
+    )
+    # Created as open() creates a file, so that it gets the permissions of a new file
+    # without touching the umask of the process
+    fd = os.open(tmp_file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        os.close(fd)
+        if os.path.exists(file_path):
+            os.chmod(tmp_file_path, stat.S_IMODE(os.stat(file_path).st_mode))
+        write(tmp_file_path)
+        with open(tmp_file_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_file_path):
+            os.remove(tmp_file_path)
+        raise
+
+
+def _same_content(
+    file_path: str,
+    data: bytes,
+) -> bool:
+    """
+    Whether file_path exists and its SHA-256 is that of data. Files of another size are not read.
+    """
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) != len(data):
+        return False
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+    return file_hash.digest() == hashlib.sha256(data).digest()
+
+
+def _same_files(
+    file_path: str,
+    other_file_path: str,
+) -> bool:
+    """
+    Whether both files exist and have the same bytes.
+    Files of different sizes are not read, and reading stops at the first difference.
+    """
+    if not os.path.isfile(file_path) or not os.path.isfile(other_file_path) \
+        or os.path.getsize(file_path) != os.path.getsize(other_file_path):
+        return False
+    with open(file_path, 'rb') as f, open(other_file_path, 'rb') as other_f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if chunk != other_f.read(1024 * 1024):
+                return False
+            if not chunk:
+                return True
+
+
+def _serialize(
+    model: onnx.ModelProto,
+    output_onnx_file_path: str,
+) -> bytes:
+    # As onnx.save() would write it, in the format of the file extension
+    buffer = io.BytesIO()
+    onnx.save_model(
+        model,
+        buffer,
+        format=registry.get_format_from_file_extension(os.path.splitext(output_onnx_file_path)[-1]),
+    )
+    return buffer.getvalue()
+
+
+def link_external_data(
+    model: onnx.ModelProto,
+    src_dir: str,
+    dst_dir: str,
+    skip_unchanged: Optional[bool] = False,
+) -> bool:
+    """
+    Make the external data files referenced by model available in dst_dir.
+
+    Nothing is done when src_dir and dst_dir are the same directory
+    or the file in dst_dir already is the same file, the original files are reused as they are.
+    With skip_unchanged, files in dst_dir that already have the same bytes are not copied either.
+    Otherwise the files are copied by the OS (shutil.copyfile), without going through the Python heap,
+    to a temporary file that replaces the file in dst_dir.
+    They are not hard-linked, because onnx refuses to load external data files with multiple hard links.
+
+    Returns
+    -------
+    written: bool
+        Whether any file was copied.
+    """
+    if os.path.abspath(src_dir) == os.path.abspath(dst_dir):
+        return False
+    written = False
+    for location in external_data_locations(model):
+        src_path = os.path.join(src_dir, location)
+        dst_path = os.path.join(dst_dir, location)
+        if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+            continue
+        if skip_unchanged and _same_files(src_path, dst_path):
+            continue
+        os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+        _write_atomic(dst_path, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+        written = True
+    return written
+
+
+def save_model(
+    model: onnx.ModelProto,
+    output_onnx_file_path: Union[str, IO[bytes]],
+    external_data_dir: Optional[str] = None,
+    skip_unchanged: Optional[bool] = False,
+) -> bool:
+    """
+    Save model to output_onnx_file_path.
+
+    Files are written to a temporary file in the same directory first, which then replaces
+    the output in a single rename, so that a crash never leaves a partially written output.
+
+    Parameters
+    ----------
+    model: onnx.ModelProto
+        Model to be saved.
+
+    output_onnx_file_path: Union[str, IO[bytes]]
+        Output onnx file path, or a binary file object (e.g. io.BytesIO) the serialized model is written to.\n\
+        A file object receives the model with all its weights, which must fit in a single protobuf.
+
+    external_data_dir: Optional[str]
+        Directory that the external data locations of model are relative to.\n\
+        If specified, the external data files are reused when the output is written to the same directory,
+        and copied next to the output otherwise, instead of being loaded and serialized again.\n\
+        If the model holds its weights itself and they do not fit in a single protobuf,
+        they are written to <output file name>.data.
+
+    skip_unchanged: Optional[bool]
+        Do not write the output file if it already has the same content (SHA-256),\n\
+        nor the external data files next to it that already have the same bytes.\n\
+        Default: False
+
+    Returns
+    -------
+    written: bool
+        False if nothing was written because of skip_unchanged.
+    """
+    if not isinstance(output_onnx_file_path, (str, os.PathLike)):
+        if external_data_dir is not None and external_data_locations(model):
+            # Weights that stay on disk are embedded in the copy that is written
+            embedded_model = onnx.ModelProto()
+            embedded_model.CopyFrom(model)
+            load_external_data_for_model(embedded_model, external_data_dir)
+            model = embedded_model
+        onnx.save_model(model, output_onnx_file_path)
+        return True
+
+    output_onnx_file_path = os.fspath(output_onnx_file_path)
+    output_dir = os.path.dirname(os.path.abspath(output_onnx_file_path))
+    data_written = False
+    if external_data_dir is not None and external_data_locations(model):
+        data_written = link_external_data(model, external_data_dir, output_dir, skip_unchanged=skip_unchanged)
+    elif embedded_data_bytes(model) > MAXIMUM_PROTOBUF_BYTES:
+        # Both files are written to a new directory, where onnx does not append to an existing data file,
+        # and moved next to the output, the data file first
+        file_name = os.path.basename(output_onnx_file_path)
+        tmp_dir = tempfile.mkdtemp(dir=output_dir, prefix=f'.{file_name}.')
+        try:
+            _set_external_data_location(model, f'{file_name}.data')
+            onnx.save(model, os.path.join(tmp_dir, file_name))
+            tmp_data_file_path = os.path.join(tmp_dir, f'{file_name}.data')
+            data_file_path = f'{output_onnx_file_path}.data'
+            if skip_unchanged \
+                and _same_files(os.path.join(tmp_dir, file_name), output_onnx_file_path) \
+                and (
+                    _same_files(tmp_data_file_path, data_file_path)
+                    or not os.path.exists(tmp_data_file_path) and not os.path.exists(data_file_path)
+                ):
+                return False
+            if os.path.exists(tmp_data_file_path):
+                os.replace(tmp_data_file_path, data_file_path)
+            elif os.path.exists(data_file_path):
+                os.remove(data_file_path)
+            os.replace(os.path.join(tmp_dir, file_name), output_onnx_file_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return True
+
+    # Tensors marked as external whose data is still in memory, as onnx.save() does
+    write_external_data_tensors(model, output_dir)
+    data = _serialize(model, output_onnx_file_path)
+    if skip_unchanged and _same_content(output_onnx_file_path, data):
+        return data_written
+
+    def write(tmp_file_path: str):
+        with open(tmp_file_path, 'wb') as f:
+            f.write(data)
+
+    _write_atomic(output_onnx_file_path, write)
+    return True
@@ -0,0 +1,234 @@
+#! /usr/bin/env python
+
+import onnx
+import onnx_graphsurgeon as gs
+from onnx_graphsurgeon.ir.tensor import Constant
+from typing import Callable, Dict, List, Set, Iterable, Optional, Pattern, Union
+
+
+class GraphIndex:
+    """
+    Name-based lookup tables for a gs.Graph or an onnx.GraphProto.
+
+    Built once in a single pass over the graph.
+    Nodes are referred to by their position in graph.nodes (node id)
+    and tensors by their name, so that the removal planner never has to
+    scan graph.nodes, graph.inputs or graph.outputs again.
+
+    Attributes
+    ----------
+    nodes: List[Union[gs.Node, onnx.NodeProto]]
+        Nodes of the graph in graph order.
+
+    node_ops: List[str]
+        Node id -> op type.
+
+    node_inputs: List[List[str]]
+        Node id -> input tensor names.
+
+    node_outputs: List[List[str]]
+        Node id -> output tensor names.
+
+    nodes_by_name: Dict[str, List[int]]
+        Node name -> ids of the nodes with that name, in graph order.
+
+    producers: Dict[str, int]
+        Tensor name -> id of the node that outputs the tensor.
+
+    consumers: Dict[str, List[int]]
+        Tensor name -> ids of the nodes that take the tensor as input.
+        A node that takes the same tensor twice is listed twice.
+
+    graph_input_names: List[str]
+        Names of graph.inputs.
+
+    graph_output_names: List[str]
+        Names of graph.outputs.
+
+    constant_names: Set[str]
+        Names of the constant (initializer) tensors.
+
+    typed_names: Set[str]
+        Names of the tensors whose element type is known,
+        i.e. constants and tensors described by graph inputs, outputs or value_info.
+
+    tensors: Dict[str, gs.Tensor]
+        Tensor name -> tensor. Only for gs.Graph.
+    """
+
+    def __init__(
+        self,
+        graph: Union[gs.Graph, onnx.GraphProto],
+    ):
+        if isinstance(graph, onnx.GraphProto):
+            self._init_from_graph_proto(graph)
+            return
+
+        self.nodes: List[gs.Node] = list(graph.nodes)
+        self.node_ops: List[str] = []
+        self.node_inputs: List[List[str]] = []
+        self.node_outputs: List[List[str]] = []
+        self.nodes_by_name: Dict[str, List[int]] = {}
+        self.producers: Dict[str, int] = {}
+        self.consumers: Dict[str, List[int]] = {}
+        self.constant_names: Set[str] = set()
+        self.typed_names: Set[str] = set()
+        self.tensors: Dict[str, gs.Tensor] = {}
+
+        for node_id, node in enumerate(self.nodes):
+            self.nodes_by_name.setdefault(node.name, []).append(node_id)
+            self.node_ops.append(node.op)
+            input_names = []
+            for node_input in node.inputs:
+                input_names.append(node_input.name)
+                self.consumers.setdefault(node_input.name, []).append(node_id)
+                self._add_tensor(node_input)
+            self.node_inputs.append(input_names)
+            output_names = []
+            for node_output in node.outputs:
+                output_names.append(node_output.name)
+                self.producers[node_output.name] = node_id
+                self._add_tensor(node_output)
+            self.node_outputs.append(output_names)
+
+        self.graph_input_names: List[str] = []
+        for graph_input in graph.inputs:
+            self.graph_input_names.append(graph_input.name)
+            self._add_tensor(graph_input)
+        self.graph_output_names: List[str] = []
+        for graph_output in graph.outputs:
+            self.graph_output_names.append(graph_output.name)
+            self._add_tensor(graph_output)
+
+
+    def _init_from_graph_proto(
+        self,
+        graph: onnx.GraphProto,
+    ):
+        self.nodes: List[onnx.NodeProto] = list(graph.node)
+        self.node_ops: List[str] = []
+        self.node_inputs: List[List[str]] = []
+        self.node_outputs: List[List[str]] = []
+        self.nodes_by_name: Dict[str, List[int]] = {}
+        self.producers: Dict[str, int] = {}
+        self.consumers: Dict[str, List[int]] = {}
+        self.constant_names: Set[str] = {initializer.name for initializer in graph.initializer}
+        self.typed_names: Set[str] = set(self.constant_names)
+        for value_info in list(graph.input) + list(graph.output) + list(graph.value_info):
+            if value_info.type.WhichOneof('value') is not None \
+                and not (
+                    value_info.type.HasField('tensor_type')
+                    and value_info.type.tensor_type.elem_type == onnx.TensorProto.UNDEFINED
+                ):
+                self.typed_names.add(value_info.name)
+        self.tensors: Dict[str, gs.Tensor] = {}
+
+        for node_id, node in enumerate(self.nodes):
+            self.nodes_by_name.setdefault(node.name, []).append(node_id)
+            self.node_ops.append(node.op_type)
+            input_names = list(node.input)
+            for input_name in input_names:
+                self.consumers.setdefault(input_name, []).append(node_id)
+            self.node_inputs.append(input_names)
+            output_names = list(node.output)
+            for output_name in output_names:
+                self.producers[output_name] = node_id
+            self.node_outputs.append(output_names)
+
+        self.graph_input_names: List[str] = [graph_input.name for graph_input in graph.input]
+        self.graph_output_names: List[str] = [graph_output.name for graph_output in graph.output]
+
+
+    def _add_tensor(
+        self,
+        tensor: gs.Tensor,
+    ):
+        self.tensors.setdefault(tensor.name, tensor)
+        if isinstance(tensor, Constant):
+            self.constant_names.add(tensor.name)
+        if tensor.dtype is not None:
+            self.typed_names.add(tensor.name)
+
+
+    def select_nodes(
+        self,
+        node_names: Optional[Iterable[str]] = None,
+        op_types: Optional[Iterable[str]] = None,
+        name_patterns: Optional[Iterable[Pattern]] = None,
+        predicate: Optional[Callable[[gs.Node], bool]] = None,
+    ) -> List[int]:
+        """
+        Ids of the nodes matching any of the given conditions, in graph order.
+        All conditions are evaluated in a single pass over the nodes.
+
+        Parameters
+        ----------
+        node_names: Optional[Iterable[str]]
+            Exact node names.
+
+        op_types: Optional[Iterable[str]]
+            Op types. e.g. ['Identity', 'Dropout']
+
+        name_patterns: Optional[Iterable[Pattern]]
+            Compiled regular expressions searched in the node name.
+
+        predicate: Optional[Callable[[gs.Node], bool]]
+            Called with each gs.Node. The node is selected when it returns True.
+
+        Returns
+        -------
+        node_ids: List[int]
+            Ids of the selected nodes.
+        """
+        node_names = set(node_names) if node_names else set()
+        op_types = set(op_types) if op_types else set()
+        name_patterns = list(name_patterns) if name_patterns else []
+        if not op_types and not name_patterns and predicate is None:
+            return sorted(
+                node_id
+                for node_name in node_names
+                for node_id in self.nodes_by_name.get(node_name, [])
+            )
+        return [
+            node_id for node_id, node in enumerate(self.nodes)
+            if node.name in node_names
+            or self.node_ops[node_id] in op_types
+            or any(name_pattern.search(node.name) for name_pattern in name_patterns)
+            or (predicate is not None and predicate(node))
+        ]
+
+
+    def is_topologically_sorted(
+        self,
+    ) -> bool:
+        """
+        Whether every OP comes after the OPs that produce its inputs.
+        """
+        return all(
+            self.producers.get(input_name, -1) < node_id
+            for node_id, input_names in enumerate(self.node_inputs)
+            for input_name in input_names
+        )
+
+
+    def is_variable(
+        self,
+        tensor_name: str,
+    ) -> bool:
+        return tensor_name not in self.constant_names
+
+
+    @staticmethod
+    def unused_graph_inputs(
+        graph: gs.Graph,
+    ) -> List[gs.Tensor]:
+        """
+        graph.inputs that are not consumed by any node of the graph.
+        Evaluated in one pass over graph.nodes, so call it after graph.cleanup().
+        """
+        used_tensor_names = {
+            node_input.name for node in graph.nodes for node_input in node.inputs
+        }
+        return [
+            graph_input for graph_input in graph.inputs if graph_input.name not in used_tensor_names
+        ]
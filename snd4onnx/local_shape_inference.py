@@ -0,0 +1,317 @@
+#! /usr/bin/env python
+
+import onnx
+from onnx import helper
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from snd4onnx.nested_graphs import outer_references
+
+# Initializers up to this number of elements are copied into the local model
+# so that value dependent shape inference (Reshape, Expand, Slice, ...) keeps working.
+# Larger ones are passed as typed graph inputs, only their shape matters.
+MAX_CONSTANT_ELEMENTS_FOR_LOCAL_INFERENCE = 1024
+
+# OPs whose outputs have the shape of their first input.
+# Their output types are copied without running onnx shape inference.
+# Add op types (including custom ones) to extend it, e.g. SHAPE_PRESERVING_OP_TYPES.add('MyActivation')
+SHAPE_PRESERVING_OP_TYPES: Set[str] = {
+    'Cast',
+    'Identity',
+    'Dropout',
+    'Relu',
+    'LeakyRelu',
+    'PRelu',
+    'Elu',
+    'Selu',
+    'Sigmoid',
+    'HardSigmoid',
+    'HardSwish',
+    'Tanh',
+    'Softplus',
+    'Softsign',
+    'Gelu',
+    'Erf',
+    'Clip',
+    'Neg',
+    'Abs',
+    'Exp',
+    'Log',
+    'Sqrt',
+    'Reciprocal',
+    'Floor',
+    'Ceil',
+    'Round',
+    'Sign',
+    'Not',
+    'Softmax',
+    'LogSoftmax',
+}
+
+
+def _tensor_proto_num_elements(
+    tensor: onnx.TensorProto,
+) -> int:
+    num_elements = 1
+    for dim in tensor.dims:
+        num_elements *= dim
+    return num_elements
+
+
+class ShapeMismatch(NamedTuple):
+    """
+    An edge whose tensor does not fit the OP or the graph output it is connected to.
+
+    producer_name is empty for graph inputs and initializers,
+    consumer_name is empty for graph outputs.
+    """
+    tensor_name: str
+    producer_name: str
+    consumer_name: str
+    message: str
+
+
+def _shape_of(
+    type_proto: Optional[onnx.TypeProto],
+) -> Optional[Tuple]:
+    if type_proto is None \
+        or not type_proto.HasField('tensor_type') \
+        or not type_proto.tensor_type.HasField('shape'):
+        return None
+    return tuple(
+        dim.dim_value if dim.HasField('dim_value') else dim.dim_param or None
+        for dim in type_proto.tensor_type.shape.dim
+    )
+
+
+def _shapes_conflict(
+    declared_shape: Optional[Tuple],
+    inferred_shape: Optional[Tuple],
+) -> bool:
+    # Unknown and symbolic dimensions match anything
+    if declared_shape is None or inferred_shape is None:
+        return False
+    if len(declared_shape) != len(inferred_shape):
+        return True
+    return any(
+        isinstance(declared_dim, int) and isinstance(inferred_dim, int) and declared_dim != inferred_dim
+        for declared_dim, inferred_dim in zip(declared_shape, inferred_shape)
+    )
+
+
+def _preserved_output_types(
+    node: onnx.NodeProto,
+    input_type: onnx.TypeProto,
+) -> List[onnx.TypeProto]:
+    output_types = []
+    for idx in range(len(node.output)):
+        output_type = onnx.TypeProto()
+        output_type.CopyFrom(input_type)
+        if output_type.HasField('tensor_type'):
+            if node.op_type == 'Cast':
+                for attribute in node.attribute:
+                    if attribute.name == 'to':
+                        output_type.tensor_type.elem_type = attribute.i
+            elif node.op_type == 'Dropout' and idx == 1:
+                # mask
+                output_type.tensor_type.elem_type = onnx.TensorProto.BOOL
+        output_types.append(output_type)
+    return output_types
+
+
+def propagate_shapes(
+    model: onnx.ModelProto,
+    tensor_names: Iterable[str],
+    shape_preserving_op_types: Optional[Set[str]] = None,
+) -> List[ShapeMismatch]:
+    """
+    Re-infer the shapes downstream of tensor_names, in place.
+
+    The producers and consumers of tensor_names are re-inferred in a single pass in graph order.
+    When the type of an output changes, its consumers are re-inferred too,
+    so the propagation stops as soon as the shapes stop changing.
+    OPs in shape_preserving_op_types copy the type of their first input,
+    every other OP is inferred by onnx.shape_inference on a model made of that OP alone.
+    The rest of the graph keeps the value_info it already had.
+
+    Parameters
+    ----------
+    model: onnx.ModelProto
+        Model to be updated in place. model.graph must be topologically sorted.
+
+    tensor_names: Iterable[str]
+        Names of the tensors whose producer or consumers have changed.
+
+    shape_preserving_op_types: Optional[Set[str]]
+        Default: SHAPE_PRESERVING_OP_TYPES
+
+    Returns
+    -------
+    mismatches: List[ShapeMismatch]
+        Edges at which onnx shape inference failed, and graph outputs whose
+        declared shape contradicts the re-inferred one.
+    """
+    if shape_preserving_op_types is None:
+        shape_preserving_op_types = SHAPE_PRESERVING_OP_TYPES
+    graph = model.graph
+    tensor_names = set(tensor_names)
+    mismatches: List[ShapeMismatch] = []
+    if not tensor_names:
+        return mismatches
+
+    # Types already known in the full graph
+    value_info_idxs: Dict[str, int] = {}
+    for idx, value_info in enumerate(graph.value_info):
+        value_info_idxs.setdefault(value_info.name, idx)
+    declared_types: Dict[str, onnx.TypeProto] = {}
+    for value_info in list(graph.input) + list(graph.output):
+        if value_info.HasField('type'):
+            declared_types.setdefault(value_info.name, value_info.type)
+    graph_output_names = {graph_output.name for graph_output in graph.output}
+    initializers: Dict[str, onnx.TensorProto] = {
+        initializer.name: initializer for initializer in graph.initializer
+    }
+    inferred_types: Dict[str, onnx.TypeProto] = {}
+    def type_of(name: str) -> Optional[onnx.TypeProto]:
+        if name in inferred_types:
+            return inferred_types[name]
+        if name in value_info_idxs:
+            value_info = graph.value_info[value_info_idxs[name]]
+            return value_info.type if value_info.HasField('type') else None
+        if name in declared_types:
+            return declared_types[name]
+        if name in initializers:
+            return helper.make_tensor_type_proto(initializers[name].data_type, list(initializers[name].dims))
+        return None
+
+    producer_names: Dict[str, str] = {}
+    def producer_name_of(name: str) -> str:
+        # Only needed to report a mismatch
+        if not producer_names:
+            for node in graph.node:
+                for node_output in node.output:
+                    producer_names[node_output] = node.name
+        return producer_names.get(name, '')
+
+    # One forward pass in graph order, which is topological:
+    # an OP is re-inferred if it produces one of tensor_names,
+    # or if one of its inputs is one of tensor_names or changed its type.
+    changed_names = set(tensor_names)
+    for node in graph.node:
+        has_subgraphs = len(node.attribute) > 0 and any(
+            attribute.type in (onnx.AttributeProto.GRAPH, onnx.AttributeProto.GRAPHS) for attribute in node.attribute
+        )
+        if not has_subgraphs and changed_names.isdisjoint(node.input) and tensor_names.isdisjoint(node.output):
+            continue
+        input_names = [node_input for node_input in node.input if node_input]
+        if has_subgraphs:
+            # Tensors of the main graph used inside subgraphs are inputs of the OP that holds them
+            input_names.extend(sorted(
+                name for name in outer_references(node) - set(input_names)
+                if type_of(name) is not None or name in changed_names
+            ))
+            if changed_names.isdisjoint(input_names) and tensor_names.isdisjoint(node.output):
+                continue
+
+        first_input_type = type_of(node.input[0]) if len(node.input) > 0 else None
+        if node.op_type in shape_preserving_op_types and first_input_type is not None:
+            output_types = _preserved_output_types(node, first_input_type)
+        else:
+            try:
+                inferred = _infer_node(model, node, input_names, type_of, initializers)
+            except Exception as ex:
+                # Report the edges that changed, or all inputs if the OP itself is new.
+                # An OP that takes the same tensor twice (e.g. Add(x, x)) is reported once per tensor.
+                mismatch_input_names = list(dict.fromkeys(
+                    [node_input for node_input in input_names if node_input in changed_names] or input_names
+                ))
+                message = str(ex).strip()
+                for node_input in mismatch_input_names:
+                    mismatches.append(
+                        ShapeMismatch(
+                            tensor_name=node_input,
+                            producer_name=producer_name_of(node_input),
+                            consumer_name=node.name,
+                            message=message.splitlines()[-1] if message else type(ex).__name__,
+                        )
+                    )
+                continue
+            output_types = [inferred.get(node_output, None) for node_output in node.output]
+
+        for node_output, output_type in zip(node.output, output_types):
+            if not node_output or output_type is None or type_of(node_output) == output_type:
+                continue
+            inferred_types[node_output] = output_type
+            changed_names.add(node_output)
+
+    # Graph outputs keep the type declared by the model
+    for name in graph_output_names:
+        if name in inferred_types \
+            and _shapes_conflict(_shape_of(declared_types.get(name, None)), _shape_of(inferred_types[name])):
+            mismatches.append(
+                ShapeMismatch(
+                    tensor_name=name,
+                    producer_name=producer_name_of(name),
+                    consumer_name='',
+                    message=\
+                        f'The graph output is declared as {list(_shape_of(declared_types[name]))}, '+
+                        f'but {list(_shape_of(inferred_types[name]))} was inferred.',
+                )
+            )
+
+    # Update the stale value_info of the re-inferred tensors in place
+    for name in sorted(inferred_types):
+        if name in graph_output_names:
+            continue
+        if name in value_info_idxs:
+            graph.value_info[value_info_idxs[name]].type.CopyFrom(inferred_types[name])
+        else:
+            value_info = graph.value_info.add()
+            value_info.name = name
+            value_info.type.CopyFrom(inferred_types[name])
+
+    return mismatches
+
+
+def _infer_node(
+    model: onnx.ModelProto,
+    node: onnx.NodeProto,
+    input_names: List[str],
+    type_of: Callable[[str], Optional[onnx.TypeProto]],
+    initializers: Dict[str, onnx.TensorProto],
+) -> Dict[str, onnx.TypeProto]:
+    """
+    Output types of node, inferred by onnx.shape_inference (strict mode) on a model made of node alone.
+    """
+    local_inputs: List[onnx.ValueInfoProto] = []
+    local_initializers: List[onnx.TensorProto] = []
+    for node_input in dict.fromkeys(input_names):
+        initializer = initializers.get(node_input, None)
+        if initializer is not None \
+            and _tensor_proto_num_elements(initializer) <= MAX_CONSTANT_ELEMENTS_FOR_LOCAL_INFERENCE:
+            local_initializers.append(initializer)
+            continue
+        local_input = onnx.ValueInfoProto(name=node_input)
+        input_type = type_of(node_input)
+        if input_type is not None:
+            local_input.type.CopyFrom(input_type)
+        local_inputs.append(local_input)
+
+    local_graph = helper.make_graph(
+        nodes=[node],
+        name='local',
+        inputs=local_inputs,
+        outputs=[onnx.ValueInfoProto(name=node_output) for node_output in node.output if node_output],
+        initializer=local_initializers,
+    )
+    local_model = helper.make_model(
+        local_graph,
+        opset_imports=model.opset_import,
+        ir_version=model.ir_version,
+        functions=model.functions,
+    )
+    inferred_model = onnx.shape_inference.infer_shapes(local_model, strict_mode=True)
+    return {
+        value_info.name: value_info.type
+        for value_info in list(inferred_model.graph.value_info) + list(inferred_model.graph.output)
+        if value_info.HasField('type') and value_info.type.WhichOneof('value') is not None
+    }
+
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import onnx
+from onnx.external_data_helper import load_external_data_for_model
+
+MODEL_CACHE_KEYS = [
+    'stat',
+    'content',
+]
+
+
+class ModelCache:
+    """
+    In-process LRU cache of parsed onnx models, shared by repeated remove() calls on the same file.
+
+    Every load() returns a new copy of the cached onnx.ModelProto made by protobuf (CopyFrom),
+    which is much cheaper than reading and parsing the file again,
+    and can be modified freely by the caller.
+
+    Parameters
+    ----------
+    max_bytes: Optional[int]
+        Upper limit of the total serialized size of the cached models.\n\
+        The least recently used models are evicted when it is exceeded.\n\
+        Models larger than max_bytes are not cached.\n\
+        Default: 1GB
+
+    key: Optional[str]
+        How a file is identified.\n\
+        'stat': Absolute path, modification time and size of the file.\n\
+        'content': SHA-256 of the file contents. The file is read on every call,\n\
+        but copies and rewrites of the same model share one entry.\n\
+        Default: 'stat'
+
+    Attributes
+    ----------
+    hits: int
+        Number of load() calls served from the cache.
+
+    misses: int
+        Number of load() calls that parsed the file.
+
+    evictions: int
+        Number of models evicted to stay within max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = 1024 * 1024 * 1024,
+        key: Optional[str] = 'stat',
+    ):
+        if key not in MODEL_CACHE_KEYS:
+            raise ValueError(f'key must be one of {MODEL_CACHE_KEYS}. key: {key}')
+        self.max_bytes = max_bytes
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Hashable, onnx.ModelProto]' = OrderedDict()
+        self._entry_bytes: Dict[Hashable, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(
+        self,
+        onnx_file_path: str,
+        load_external_data: Optional[bool] = False,
+    ) -> onnx.ModelProto:
+        """
+        Same as onnx.load(onnx_file_path, load_external_data=load_external_data),
+        served from the cache when the file has already been loaded.
+
+        Returns
+        -------
+        model: onnx.ModelProto
+            A copy owned by the caller.
+        """
+        content = None
+        if self.key == 'content':
+            with open(onnx_file_path, 'rb') as f:
+                content = f.read()
+            cache_key = (hashlib.sha256(content).hexdigest(), load_external_data)
+        else:
+            stat = os.stat(onnx_file_path)
+            cache_key = (os.path.abspath(onnx_file_path), stat.st_mtime_ns, stat.st_size, load_external_data)
+
+        with self._lock:
+            cached_model = self._entries.get(cache_key, None)
+            if cached_model is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached_model is not None:
+            model = onnx.ModelProto()
+            model.CopyFrom(cached_model)
+            return model
+
+        if content is not None:
+            model = onnx.load_model_from_string(content)
+            if load_external_data:
+                load_external_data_for_model(model, os.path.dirname(os.path.abspath(onnx_file_path)))
+        else:
+            model = onnx.load(onnx_file_path, load_external_data=load_external_data)
+
+        model_bytes = model.ByteSize()
+        if self.max_bytes is not None and model_bytes > self.max_bytes:
+            return model
+        cached_model = onnx.ModelProto()
+        cached_model.CopyFrom(model)
+        with self._lock:
+            if cache_key not in self._entries:
+                self._entries[cache_key] = cached_model
+                self._entry_bytes[cache_key] = model_bytes
+                self._total_bytes += model_bytes
+            self._evict()
+        return model
+
+    def _evict(self):
+        while self.max_bytes is not None and self._total_bytes > self.max_bytes and self._entries:
+            cache_key, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._entry_bytes.pop(cache_key)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all models from the cache. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._entry_bytes.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters and current size of the cache.
+
+        Returns
+        -------
+        stats: Dict[str, int]
+            hits, misses, evictions, entries, bytes and max_bytes.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,404 @@
+#! /usr/bin/env python
+
+import onnx
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Union
+from snd4onnx.exceptions import SndError, ReconnectError
+from snd4onnx.graph_index import GraphIndex
+from snd4onnx.proto_utils import delete_by_index
+from snd4onnx.removal_plan import RemovalPlan
+
+class GraphScope(NamedTuple):
+    """
+    A subgraph (If/Loop/Scan body, ...) or a model-local function.
+    """
+    path: str
+    parent_id: Optional[int]
+    graph: Union[onnx.GraphProto, onnx.FunctionProto]
+    constant_names: Set[str]
+
+
+class NestedGraphIndex:
+    """
+    Name-based lookup tables for all subgraphs and model-local functions of a model.
+
+    Built once in a single traversal that descends into every GRAPH/GRAPHS attribute
+    of the main graph, of the functions and of the subgraphs themselves.
+    The main graph is not part of it, see GraphIndex.
+
+    Tensor names of a subgraph never shadow the names of its enclosing graphs,
+    so a name is resolved by walking up the chain of scopes.
+    Functions have their own namespace and no parent scope.
+
+    Attributes
+    ----------
+    scopes: List[GraphScope]
+        Scopes in traversal order. Every scope comes after its parent.
+
+    nodes: List[onnx.NodeProto]
+        Nodes of all scopes.
+
+    node_scope_ids: List[int]
+        Node id -> id of the scope that holds the node.
+
+    node_positions: List[int]
+        Node id -> position of the node in the node list of its scope.
+
+    nodes_by_name: Dict[str, List[int]]
+        Node name -> ids of the nodes with that name.
+
+    referenced_names: List[Set[str]]
+        Scope id -> names of the tensors used by the nodes or outputs of the scope or of its subgraphs.
+
+    scope_owner_ids: List[Optional[int]]
+        Scope id -> position in the main graph of the OP whose subgraphs enclose the scope,
+        None for functions and their subgraphs.
+    """
+
+    def __init__(
+        self,
+        model: onnx.ModelProto,
+    ):
+        self.scopes: List[GraphScope] = []
+        self.nodes: List[onnx.NodeProto] = []
+        self.node_scope_ids: List[int] = []
+        self.node_positions: List[int] = []
+        self.nodes_by_name: Dict[str, List[int]] = {}
+        self.referenced_names: List[Set[str]] = []
+        self.scope_owner_ids: List[Optional[int]] = []
+
+        main_constant_names = {initializer.name for initializer in model.graph.initializer}
+        stack = []
+        # Owner of each entry of stack
+        owner_ids = []
+        for position, node in enumerate(model.graph.node):
+            num_pushed = len(stack)
+            self._push_subgraphs(stack, node, None, '', main_constant_names)
+            owner_ids.extend([position] * (len(stack) - num_pushed))
+        for function in model.functions:
+            stack.append((function, None, f'{function.domain}::{function.name}', set()))
+            owner_ids.append(None)
+        # Depth first, in the order of the model
+        stack.reverse()
+        owner_ids.reverse()
+        while stack:
+            graph, parent_id, path, outer_constant_names = stack.pop()
+            owner_id = owner_ids.pop()
+            scope_id = len(self.scopes)
+            self.scope_owner_ids.append(owner_id)
+            # Initializers of the enclosing graphs are constants in the subgraph too.
+            # The set of the enclosing graph is shared unless the subgraph has its own initializers.
+            constant_names = outer_constant_names
+            if isinstance(graph, onnx.GraphProto):
+                if len(graph.initializer) > 0:
+                    constant_names = outer_constant_names | {initializer.name for initializer in graph.initializer}
+                output_names = [graph_output.name for graph_output in graph.output]
+            else:
+                output_names = list(graph.output)
+            self.scopes.append(
+                GraphScope(
+                    path=path,
+                    parent_id=parent_id,
+                    graph=graph,
+                    constant_names=constant_names,
+                )
+            )
+            referenced_names = set(output_names)
+            children = []
+            for position, node in enumerate(graph.node):
+                node_id = len(self.nodes)
+                self.nodes.append(node)
+                self.node_scope_ids.append(scope_id)
+                self.node_positions.append(position)
+                self.nodes_by_name.setdefault(node.name, []).append(node_id)
+                referenced_names.update(node.input)
+                self._push_subgraphs(children, node, scope_id, path, constant_names)
+            self.referenced_names.append(referenced_names)
+            stack.extend(reversed(children))
+            owner_ids.extend([owner_id] * len(children))
+
+        # Tensors used by subgraphs are also used by their enclosing scopes
+        for scope_id in reversed(range(len(self.scopes))):
+            parent_id = self.scopes[scope_id].parent_id
+            if parent_id is not None:
+                self.referenced_names[parent_id].update(self.referenced_names[scope_id])
+
+    @staticmethod
+    def _push_subgraphs(
+        stack: List,
+        node: onnx.NodeProto,
+        parent_id: Optional[int],
+        path: str,
+        constant_names: Set[str],
+    ):
+        for attribute in node.attribute:
+            if attribute.type == onnx.AttributeProto.GRAPH:
+                stack.append((attribute.g, parent_id, f'{path}/{node.name}.{attribute.name}', constant_names))
+            elif attribute.type == onnx.AttributeProto.GRAPHS:
+                for idx, subgraph in enumerate(attribute.graphs):
+                    stack.append((subgraph, parent_id, f'{path}/{node.name}.{attribute.name}[{idx}]', constant_names))
+
+    def select_nodes(
+        self,
+        node_names: Optional[Iterable[str]] = None,
+        op_types: Optional[Iterable[str]] = None,
+        name_patterns: Optional[Iterable[Pattern]] = None,
+    ) -> List[int]:
+        """
+        Ids of the nodes matching any of the given conditions. Same as GraphIndex.select_nodes().
+        """
+        node_names = set(node_names) if node_names else set()
+        op_types = set(op_types) if op_types else set()
+        name_patterns = list(name_patterns) if name_patterns else []
+        if not op_types and not name_patterns:
+            return sorted(
+                node_id
+                for node_name in node_names
+                for node_id in self.nodes_by_name.get(node_name, [])
+            )
+        return [
+            node_id for node_id, node in enumerate(self.nodes)
+            if node.name in node_names
+            or node.op_type in op_types
+            or any(name_pattern.search(node.name) for name_pattern in name_patterns)
+        ]
+
+    def scope_chain(
+        self,
+        scope_id: int,
+    ) -> List[int]:
+        """
+        scope_id followed by the ids of its enclosing scopes.
+        """
+        chain = []
+        while scope_id is not None:
+            chain.append(scope_id)
+            scope_id = self.scopes[scope_id].parent_id
+        return chain
+
+
+class NestedRemovalPlan:
+    """
+    Rewiring of all subgraphs and functions for one batch of OPs to be deleted.
+
+    Attributes
+    ----------
+    remove_node_ids: List[int]
+        Ids of the OPs to be deleted.
+
+    renames: Dict[int, Dict[str, str]]
+        Scope id -> (name of an output of a deleted OP -> name of the tensor that replaces it).
+
+    warnings: List[str]
+        Warning messages collected while planning.
+    """
+
+    def __init__(self):
+        self.remove_node_ids: List[int] = []
+        self.renames: Dict[int, Dict[str, str]] = {}
+        self.warnings: List[str] = []
+
+
+def plan_nested_removal(
+    index: NestedGraphIndex,
+    remove_node_ids: List[int],
+    errors: Optional[List[SndError]] = None,
+) -> NestedRemovalPlan:
+    """
+    Work out the rewiring for OPs to be deleted in subgraphs and functions, all scopes in one pass.
+
+    The inputs and outputs of a subgraph or a function are positional and cannot be added or removed,
+    so the k-th output of a deleted OP is replaced by its k-th Variable input everywhere it is used:
+    by the OPs of the same scope, by the subgraphs of those OPs and by the outputs of the scope.
+
+    Parameters
+    ----------
+    index: NestedGraphIndex
+        Index of the subgraphs and functions. It is not modified.
+
+    remove_node_ids: List[int]
+        Ids of the OPs to be deleted.
+
+    errors: Optional[List[SndError]]
+        If specified, errors are appended to it instead of being raised
+        and the OPs that cannot be deleted are skipped.
+
+    Returns
+    -------
+    plan: NestedRemovalPlan
+        Rewiring to be applied by apply_nested_removal_plan().
+
+    Raises
+    ------
+    ReconnectError
+        A used output of an OP has no corresponding Variable input.
+    """
+    plan = NestedRemovalPlan()
+    for node_id in sorted(set(remove_node_ids)):
+        node = index.nodes[node_id]
+        scope_id = index.node_scope_ids[node_id]
+        scope = index.scopes[scope_id]
+        renames = plan.renames.setdefault(scope_id, {})
+        variable_inputs = [
+            node_input for node_input in node.input
+            if node_input and node_input not in scope.constant_names
+        ]
+        unconnectable_outputs = [
+            node_output for idx, node_output in enumerate(node.output)
+            if idx >= len(variable_inputs) and node_output in index.referenced_names[scope_id]
+        ]
+        if unconnectable_outputs:
+            error = ReconnectError(
+                'The outputs of an OP in a subgraph or a function can only be replaced by its inputs, '+
+                'and there are more used outputs than Variable inputs. '+
+                f'node_name: {node.name} graph: {scope.path}',
+                node_names=[node.name],
+                num_remove_op_inputs=len(variable_inputs),
+                num_next_op_inputs=len(variable_inputs) + len(unconnectable_outputs),
+            )
+            if errors is None:
+                raise error
+            errors.append(error)
+            continue
+        for node_output, variable_input in zip(node.output, variable_inputs):
+            if node_output:
+                renames[node_output] = variable_input
+        plan.remove_node_ids.append(node_id)
+    if plan.remove_node_ids:
+        plan.warnings.append(
+            'There may be a mismatch in the input/output shapes '+
+            'before and after the OP to be deleted in a subgraph or a function. Check the graph carefully.'
+        )
+    return plan
+
+
+def apply_nested_removal_plan(
+    index: NestedGraphIndex,
+    plan: NestedRemovalPlan,
+):
+    """
+    Apply plan to the subgraphs and functions in place, and delete the OPs.
+    Only scopes that are, or are enclosed by, a scope with deleted OPs are rewritten.
+    """
+    for scope_id, scope in enumerate(index.scopes):
+        chain_renames = [
+            plan.renames[chain_scope_id] for chain_scope_id in index.scope_chain(scope_id)
+            if plan.renames.get(chain_scope_id)
+        ]
+        if not chain_renames:
+            continue
+        def resolve(name: str) -> str:
+            # A replacement may itself be an output of a deleted OP of an enclosing scope
+            resolved = True
+            while resolved:
+                resolved = False
+                for renames in chain_renames:
+                    if name in renames:
+                        name = renames[name]
+                        resolved = True
+                        break
+            return name
+        graph = scope.graph
+        for node in graph.node:
+            for idx, node_input in enumerate(node.input):
+                new_name = resolve(node_input)
+                if new_name != node_input:
+                    node.input[idx] = new_name
+        # Outputs keep their position (and their type)
+        if isinstance(graph, onnx.GraphProto):
+            for graph_output in graph.output:
+                graph_output.name = resolve(graph_output.name)
+            renames = plan.renames.get(scope_id, {})
+            delete_by_index(
+                graph.value_info,
+                [idx for idx, value_info in enumerate(graph.value_info) if value_info.name in renames],
+            )
+        else:
+            for idx, output_name in enumerate(graph.output):
+                graph.output[idx] = resolve(output_name)
+
+    remove_positions: Dict[int, List[int]] = {}
+    for node_id in plan.remove_node_ids:
+        remove_positions.setdefault(index.node_scope_ids[node_id], []).append(index.node_positions[node_id])
+    for scope_id, positions in remove_positions.items():
+        delete_by_index(index.scopes[scope_id].graph.node, positions)
+
+
+def main_graph_renames(
+    index: GraphIndex,
+    plan: RemovalPlan,
+) -> Dict[str, str]:
+    """
+    Tensor names of the main graph that disappear with plan, and the names that replace them.
+
+    OPs in subgraphs can use tensors of the main graph without listing them as inputs of
+    the If/Loop/Scan OP, so they are not part of the rewiring worked out by plan_removal().
+    They follow the surviving OPs of the main graph: a tensor reconnected to another one
+    in the main graph is reconnected to it in the subgraphs too.
+    """
+    renames: Dict[str, str] = {}
+    for (node_id, idx), tensor_name in plan.output_rewrites.items():
+        renames.setdefault(index.node_outputs[node_id][idx], tensor_name)
+    for (node_id, idx), tensor_name in plan.input_rewrites.items():
+        renames.setdefault(index.node_inputs[node_id][idx], tensor_name)
+    # Outputs of a deleted OP that no surviving OP takes over
+    surviving_names = set(plan.output_rewrites.values())
+    for node_id in plan.remove_node_ids:
+        variable_inputs = [
+            node_input for node_input in index.node_inputs[node_id]
+            if node_input and index.is_variable(node_input)
+        ]
+        for node_output, variable_input in zip(index.node_outputs[node_id], variable_inputs):
+            if node_output not in surviving_names:
+                renames.setdefault(node_output, variable_input)
+    for name in list(renames):
+        new_name = renames[name]
+        visited = {name}
+        while new_name in renames and new_name not in visited:
+            visited.add(new_name)
+            new_name = renames[new_name]
+        renames[name] = new_name
+    return {name: new_name for name, new_name in renames.items() if name != new_name}
+
+
+def rename_outer_references(
+    model: onnx.ModelProto,
+    renames: Dict[str, str],
+):
+    """
+    Apply main_graph_renames() to the subgraphs of the main graph of model, in place.
+    Functions have their own namespace and are not touched.
+    """
+    if not renames:
+        return
+    stack = []
+    for node in model.graph.node:
+        NestedGraphIndex._push_subgraphs(stack, node, None, '', set())
+    while stack:
+        graph = stack.pop()[0]
+        for node in graph.node:
+            for idx, node_input in enumerate(node.input):
+                if node_input in renames:
+                    node.input[idx] = renames[node_input]
+            NestedGraphIndex._push_subgraphs(stack, node, None, '', set())
+        for graph_output in graph.output:
+            if graph_output.name in renames:
+                graph_output.name = renames[graph_output.name]
+
+
+def outer_references(
+    node: onnx.NodeProto,
+) -> Set[str]:
+    """
+    Names used inside the subgraphs of node, including the names of the enclosing graphs
+    that the subgraphs refer to without listing them as inputs of node.
+    """
+    names = set()
+    stack = []
+    NestedGraphIndex._push_subgraphs(stack, node, None, '', set())
+    while stack:
+        graph = stack.pop()[0]
+        for subgraph_node in graph.node:
+            names.update(subgraph_node.input)
+            NestedGraphIndex._push_subgraphs(stack, subgraph_node, None, '', set())
+        names.update(graph_output.name for graph_output in graph.output)
+    return names
@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+
+import onnx
+from onnx import helper
+from typing import Dict, List, Optional, Set, Tuple
+from snd4onnx.graph_index import GraphIndex
+from snd4onnx.proto_utils import delete_by_index
+from snd4onnx.removal_plan import RemovalPlan
+
+
+def can_use_fast_path(
+    model: onnx.ModelProto,
+) -> bool:
+    """
+    Whether the OPs of model can be deleted by editing the onnx.GraphProto directly.
+
+    Graphs with subgraphs (If/Loop/Scan), sparse initializers,
+    initializers listed as graph inputs or OPs that output a graph input
+    are left to onnx_graphsurgeon.
+    """
+    graph = model.graph
+    if len(graph.sparse_initializer) > 0:
+        return False
+    graph_input_names = {graph_input.name for graph_input in graph.input}
+    for initializer in graph.initializer:
+        if initializer.name in graph_input_names:
+            return False
+    for node in graph.node:
+        for attribute in node.attribute:
+            if attribute.type in (onnx.AttributeProto.GRAPH, onnx.AttributeProto.GRAPHS):
+                return False
+        for node_output in node.output:
+            if node_output in graph_input_names:
+                return False
+    return True
+
+
+def _live_node_ids(
+    index: GraphIndex,
+    node_inputs: Dict[int, List[str]],
+    producers: Dict[str, int],
+    output_names: List[str],
+) -> Set[int]:
+    """
+    Ids of the nodes that contribute to output_names. Equivalent of gs.Graph.cleanup().
+    """
+    live_node_ids = set()
+    stack = [name for name in output_names]
+    visited = set(stack)
+    while stack:
+        tensor_name = stack.pop()
+        node_id = producers.get(tensor_name, None)
+        if node_id is None or node_id in live_node_ids:
+            continue
+        live_node_ids.add(node_id)
+        for input_name in node_inputs[node_id]:
+            if input_name not in visited:
+                visited.add(input_name)
+                stack.append(input_name)
+    return live_node_ids
+
+
+def plan_cleanup(
+    index: GraphIndex,
+    plan: RemovalPlan,
+    remove_node_names: Set[str],
+    cleanup_once: bool,
+) -> Tuple[Set[int], List[str], List[str]]:
+    """
+    Outcome of the cleanup remove() performs after the rewiring of plan, worked out
+    from index and plan alone in time linear in the size of the graph.
+
+    Equivalent of the graph.cleanup() passes with onnx_graphsurgeon
+    for graphs without subgraphs.
+
+    Returns
+    -------
+    live_node_ids: Set[int]
+        Ids of the nodes that are kept.
+
+    graph_input_names: List[str]
+        Names of the graph inputs that are kept.
+
+    graph_output_names: List[str]
+        Names of the graph outputs after deletion.
+    """
+    remove_node_id_set = set(plan.remove_node_ids)
+    node_inputs: Dict[int, List[str]] = {}
+    producers: Dict[str, int] = {}
+    for node_id, input_names in enumerate(index.node_inputs):
+        if node_id in remove_node_id_set:
+            continue
+        node_inputs[node_id] = list(input_names)
+        for node_output in index.node_outputs[node_id]:
+            producers[node_output] = node_id
+    for (node_id, idx), tensor_name in plan.input_rewrites.items():
+        node_inputs[node_id][idx] = tensor_name
+    for (node_id, idx), tensor_name in plan.output_rewrites.items():
+        old_name = index.node_outputs[node_id][idx]
+        if producers.get(old_name) == node_id:
+            del producers[old_name]
+        producers[tensor_name] = node_id
+
+    graph_output_names = list(plan.graph_output_names)
+    graph_input_names = list(index.graph_input_names)
+    if cleanup_once:
+        # Delete output nodes, unused nodes and unused graph inputs in a single pass
+        graph_output_names = [name for name in graph_output_names if name not in remove_node_names]
+        live_node_ids = _live_node_ids(index, node_inputs, producers, graph_output_names)
+        used_tensor_names = {
+            input_name for node_id in live_node_ids for input_name in node_inputs[node_id]
+        }
+        used_tensor_names.update(graph_output_names)
+        graph_input_names = [name for name in graph_input_names if name in used_tensor_names]
+    else:
+        live_node_ids = _live_node_ids(index, node_inputs, producers, graph_output_names)
+        # Delete any unused graph inputs
+        used_tensor_names = {
+            input_name for node_id in live_node_ids for input_name in node_inputs[node_id]
+        }
+        graph_input_names = [name for name in graph_input_names if name in used_tensor_names]
+        # Delete output nodes
+        graph_output_names = [name for name in graph_output_names if name not in remove_node_names]
+        live_node_ids = _live_node_ids(index, node_inputs, producers, graph_output_names)
+    return live_node_ids, graph_input_names, graph_output_names
+
+
+def apply_removal_plan_to_model(
+    model: onnx.ModelProto,
+    index: GraphIndex,
+    plan: RemovalPlan,
+    remove_node_names: Set[str],
+    cleanup_once: bool,
+    kept_node_ids: Optional[List[int]] = None,
+) -> onnx.ModelProto:
+    """
+    Apply plan to model by editing its onnx.GraphProto in place,
+    followed by the same cleanup that remove() performs with onnx_graphsurgeon.
+
+    Nodes keep their order in the input graph and are not sorted again as
+    graph.toposort() does with onnx_graphsurgeon. A topologically sorted graph stays sorted
+    because the plan only reconnects OPs to tensors produced before the deleted OPs.
+    Initializers that are still used are neither converted nor copied.
+
+    Parameters
+    ----------
+    model: onnx.ModelProto
+        Model to be edited. index must have been built from model.graph.
+
+    index: GraphIndex
+        Index of model.graph.
+
+    plan: RemovalPlan
+        Plan produced by plan_removal().
+
+    remove_node_names: Set[str]
+        Names of the OPs to be deleted. Graph outputs with these names are deleted.
+
+    cleanup_once: bool
+        Same as remove(cleanup_once=...).
+
+    kept_node_ids: Optional[List[int]]
+        If specified, the ids of the nodes that are kept are appended to it, in graph order.
+
+    Returns
+    -------
+    model: onnx.ModelProto
+        The edited model.
+    """
+    graph = model.graph
+
+    # Rewrite the edges
+    for (node_id, idx), tensor_name in plan.input_rewrites.items():
+        index.nodes[node_id].input[idx] = tensor_name
+    for (node_id, idx), tensor_name in plan.output_rewrites.items():
+        index.nodes[node_id].output[idx] = tensor_name
+
+    # Type information of every named tensor, used for the new graph outputs
+    value_infos: Dict[str, onnx.ValueInfoProto] = {}
+    for value_info in list(graph.value_info) + list(graph.input) + list(graph.output):
+        value_infos[value_info.name] = value_info
+    initializer_types = {
+        initializer.name: (initializer.data_type, list(initializer.dims)) for initializer in graph.initializer
+    }
+    def make_output(name: str) -> onnx.ValueInfoProto:
+        if name in value_infos:
+            value_info = onnx.ValueInfoProto()
+            value_info.CopyFrom(value_infos[name])
+            return value_info
+        if name in initializer_types:
+            return helper.make_tensor_value_info(name, *initializer_types[name])
+        return onnx.ValueInfoProto(name=name)
+
+    live_node_ids, graph_input_names, graph_output_names = \
+        plan_cleanup(index, plan, remove_node_names, cleanup_once)
+
+    new_graph_outputs = [make_output(name) for name in graph_output_names]
+    del graph.output[:]
+    graph.output.extend(new_graph_outputs)
+
+    graph_input_name_set = set(graph_input_names)
+    delete_by_index(
+        graph.input,
+        [idx for idx, graph_input in enumerate(graph.input) if graph_input.name not in graph_input_name_set],
+    )
+
+    delete_by_index(
+        graph.node,
+        [node_id for node_id in range(len(index.nodes)) if node_id not in live_node_ids],
+    )
+    if kept_node_ids is not None:
+        kept_node_ids.extend(sorted(live_node_ids))
+
+    live_tensor_names = set(graph_output_names)
+    for node in graph.node:
+        live_tensor_names.update(node.input)
+        live_tensor_names.update(node.output)
+    delete_by_index(
+        graph.initializer,
+        [idx for idx, initializer in enumerate(graph.initializer) if initializer.name not in live_tensor_names],
+    )
+    # value_info only describes intermediate tensors
+    io_tensor_names = set(graph_input_names) | set(graph_output_names)
+    delete_by_index(
+        graph.value_info,
+        [
+            idx for idx, value_info in enumerate(graph.value_info)
+            if value_info.name not in live_tensor_names or value_info.name in io_tensor_names
+        ],
+    )
+
+    return model
@@ -1,56 +1,89 @@
 #! /usr/bin/env python
 
 import os
-import sys
-from argparse import ArgumentParser
+import re
 import onnx
 import onnx_graphsurgeon as gs
-from onnx_graphsurgeon.ir.tensor import Variable
-from typing import Optional, List
-
-class Color:
-    BLACK          = '\033[30m'
-    RED            = '\033[31m'
-    GREEN          = '\033[32m'
-    YELLOW         = '\033[33m'
-    BLUE           = '\033[34m'
-    MAGENTA        = '\033[35m'
-    CYAN           = '\033[36m'
-    WHITE          = '\033[37m'
-    COLOR_DEFAULT  = '\033[39m'
-    BOLD           = '\033[1m'
-    UNDERLINE      = '\033[4m'
-    INVISIBLE      = '\033[08m'
-    REVERCE        = '\033[07m'
-    BG_BLACK       = '\033[40m'
-    BG_RED         = '\033[41m'
-    BG_GREEN       = '\033[42m'
-    BG_YELLOW      = '\033[43m'
-    BG_BLUE        = '\033[44m'
-    BG_MAGENTA     = '\033[45m'
-    BG_CYAN        = '\033[46m'
-    BG_WHITE       = '\033[47m'
-    BG_DEFAULT     = '\033[49m'
-    RESET          = '\033[0m'
-
-OP_TYPES_WITH_AUTOMATIC_ADJUSTMENT_OF_OUTPUT_SHAPE = [
-    'Cast',
+from typing import IO, Optional, List, Callable, Set, Tuple, Union
+from snd4onnx.cli import main
+from snd4onnx.color import Color
+from snd4onnx.exceptions import (
+    SndError,
+    InvalidArgumentError,
+    ModelFileNotFound,
+    NodeNotFound,
+    NodeCountError,
+)
+from snd4onnx.external_data import save_model
+from snd4onnx.graph_index import GraphIndex
+from snd4onnx.local_shape_inference import propagate_shapes
+from snd4onnx.nested_graphs import (
+    NestedGraphIndex,
+    plan_nested_removal,
+    apply_nested_removal_plan,
+    main_graph_renames,
+    rename_outer_references,
+)
+from snd4onnx.model_cache import ModelCache
+from snd4onnx.profiling import RemoveProfile, RemoveProfiler
+from snd4onnx.pruning import prune_model
+from snd4onnx.removal_diff import RemovalDiff, RemovalDiffRecorder
+from snd4onnx.region import find_region, check_region_removal, apply_region_removal, apply_region_extraction
+from snd4onnx.verification import VERIFY_NUM_SAMPLES, VerificationReport, import_onnxruntime, verify_models
+from snd4onnx.onnx_fast_path import can_use_fast_path, apply_removal_plan_to_model, plan_cleanup
+from snd4onnx.removal_plan import (
+    OP_TYPES_WITH_AUTOMATIC_ADJUSTMENT_OF_OUTPUT_SHAPE,
+    plan_removal,
+    apply_removal_plan,
+)
+
+SHAPE_INFERENCE_MODES = [
+    'none',
+    'local',
+    'full',
 ]
 
 def remove(
-    remove_node_names: List[str],
+    remove_node_names: Optional[List[str]] = None,
     input_onnx_file_path: Optional[str] = '',
     output_onnx_file_path: Optional[str] = '',
     onnx_graph: Optional[onnx.ModelProto] = None,
     non_verbose: Optional[bool] = False,
-) -> onnx.ModelProto:
-
+    cleanup_once: Optional[bool] = False,
+    shape_inference: Optional[str] = 'full',
+    remove_op_types: Optional[List[str]] = None,
+    remove_node_name_patterns: Optional[List[str]] = None,
+    remove_node_predicate: Optional[Callable[[gs.Node], bool]] = None,
+    load_external_data: Optional[bool] = False,
+    disable_fast_path: Optional[bool] = False,
+    dry_run: Optional[bool] = False,
+    model_cache: Optional[ModelCache] = None,
+    profile: Optional[bool] = False,
+    profile_callback: Optional[Callable[[RemoveProfile], None]] = None,
+    verify: Optional[bool] = False,
+    verify_num_samples: Optional[int] = VERIFY_NUM_SAMPLES,
+    verify_callback: Optional[Callable[[VerificationReport], None]] = None,
+    prune: Optional[bool] = False,
+    region_input_names: Optional[List[str]] = None,
+    region_output_names: Optional[List[str]] = None,
+    extract_region: Optional[bool] = False,
+    profile_memory: Optional[bool] = True,
+    output_onnx_file_object: Optional[IO[bytes]] = None,
+    skip_unchanged_output: Optional[bool] = False,
+    diff: Optional[bool] = False,
+    diff_callback: Optional[Callable[[RemovalDiff], None]] = None,
+) -> Union[onnx.ModelProto, List[SndError], Tuple[onnx.ModelProto, RemoveProfile]]:
     """
     Parameters
     ----------
-    remove_node_names: List[str]
+    remove_node_names: Optional[List[str]]
         List of OP names to be deleted.\n\
-        e.g. remove_node_names = ['op_name1', 'op_name2', 'op_name3', ...]
+        e.g. remove_node_names = ['op_name1', 'op_name2', 'op_name3', ...]\n\
+        At least one of remove_node_names, remove_op_types,\n\
+        remove_node_name_patterns, remove_node_predicate or region_output_names must be specified.\n\
+        OPs inside subgraphs (If/Loop/Scan bodies) and model-local functions are deleted too.\n\
+        There, the k-th output of the OP is replaced by its k-th Variable input,\n\
+        and the inputs and outputs of the subgraph or function are kept as they are.
 
     input_onnx_file_path: Optional[str]
         Input onnx file path.\n\
@@ -58,7 +91,9 @@ def remove(
 
     output_onnx_file_path: Optional[str]
         Output onnx file path.\n\
-        If output_onnx_file_path is not specified, no .onnx file is output.
+        If output_onnx_file_path is not specified, no .onnx file is output.\n\
+        The file is written to a temporary file in the same directory first,\n\
+        which then replaces output_onnx_file_path in a single rename.
 
     onnx_graph: Optional[onnx.ModelProto]
         onnx.ModelProto.\n\
@@ -69,313 +104,694 @@ def remove(
         Do not show all information logs. Only error logs are displayed.\n\
         Default: False
 
+    cleanup_once: Optional[bool]
+        Run graph.cleanup() and graph.toposort() only once, after all rewiring.\n\
+        Unused graph inputs are removed by the same cleanup.\n\
+        Faster on large graphs.\n\
+        Default: False
+
+    shape_inference: Optional[str]
+        Shape inference performed on the generated model.\n\
+        'none': No shape inference.\n\
+        'local': Only the OPs downstream of the reconnected tensors are re-inferred,\n\
+        until the shapes stop changing, and the edges whose shapes do not fit are reported.\n\
+        OPs in SHAPE_PRESERVING_OP_TYPES (snd4onnx.local_shape_inference) copy the shape of their first input.\n\
+        'full': onnx.shape_inference.infer_shapes on the whole model.\n\
+        Default: 'full'
+
+    remove_op_types: Optional[List[str]]
+        All OPs of the specified op types are deleted.\n\
+        e.g. remove_op_types = ['Identity', 'Dropout']
+
+    remove_node_name_patterns: Optional[List[str]]
+        All OPs whose name matches one of the regular expressions (re.search) are deleted.\n\
+        e.g. remove_node_name_patterns = ['/Dropout_\\d+$']
+
+    remove_node_predicate: Optional[Callable[[gs.Node], bool]]
+        Called with each onnx_graphsurgeon Node. OPs for which it returns True are deleted.\n\
+        Only the OPs of the main graph are passed.\n\
+        e.g. remove_node_predicate = lambda node: node.op == 'Cast' and node.attrs['to'] == 1
+
+    load_external_data: Optional[bool]
+        Load the weights of a model stored with external data into memory.\n\
+        If False, the weights stay on disk while the graph is edited,\n\
+        and the output .onnx file refers to the same external data files,\n\
+        which are reused in place or copied next to output_onnx_file_path.\n\
+        Models whose weights are embedded in the .onnx file are not affected.\n\
+        Default: False
+
+    disable_fast_path: Optional[bool]
+        By default, when the graph has no subgraphs and no remove_node_predicate is specified,\n\
+        the onnx.GraphProto is edited directly without converting the model to\n\
+        onnx_graphsurgeon and back, and the unchanged initializers are reused as they are.\n\
+        The OPs keep their order in the input model instead of being sorted again.\n\
+        If True, onnx_graphsurgeon is always used.\n\
+        Default: False
+
+    dry_run: Optional[bool]
+        Only check whether the OPs can be deleted. Nothing is modified or saved.\n\
+        Instead of stopping at the first problem, all problems are collected in one pass,\n\
+        including OP names in remove_node_names that do not exist in the graph,\n\
+        and returned as a list. An empty list means that remove() would succeed.\n\
+        Default: False
+
+    model_cache: Optional[ModelCache]
+        Cache of parsed models shared by repeated calls.\n\
+        If specified, input_onnx_file_path is parsed only on the first call\n\
+        and later calls work on a copy of the cached model.\n\
+        e.g. model_cache = ModelCache(max_bytes=4 * 1024 ** 3)
+
+    profile: Optional[bool]
+        Measure the wall time and the peak memory (tracemalloc) of each phase,\n\
+        and the number of OPs and tensors before and after deletion.\n\
+        If True, (removed_graph, RemoveProfile) is returned.\n\
+        Ignored if dry_run is True.\n\
+        Default: False
+
+    profile_callback: Optional[Callable[[RemoveProfile], None]]
+        Called with the RemoveProfile of the call. Measures as profile does,\n\
+        without changing the return value.
+
+    verify: Optional[bool]
+        Run the input model and the generated model with onnxruntime on CPU on the same random inputs,\n\
+        generated from the shapes and dtypes of the graph inputs, and print the max abs/rel error\n\
+        of each graph output that both models have. onnxruntime must be installed.\n\
+        Ignored if dry_run is True.\n\
+        Default: False
+
+    verify_num_samples: Optional[int]
+        Number of random inputs of verify.\n\
+        Default: 8
+
+    verify_callback: Optional[Callable[[VerificationReport], None]]
+        Called with the VerificationReport of the call. Verifies as verify does, without printing.
+
+    prune: Optional[bool]
+        After deletion, delete the OPs, graph inputs, initializers and value_info that do not\n\
+        contribute to the graph outputs in one sweep, and merge initializers with identical\n\
+        type, shape and bytes (e.g. the scale constants left by deleted QuantizeLinear/DequantizeLinear pairs).\n\
+        Default: False
+
+    region_input_names: Optional[List[str]]
+        Names of the tensors a region of OPs starts from. Used with region_output_names.\n\
+        If not specified, the region reaches up to the graph inputs.\n\
+        e.g. region_input_names = ['boxes', 'scores']
+
+    region_output_names: Optional[List[str]]
+        Names of the tensors a region of OPs ends at.\n\
+        All OPs between region_input_names and region_output_names, found in one traversal\n\
+        of the main graph, are deleted at once without reconnecting anything.\n\
+        region_input_names that are still produced become graph outputs,\n\
+        and region_output_names that are still read become graph inputs.\n\
+        Cannot be combined with remove_node_names, remove_op_types,\n\
+        remove_node_name_patterns or remove_node_predicate.\n\
+        e.g. region_output_names = ['selected_indices']
+
+    extract_region: Optional[bool]
+        Keep only the region of OPs between region_input_names and region_output_names\n\
+        instead of deleting it. region_input_names become the graph inputs\n\
+        and region_output_names the graph outputs.\n\
+        Default: False
+
+    profile_memory: Optional[bool]
+        Trace the peak memory of each phase with tracemalloc when profiling.\n\
+        tracemalloc slows down remove() several times. If False, only the wall times\n\
+        and the numbers of OPs and tensors are measured and peak_memory_bytes is 0.\n\
+        On Python 3.7 and 3.8, which lack tracemalloc.reset_peak(), peak_memory_bytes is None.\n\
+        Default: True
+
+    output_onnx_file_object: Optional[IO[bytes]]
+        Binary file object the serialized model is written to instead of output_onnx_file_path.\n\
+        Weights stored as external data are embedded, so the model must be smaller than 2GB.\n\
+        e.g. output_onnx_file_object = io.BytesIO()
+
+    skip_unchanged_output: Optional[bool]
+        Do not write output_onnx_file_path if it already has the same content (SHA-256),\n\
+        so that its modification time does not change.\n\
+        External data files copied next to it are skipped the same way.\n\
+        Default: False
+
+    diff: Optional[bool]
+        Print what was changed: the deleted OPs, the reconnected edges (old tensor -> new tensor),\n\
+        the added and deleted graph inputs and outputs, the shapes that changed\n\
+        and the deleted initializers with their size.\n\
+        OPs are identified by the plan of the deletion and the OPs dropped by cleanup and prune,\n\
+        without comparing the two graphs OP by OP.\n\
+        Ignored if dry_run is True.\n\
+        Default: False
+
+    diff_callback: Optional[Callable[[RemovalDiff], None]]
+        Called with the RemovalDiff of the call. Records what diff prints, without printing.\n\
+        RemovalDiff.to_dict() is JSON serializable.
+
     Returns
     -------
     removed_graph: onnx.ModelProto
-        OP removed onnx ModelProto.
+        OP removed onnx ModelProto.\n\
+        If dry_run is True, List[SndError] of all problems found instead.\n\
+        If profile is True, a tuple of removed_graph and its RemoveProfile.
+
+    Raises
+    ------
+    SndError
+        InvalidArgumentError, ModelFileNotFound, NodeCountError or ReconnectError\n\
+        if the OPs cannot be deleted. Not raised if dry_run is True.
     """
 
+    verify_enabled = (verify or verify_callback is not None) and not dry_run
+    if verify_enabled:
+        # Fail before anything is written
+        import_onnxruntime()
+
+    profiler = RemoveProfiler(
+        enabled=(profile or profile_callback is not None) and not dry_run,
+        trace_memory=profile_memory,
+    )
+    diff_recorder = RemovalDiffRecorder(
+        enabled=(diff or diff_callback is not None) and not dry_run,
+    )
+    verification_report = None
+    try:
+        removed_graph = _remove(
+            remove_node_names=remove_node_names,
+            input_onnx_file_path=input_onnx_file_path,
+            output_onnx_file_path=output_onnx_file_path,
+            output_onnx_file_object=output_onnx_file_object,
+            skip_unchanged_output=skip_unchanged_output,
+            onnx_graph=onnx_graph,
+            non_verbose=non_verbose,
+            cleanup_once=cleanup_once,
+            shape_inference=shape_inference,
+            remove_op_types=remove_op_types,
+            remove_node_name_patterns=remove_node_name_patterns,
+            remove_node_predicate=remove_node_predicate,
+            load_external_data=load_external_data,
+            disable_fast_path=disable_fast_path,
+            dry_run=dry_run,
+            model_cache=model_cache,
+            prune=prune,
+            region_input_names=region_input_names,
+            region_output_names=region_output_names,
+            extract_region=extract_region,
+            profiler=profiler,
+            diff_recorder=diff_recorder,
+        )
+        if verify_enabled:
+            profiler.begin('verify')
+            verification_report = verify_models(
+                original_model=onnx_graph if onnx_graph else input_onnx_file_path,
+                removed_model=output_onnx_file_path if output_onnx_file_path else removed_graph,
+                num_samples=verify_num_samples,
+                # Weights that were not loaded stay next to the input file
+                removed_external_data_dir=\
+                    os.path.dirname(os.path.abspath(input_onnx_file_path))
+                    if not onnx_graph and not load_external_data else None,
+            )
+    finally:
+        profiler.close()
+
+    if verification_report is not None:
+        if verify and not non_verbose:
+            print(f'{Color.GREEN}INFO:{Color.RESET} Verification with onnxruntime')
+            print(verification_report.format())
+        if verify_callback is not None:
+            verify_callback(verification_report)
+
+    if diff_recorder.enabled:
+        if diff and not non_verbose:
+            print(f'{Color.GREEN}INFO:{Color.RESET} Changes')
+            print(diff_recorder.report.format())
+        if diff_callback is not None:
+            diff_callback(diff_recorder.report)
+
+    if profiler.enabled:
+        if profile_callback is not None:
+            profile_callback(profiler.report)
+        if profile:
+            return removed_graph, profiler.report
+    return removed_graph
+
+
+def _remove(
+    remove_node_names: Optional[List[str]],
+    input_onnx_file_path: Optional[str],
+    output_onnx_file_path: Optional[str],
+    output_onnx_file_object: Optional[IO[bytes]],
+    skip_unchanged_output: Optional[bool],
+    onnx_graph: Optional[onnx.ModelProto],
+    non_verbose: Optional[bool],
+    cleanup_once: Optional[bool],
+    shape_inference: Optional[str],
+    remove_op_types: Optional[List[str]],
+    remove_node_name_patterns: Optional[List[str]],
+    remove_node_predicate: Optional[Callable[[gs.Node], bool]],
+    load_external_data: Optional[bool],
+    disable_fast_path: Optional[bool],
+    dry_run: Optional[bool],
+    model_cache: Optional[ModelCache],
+    prune: Optional[bool],
+    region_input_names: Optional[List[str]],
+    region_output_names: Optional[List[str]],
+    extract_region: Optional[bool],
+    profiler: RemoveProfiler,
+    diff_recorder: RemovalDiffRecorder,
+) -> Union[onnx.ModelProto, List[SndError]]:
+    """
+    Body of remove(). Phases are reported to profiler.
+    """
+
+    # In dry_run mode errors are collected and returned instead of raised
+    errors: Optional[List[SndError]] = [] if dry_run else None
+    def report(error: SndError):
+        if errors is None:
+            raise error
+        errors.append(error)
+
     if not input_onnx_file_path and not onnx_graph:
-        print(
-            f'{Color.RED}ERROR:{Color.RESET} '+
-            f'One of input_onnx_file_path or onnx_graph must be specified.'
+        report(
+            InvalidArgumentError(
+                'One of input_onnx_file_path or onnx_graph must be specified.'
+            )
+        )
+        return errors
+
+    selects_nodes = remove_node_names or remove_op_types \
+        or remove_node_name_patterns or remove_node_predicate is not None
+    if not selects_nodes and not region_output_names:
+        report(
+            InvalidArgumentError(
+                'One of remove_node_names, remove_op_types, remove_node_name_patterns, '+
+                'remove_node_predicate or region_output_names must be specified.'
+            )
+        )
+    if selects_nodes and region_output_names:
+        report(
+            InvalidArgumentError(
+                'region_output_names cannot be combined with remove_node_names, remove_op_types, '+
+                'remove_node_name_patterns or remove_node_predicate.'
+            )
+        )
+    if (region_input_names or extract_region) and not region_output_names:
+        report(
+            InvalidArgumentError(
+                'region_output_names must be specified with region_input_names or extract_region.'
+            )
+        )
+
+    name_patterns = []
+    for remove_node_name_pattern in remove_node_name_patterns or []:
+        try:
+            name_patterns.append(re.compile(remove_node_name_pattern))
+        except re.error as ex:
+            report(
+                InvalidArgumentError(
+                    f'Invalid regular expression. pattern: {remove_node_name_pattern} {ex}'
+                )
+            )
+
+    if output_onnx_file_path and output_onnx_file_object is not None:
+        report(
+            InvalidArgumentError(
+                'output_onnx_file_path and output_onnx_file_object cannot be specified together.'
+            )
+        )
+
+    if shape_inference not in SHAPE_INFERENCE_MODES:
+        report(
+            InvalidArgumentError(
+                f'shape_inference must be one of {SHAPE_INFERENCE_MODES}. shape_inference: {shape_inference}'
+            )
         )
-        sys.exit(1)
 
     # Loading Graphs
     # onnx_graph If specified, onnx_graph is processed first
-    graph = None
+    model = None
     if not onnx_graph:
         # file existence check
         if not os.path.exists(input_onnx_file_path) or \
             not os.path.isfile(input_onnx_file_path) or \
             not os.path.splitext(input_onnx_file_path)[-1] == '.onnx':
-            print(
-                f'{Color.RED}ERROR:{Color.RESET} '+
-                f'The specified file (.onnx) does not exist. or not an onnx file. File: {input_onnx_file_path}'
+            report(
+                ModelFileNotFound(
+                    f'The specified file (.onnx) does not exist. or not an onnx file. File: {input_onnx_file_path}',
+                    file_path=input_onnx_file_path,
+                )
             )
-            sys.exit(1)
-        graph = gs.import_onnx(onnx.load(input_onnx_file_path))
+            return errors
+        profiler.begin('load')
+        if model_cache is not None:
+            model = model_cache.load(input_onnx_file_path, load_external_data=load_external_data)
+        else:
+            model = onnx.load(input_onnx_file_path, load_external_data=load_external_data)
     else:
-        graph = gs.import_onnx(onnx_graph)
+        model = onnx_graph
+    profiler.count_before(model)
+
+    if region_output_names:
+        # The whole region is found in one traversal and deleted or extracted at once,
+        # directly in the onnx.GraphProto
+        profiler.begin('plan')
+        region = find_region(model.graph, region_input_names or [], region_output_names, errors)
+        if not extract_region:
+            check_region_removal(model.graph, region, errors)
+        if dry_run:
+            return errors
+        if profiler.enabled:
+            profiler.report.fast_path = True
+        if model is onnx_graph:
+            # Do not modify the ModelProto of the caller
+            profiler.begin('load')
+            model = onnx.ModelProto()
+            model.CopyFrom(onnx_graph)
+        if diff_recorder.enabled:
+            region_node_id_set = set(region.node_ids)
+            diff_recorder.record_kept_nodes(
+                list(model.graph.node),
+                region.node_ids if extract_region else [
+                    node_id for node_id in range(len(model.graph.node)) if node_id not in region_node_id_set
+                ],
+            )
+        diff_recorder.record_before(model.graph, region.input_names + region.output_names)
+        profiler.begin('rewrite')
+        if extract_region:
+            untyped_names = apply_region_extraction(model, region)
+        else:
+            untyped_names = apply_region_removal(model, region)
+        if not non_verbose:
+            print(
+                f'{Color.GREEN}INFO:{Color.RESET} '+
+                f'{"Extracted" if extract_region else "Deleted"} {len(region.node_ids)} OPs '+
+                f'between {region.input_names or "the graph inputs"} and {region.output_names}.'
+            )
+            for untyped_name in untyped_names:
+                print(
+                    f'{Color.YELLOW}WARNING:{Color.RESET} '+
+                    f'The type of {untyped_name} could not be determined. '+
+                    'Set the type of the graph input or output in the generated model.'
+                )
+        return _finish(
+            new_model=model,
+            rewired_tensor_names=set(region.input_names) | set(region.output_names),
+            input_onnx_file_path=input_onnx_file_path,
+            output_onnx_file_path=output_onnx_file_path,
+            output_onnx_file_object=output_onnx_file_object,
+            skip_unchanged_output=skip_unchanged_output,
+            onnx_graph=onnx_graph,
+            non_verbose=non_verbose,
+            shape_inference=shape_inference,
+            load_external_data=load_external_data,
+            prune=prune,
+            profiler=profiler,
+            diff_recorder=diff_recorder,
+        )
 
-    remove_nodes = [node for node in graph.nodes if node.name in remove_node_names]
+    # OPs in subgraphs (If/Loop/Scan bodies) and model-local functions are deleted first,
+    # all scopes in one pass directly in the ModelProto.
+    # This never changes the connections of the main graph.
+    profiler.begin('nested_graphs')
+    nested_index = NestedGraphIndex(model)
+    nested_plan = plan_nested_removal(
+        nested_index,
+        nested_index.select_nodes(
+            node_names=remove_node_names,
+            op_types=remove_op_types,
+            name_patterns=name_patterns,
+        ),
+        errors,
+    )
+    if nested_plan.remove_node_ids and not dry_run:
+        if model is onnx_graph:
+            # Do not modify the ModelProto of the caller
+            model = onnx.ModelProto()
+            model.CopyFrom(onnx_graph)
+            nested_index = NestedGraphIndex(model)
+        diff_recorder.record_nested_plan(nested_index, nested_plan)
+        apply_nested_removal_plan(nested_index, nested_plan)
+
+    # Simple graphs are edited as onnx.GraphProto,
+    # everything else goes through onnx_graphsurgeon.
+    # remove_node_predicate receives onnx_graphsurgeon Nodes.
+    use_fast_path = \
+        not disable_fast_path \
+        and remove_node_predicate is None \
+        and can_use_fast_path(model)
 
-    remove_output_nodes = [graph_output for graph_output in graph.outputs if graph_output.name in remove_node_names]
-    if (len(graph.outputs) - len(remove_output_nodes)) <= 0:
-        print(
-            f'{Color.RED}ERROR:{Color.RESET} '+
-            'The number of output_nodes in the graph must be at least 1.'
+    graph = None
+    if use_fast_path:
+        if model is onnx_graph and not dry_run:
+            # Do not modify the ModelProto of the caller
+            profiler.begin('load')
+            model = onnx.ModelProto()
+            model.CopyFrom(onnx_graph)
+        # Name -> node and tensor -> producer/consumer lookups built once.
+        # All membership checks below are set based.
+        profiler.begin('index')
+        index = GraphIndex(model.graph)
+    else:
+        profiler.begin('import_graph')
+        graph = gs.import_onnx(model)
+        profiler.begin('index')
+        index = GraphIndex(graph)
+
+    remove_nodes = index.select_nodes(
+        node_names=remove_node_names,
+        op_types=remove_op_types,
+        name_patterns=name_patterns,
+        predicate=remove_node_predicate,
+    )
+    # OPs selected by op type, pattern or predicate are treated
+    # exactly as if their names had been listed in remove_node_names.
+    if dry_run:
+        # Unknown names are silently ignored by the deletion itself
+        missing_node_names = [
+            name for name in remove_node_names or []
+            if name not in index.nodes_by_name and name not in nested_index.nodes_by_name
+        ]
+        if missing_node_names:
+            report(
+                NodeNotFound(
+                    f'The specified OPs do not exist in the graph. node_names: {missing_node_names}',
+                    node_names=missing_node_names,
+                )
+            )
+    remove_node_names = set(remove_node_names or [])
+    remove_node_names.update(index.nodes[remove_node_id].name for remove_node_id in remove_nodes)
+
+    def node_count_error(message: str) -> NodeCountError:
+        return NodeCountError(
+            message,
+            num_nodes=len(index.nodes),
+            num_remove_nodes=len(remove_nodes),
+            num_graph_outputs=len(index.graph_output_names),
+            num_remove_graph_outputs=len(remove_output_nodes),
+        )
+
+    remove_output_nodes = [
+        graph_output_name for graph_output_name in index.graph_output_names if graph_output_name in remove_node_names
+    ]
+    if (len(index.graph_output_names) - len(remove_output_nodes)) <= 0:
+        report(
+            node_count_error(
+                'The number of output_nodes in the graph must be at least 1.'
+            )
         )
-        sys.exit(1)
 
     # Minimum number of nodes required is 2 or more
-    if len(graph.nodes) < 2:
-        print(
-            f'{Color.RED}ERROR:{Color.RESET} '+
-            'The number of nodes in the graph must be at least 2.'
+    if len(index.nodes) < 2:
+        report(
+            node_count_error(
+                'The number of nodes in the graph must be at least 2.'
+            )
         )
-        sys.exit(1)
 
     # Minimum number of nodes after deletion is at least 1
-    if (len(graph.nodes) - len(remove_nodes)) < 1:
-        print(
-            f'{Color.RED}ERROR:{Color.RESET} '+
-            'At least one node is required for the graph after OP deletion.'
+    if (len(index.nodes) - len(remove_nodes)) < 1:
+        report(
+            node_count_error(
+                'At least one node is required for the graph after OP deletion.'
+            )
         )
-        sys.exit(1)
-
-
-    with graph.node_ids():
-        # Iteration for each node to be deleted
-        for rmnode in remove_nodes:
-            # Check if it is the first OP of the graph
-            rmnode_inputs = []
-            matched_graph_input = []
-            rmnode_is_first_op = False
-            for rmnode_input in rmnode.inputs:
-                # Only those with Variable input type are checked
-                if isinstance(rmnode_input, Variable):
-                    # Check if it matches one of the Inputs in the graph
-                    for graph_input in graph.inputs:
-                        if rmnode_input == graph_input:
-                            rmnode_is_first_op = True
-                            matched_graph_input.append(graph_input)
-                            rmnode_inputs.append(rmnode_input)
-                            break
-
-            # Check if it is the last OP in the graph
-            rmnode_outputs = []
-            matched_graph_output = []
-            rmnode_is_last_op = False
-            for rmnode_output in rmnode.outputs:
-                # Check only those outputs of type Variable
-                if isinstance(rmnode_output, Variable):
-                    # Check if it matches any of the Outputs in the graph
-                    for graph_output in graph.outputs:
-                        if rmnode_output == graph_output:
-                            rmnode_is_last_op = True
-                            matched_graph_output.append(graph_output)
-                            rmnode_outputs.append(rmnode_output)
-                            break
-
-            # OPs with two or more input OPs of a graph connected are not allowed to be deleted
-            if len(matched_graph_input) >= 2:
-                print(
-                    f'{Color.RED}ERROR:{Color.RESET} '+
-                    'It is not possible to delete an OP to which two or more Input OPs of a graph are connected. '+
-                    f'node_name: {rmnode.name}'
-                )
-                sys.exit(1)
-            # If the node to be deleted is responsible for one or more of the final Outputs,
-            # delete all of the outputs of the node to be deleted from the final Outputs of the graph.
-            # However, at least one final Output of the graph must remain.
-            final_graph_output_count = len(graph.outputs)
-            remove_outputs = []
-            for rmnode_output in rmnode.outputs:
-                for graph_output in graph.outputs:
-                    if isinstance(rmnode_output, Variable):
-                        if rmnode_output == graph_output:
-                            final_graph_output_count -= 1
-                            remove_outputs.append(rmnode_output)
-            # If the node to be deleted is responsible for one or more of the final outputs,
-            # delete all the outputs of the node to be deleted from the final output of the graph.
-            # However, only when the number of outputs of the OP remains one or more as a result of the deletion,
-            # and not when the number of outputs of the OP becomes zero.
-            if len(remove_outputs) > 0 and (len(rmnode.outputs) - len(remove_outputs)) >= 1:
-                tmp_graph_outputs = []
-                for graph_output in graph.outputs:
-                    remove_flg = False
-                    for remove_output in remove_outputs:
-                        if isinstance(rmnode_output, Variable):
-                            if graph_output == remove_output:
-                                remove_flg = True
-                                break
-                    if not remove_flg:
-                        tmp_graph_outputs.append(graph_output)
-                graph.outputs = tmp_graph_outputs
-                # Among the outputs of the OP to be deleted,
-                # the output information that was employed for the graph output is deleted.
-                for remove_output in remove_outputs:
-                    rmnode.outputs.remove(remove_output)
-
-            if rmnode_is_first_op:
-                # If it is the first OP of the graph,
-                # change the Input of the graph to the Input of the next OP of the OP to be deleted.
-                # The number of nodes is limited to two or more,
-                # so there is always a definite next node
-
-                # If two or more outputs of the OP to be deleted remain that have not been adopted as the final output of the graph,
-                # designate all remaining outputs as Inputs of the graph.
-                # Identify the next OP based on rmnode.o() of the OP to be deleted,
-                # and specify the Input of the graph for the Input of the next OP.
-                try:
-                    input_change_var_idxs = [idx for idx, input_change_var in enumerate(rmnode.o().inputs) if isinstance(input_change_var, Variable)]
-                except:
-                    # If it is directly connected to the input of the graph, and yet it is located in the middle,
-                    # and yet it is directly connected to the output of the graph,
-                    # it is inevitable that an error will occur because the output layer cannot be obtained.
-                    # Therefore, this situation, which cannot be checked in advance,
-                    # is daringly caught by exception, setting an error message and forcing termination.
-                    print(
-                        f'{Color.RED}ERROR:{Color.RESET} '+
-                        'OPs connected to the input and output of a graph simultaneously cannot be deleted.'
-                    )
-                    sys.exit(1)
-                if len(input_change_var_idxs) < len(rmnode_inputs):
-                    # If the number of inputs (Variable) of the OP to be deleted
-                    # and the number of inputs (Variable) of the next OP after the deleted OP are different,
-                    # the OP cannot be deleted because it cannot be connected.
-                    print(
-                        f'{Color.RED}ERROR:{Color.RESET} '+
-                        'If the number of inputs (Variable) of the OP to be deleted '+
-                        'and the number of inputs (Variable) of the next OP after the deleted OP are different, '+
-                        'the OP cannot be deleted because it cannot be connected.'
-                    )
-                    print(
-                        f'{Color.RED}ERROR:{Color.RESET} '+
-                        f'Remove OP inputs: {len(rmnode_inputs)}, Next OP inputs: {len(input_change_var_idxs)}'
-                    )
-                    sys.exit(1)
-                # Reset what was the input of the OP to be deleted to the next input of the OP to be deleted.
-                # However, the order of input cannot be verified at all,
-                # because it is set unconditionally from the first to the last.
-                for input_change_vars_idx, rmnode_input in zip(input_change_var_idxs, rmnode_inputs):
-                    change_output_shape = None
-                    next_op_index = None
-                    if len(rmnode.o().inputs[input_change_vars_idx].outputs) == 1:
-                        # Memorize the modified output shape only for operation types where the next OP
-                        # is known to not change the output shape relative to the input shape.
-                        if rmnode.o().inputs[input_change_vars_idx].outputs[0].op in OP_TYPES_WITH_AUTOMATIC_ADJUSTMENT_OF_OUTPUT_SHAPE:
-                            change_output_shape = rmnode_input.shape
-                            next_op_index = rmnode.o().inputs[input_change_vars_idx].outputs[0].id
-
-
-                    # Check if the input of the OP to be deleted has an OP input other than the input of the graph
-                    rmnode_inputs_not_in_graph_inputs = {idx: rmnode_input for idx, rmnode_input in enumerate(rmnode.inputs) if isinstance(rmnode_input, Variable)}
-                    if len(rmnode_inputs_not_in_graph_inputs) >= 1:
-                        # Set the output of the OP before the OP to be deleted to the input of the OP following the OP to be deleted.
-                        # Force the input with the smallest sequential number among multiple inputs.
-                        for idx, rmnode_input in enumerate(rmnode.o().inputs):
-                            for rmnode_output in rmnode.outputs:
-                                if rmnode_input == rmnode_output:
-                                    rmnode.o().inputs[idx] = list(rmnode_inputs_not_in_graph_inputs.values())[0]
-                                    break
-                            else:
-                                continue
-                            break
-
-                        if not non_verbose:
-                            print(
-                                f'{Color.YELLOW}WARNING:{Color.RESET} '+
-                                'There may be a mismatch in the input/output shapes '+
-                                'before and after the OP to be deleted. Check the graph carefully.'
-                            )
-
-                        # Forces the shape of the Output of the next OP to fit the input shape of the OP to be deleted.
-                        if change_output_shape is not None:
-                            for output in graph.nodes[next_op_index].outputs:
-                                if isinstance(output, Variable):
-                                    output.shape = change_output_shape
-                                    break
-
-                # Clear all output of OPs to be deleted
-                rmnode.outputs.clear()
-
-            if rmnode_is_last_op:
-                # If it was the last OP in the graph
-                # Reassign the output specified as Input for the OP to be deleted to the output of the graph.
-
-                # Deletes the Output of the OP to be deleted from the Output of the graph.
-                for remove_output in matched_graph_output:
-                    if remove_output in graph.outputs:
-                        graph.outputs.remove(remove_output)
-                # Add the Input of the OP to be deleted to the Output of the graph.
-                for rmnode_input in rmnode.inputs:
-                    graph.outputs.append(rmnode_input)
-                # Clear all output of OPs to be deleted
-                rmnode.outputs.clear()
-
-            if not rmnode_is_first_op and not rmnode_is_last_op:
-                # If it was neither the first nor the last OP
-                # Re-designate what was designated as Input of the OP to be deleted as Input of the next OP.
-                # However, if there is a gap between the number of inputs in the OP to be deleted
-                # and the number of inputs in the next OP, an error occurs.
-                inp_node = rmnode.i()
-                out_node = rmnode.o()
-
-                output_change_var_idxs = [idx for idx, output_change_var in enumerate(inp_node.outputs) if isinstance(output_change_var, Variable)]
-                input_change_var_idxs = [idx for idx, input_change_var in enumerate(out_node.inputs) if isinstance(input_change_var, Variable)]
-
-                if len(output_change_var_idxs) != len(input_change_var_idxs):
-                    print(
-                        f'{Color.RED}ERROR:{Color.RESET} '+
-                        'If the number of outputs of the OP immediately before the OP to be deleted '+
-                        'is different from the number of inputs of the OP immediately after the OP to be deleted, '+
-                        'the OP cannot be automatically reconnected.'
-                    )
-                    print(
-                        f'{Color.RED}ERROR:{Color.RESET} '+
-                        f'Remove OP inputs: {len(rmnode_inputs)}, Next OP inputs: {len(input_change_var_idxs)}'
-                    )
-                    sys.exit(1)
-
-                for output_change_var_idx, input_change_var_idx in zip(output_change_var_idxs, input_change_var_idxs):
-                    rmnode.i().outputs[output_change_var_idx] = rmnode.o().inputs[input_change_var_idx]
-
-                # Clear all output of OPs to be deleted
-                rmnode.outputs.clear()
-
-            if rmnode_is_first_op and rmnode_is_last_op:
-                # If it is both the first and the last OP,
-                # it is considered too complicated to process and is warn for the time being.
-                if not non_verbose:
-                    print(
-                        f'{Color.YELLOW}WARNING:{Color.RESET} '+
-                        'Since the OP to be deleted is both the beginning and the end of the graph, '+
-                        'it is treated as unprocessable at this time. '+
-                        'Carefully check the geometry of the generated model.'
-                    )
-
-    graph.cleanup().toposort()
-
-    # Delete any unused graph inputs
-    remove_graph_inputs = []
-    for graph_input in graph.inputs:
-        graph_unused_input = True
-        for node in graph.nodes:
-            for node_input in node.inputs:
-                if graph_input == node_input:
-                    graph_unused_input = False
-                    break
-            else:
-                continue
-            break
-        if graph_unused_input:
-            remove_graph_inputs.append(graph_input)
-    for remove_graph_input in remove_graph_inputs:
-        graph.inputs.remove(remove_graph_input)
-    graph.cleanup().toposort()
-
-    # Delete output nodes
-    graph.outputs = [graph_output for graph_output in graph.outputs if graph_output.name not in remove_node_names]
-
-    graph.cleanup().toposort()
-
-    new_model = None
+
+
+    # Work out the rewiring of the whole batch first, then rewrite the edges at once
+    profiler.begin('plan')
+    plan = plan_removal(index, remove_nodes, errors)
+    if dry_run:
+        return errors
+    if use_fast_path and plan.shape_overrides:
+        # Forced output shapes are handled by onnx_graphsurgeon
+        use_fast_path = False
+        profiler.begin('import_graph')
+        graph = gs.import_onnx(model)
+        profiler.begin('index')
+        index = GraphIndex(graph)
+        profiler.begin('plan')
+        # gs.import_onnx() keeps the nodes in graph order, so the selected node ids stay valid
+        plan = plan_removal(index, remove_nodes)
+    if profiler.enabled:
+        profiler.report.fast_path = use_fast_path
+    diff_recorder.record_plan(index, plan)
+    diff_recorder.record_before(model.graph, plan.rewired_tensor_names | set(plan.shape_overrides))
+
+    if not non_verbose:
+        for warning in nested_plan.warnings + plan.warnings:
+            print(
+                f'{Color.YELLOW}WARNING:{Color.RESET} '+
+                warning
+            )
+
+    if use_fast_path:
+        # Rewiring and cleanup in one step
+        profiler.begin('rewrite')
+        kept_node_ids = [] if diff_recorder.enabled else None
+        new_model = apply_removal_plan_to_model(model, index, plan, remove_node_names, cleanup_once, kept_node_ids)
+        diff_recorder.record_kept_nodes(index.nodes, kept_node_ids)
+
+    else:
+        profiler.begin('rewrite')
+        # Subgraphs refer to the tensors of the main graph by name
+        outer_renames = main_graph_renames(index, plan)
+        diff_recorder.record_outer_renames(nested_index, outer_renames)
+        apply_removal_plan(graph, index, plan)
+
+        profiler.begin('cleanup')
+        if len(nested_index.scopes) == 0:
+            # Without subgraphs, the outcome of the cleanup passes below is known from the plan,
+            # so the graph is cut down in one step instead of repeated graph.cleanup() and toposort()
+            live_node_ids, graph_input_names, graph_output_names = \
+                plan_cleanup(index, plan, remove_node_names, cleanup_once)
+            graph_input_name_set = set(graph_input_names)
+            graph.nodes = [node for node_id, node in enumerate(index.nodes) if node_id in live_node_ids]
+            graph.inputs = [graph_input for graph_input in graph.inputs if graph_input.name in graph_input_name_set]
+            graph.outputs = [index.tensors[graph_output_name] for graph_output_name in graph_output_names]
+            # The plan keeps a topologically sorted graph sorted
+            if not index.is_topologically_sorted():
+                graph.toposort()
+
+        elif cleanup_once:
+            # Delete output nodes, unused nodes and unused graph inputs in a single pass
+            graph.outputs = [graph_output for graph_output in graph.outputs if graph_output.name not in remove_node_names]
+            graph.cleanup(remove_unused_graph_inputs=True).toposort()
+
+        else:
+            graph.cleanup().toposort()
+
+            # Delete any unused graph inputs
+            remove_graph_input_names = {
+                remove_graph_input.name for remove_graph_input in GraphIndex.unused_graph_inputs(graph)
+            }
+            graph.inputs = [graph_input for graph_input in graph.inputs if graph_input.name not in remove_graph_input_names]
+            graph.cleanup().toposort()
+
+            # Delete output nodes
+            graph.outputs = [graph_output for graph_output in graph.outputs if graph_output.name not in remove_node_names]
+
+            graph.cleanup().toposort()
+
+        if diff_recorder.enabled:
+            # Cleanup keeps the gs.Node objects of the index
+            node_ids = {id(node): node_id for node_id, node in enumerate(index.nodes)}
+            diff_recorder.record_kept_nodes(index.nodes, [node_ids[id(node)] for node in graph.nodes])
+
+        profiler.begin('export')
+        new_model = gs.export_onnx(graph)
+        rename_outer_references(new_model, outer_renames)
+
+    return _finish(
+        new_model=new_model,
+        rewired_tensor_names=plan.rewired_tensor_names,
+        input_onnx_file_path=input_onnx_file_path,
+        output_onnx_file_path=output_onnx_file_path,
+        output_onnx_file_object=output_onnx_file_object,
+        skip_unchanged_output=skip_unchanged_output,
+        onnx_graph=onnx_graph,
+        non_verbose=non_verbose,
+        shape_inference=shape_inference,
+        load_external_data=load_external_data,
+        prune=prune,
+        profiler=profiler,
+        diff_recorder=diff_recorder,
+    )
+
+
+def _finish(
+    new_model: onnx.ModelProto,
+    rewired_tensor_names: Set[str],
+    input_onnx_file_path: Optional[str],
+    output_onnx_file_path: Optional[str],
+    output_onnx_file_object: Optional[IO[bytes]],
+    skip_unchanged_output: Optional[bool],
+    onnx_graph: Optional[onnx.ModelProto],
+    non_verbose: Optional[bool],
+    shape_inference: Optional[str],
+    load_external_data: Optional[bool],
+    prune: Optional[bool],
+    profiler: RemoveProfiler,
+    diff_recorder: RemovalDiffRecorder,
+) -> onnx.ModelProto:
+    """
+    Pruning, shape inference and saving of the generated model.
+    """
+
+    if prune:
+        profiler.begin('prune')
+        prune_stats = prune_model(new_model)
+        diff_recorder.record_pruned_nodes(prune_stats.removed_node_positions)
+        if not non_verbose:
+            print(
+                f'{Color.GREEN}INFO:{Color.RESET} '+
+                f'Pruned {prune_stats.removed_nodes} OPs, {prune_stats.removed_graph_inputs} graph inputs, '+
+                f'{prune_stats.removed_initializers} initializers ({prune_stats.removed_initializer_bytes} bytes). '+
+                f'Merged {prune_stats.merged_initializers} duplicate initializers ({prune_stats.merged_initializer_bytes} bytes).'
+            )
+    profiler.count_after(new_model)
+
+    profiler.begin('shape_inference')
+    shape_mismatches = []
     try:
-        new_model = onnx.shape_inference.infer_shapes(gs.export_onnx(graph))
+        if shape_inference == 'full':
+            new_model = onnx.shape_inference.infer_shapes(new_model)
+        elif shape_inference == 'local':
+            shape_mismatches = propagate_shapes(new_model, rewired_tensor_names)
     except:
-        new_model = gs.export_onnx(graph)
         print(
             f'{Color.YELLOW}WARNING:{Color.RESET} '+
             'The input shape of the next OP does not match the output shape. '+
             'Be sure to open the .onnx file to verify the certainty of the geometry.'
         )
+        if shape_inference == 'full':
+            # Shapes of the reconnected part at least, and where they do not fit
+            shape_mismatches = propagate_shapes(new_model, rewired_tensor_names)
+    for shape_mismatch in shape_mismatches:
+        print(
+            f'{Color.YELLOW}WARNING:{Color.RESET} '+
+            f'Shape mismatch at {shape_mismatch.tensor_name}: '+
+            f'{shape_mismatch.producer_name or "(graph input)"} -> {shape_mismatch.consumer_name or "(graph output)"}. '+
+            f'{shape_mismatch.message}'
+        )
+
+    if diff_recorder.enabled:
+        profiler.begin('diff')
+        diff_recorder.record_after(new_model.graph)
 
     # Save
-    if output_onnx_file_path:
-        onnx.save(new_model, f'{output_onnx_file_path}')
+    if output_onnx_file_path or output_onnx_file_object is not None:
+        profiler.begin('save')
+        # External data of an input file that was not loaded is relative to the input file
+        external_data_dir = None
+        if not onnx_graph and not load_external_data:
+            external_data_dir = os.path.dirname(os.path.abspath(input_onnx_file_path))
+        written = save_model(
+            new_model,
+            output_onnx_file_object if output_onnx_file_object is not None else f'{output_onnx_file_path}',
+            external_data_dir,
+            skip_unchanged=skip_unchanged_output,
+        )
+        if not written and not non_verbose:
+            print(
+                f'{Color.GREEN}INFO:{Color.RESET} '+
+                f'{output_onnx_file_path} is unchanged and was not written.'
+            )
 
     if not non_verbose:
         print(f'{Color.GREEN}INFO:{Color.RESET} Finish!')
@@ -383,50 +799,5 @@ def remove(
     return new_model
 
 
-def main():
-    parser = ArgumentParser()
-    parser.add_argument(
-        '-rn',
-        '--remove_node_names',
-        type=str,
-        required=True,
-        nargs='+',
-        help='ONNX node name to be deleted.'
-    )
-    parser.add_argument(
-        '-if',
-        '--input_onnx_file_path',
-        type=str,
-        required=True,
-        help='Input onnx file path.'
-    )
-    parser.add_argument(
-        '-of',
-        '--output_onnx_file_path',
-        type=str,
-        required=True,
-        help='Output onnx file path.'
-    )
-    parser.add_argument(
-        '-n',
-        '--non_verbose',
-        action='store_true',
-        help='Do not show all information logs. Only error logs are displayed.'
-    )
-    args = parser.parse_args()
-
-    remove_node_names = args.remove_node_names
-    input_onnx_file_path = args.input_onnx_file_path
-    output_onnx_file_path = args.output_onnx_file_path
-    non_verbose = args.non_verbose
-
-    onnx_graph = remove(
-        remove_node_names=remove_node_names,
-        input_onnx_file_path=input_onnx_file_path,
-        output_onnx_file_path=output_onnx_file_path,
-        non_verbose=non_verbose,
-    )
-
-
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+
+import time
+import tracemalloc
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import onnx
+
+
+class PhaseProfile(NamedTuple):
+    """
+    Wall time and memory of one phase of remove().
+    """
+    name: str
+    wall_time_sec: float
+    peak_memory_bytes: Optional[int]
+
+
+class RemoveProfile:
+    """
+    Per-phase report of one remove() call.
+
+    Attributes
+    ----------
+    phases: List[PhaseProfile]
+        Phases in execution order.\n\
+        load, nested_graphs, import_graph, index, plan, rewrite, cleanup, export, prune, shape_inference, diff, save, verify.\n\
+        Phases that were not executed are omitted.
+
+    fast_path: bool
+        Whether the onnx.GraphProto was edited directly instead of through onnx_graphsurgeon.
+
+    nodes_before, nodes_after: int
+        Number of OPs in the main graph before and after deletion.
+
+    tensors_before, tensors_after: int
+        Number of distinct tensors (graph inputs, initializers, OP inputs and outputs)
+        in the main graph before and after deletion.
+
+    total_wall_time_sec: float
+        Sum of the wall time of all phases.
+    """
+
+    def __init__(self):
+        self.phases: List[PhaseProfile] = []
+        self.fast_path = False
+        self.nodes_before = 0
+        self.nodes_after = 0
+        self.tensors_before = 0
+        self.tensors_after = 0
+
+    @property
+    def total_wall_time_sec(self) -> float:
+        return sum(phase.wall_time_sec for phase in self.phases)
+
+    def to_dict(self) -> Dict:
+        return {
+            'fast_path': self.fast_path,
+            'total_wall_time_sec': self.total_wall_time_sec,
+            'nodes_before': self.nodes_before,
+            'nodes_after': self.nodes_after,
+            'tensors_before': self.tensors_before,
+            'tensors_after': self.tensors_after,
+            'phases': [phase._asdict() for phase in self.phases],
+        }
+
+    def format(self) -> str:
+        lines = [
+            f'{"phase":<16} {"wall time [sec]":>16} {"peak memory [MB]":>17}',
+        ]
+        for phase in self.phases:
+            peak_memory = \
+                f'{phase.peak_memory_bytes / 1024 / 1024:>17.2f}' if phase.peak_memory_bytes is not None else f'{"n/a":>17}'
+            lines.append(
+                f'{phase.name:<16} {phase.wall_time_sec:>16.4f} {peak_memory}'
+            )
+        lines.append(f'{"total":<16} {self.total_wall_time_sec:>16.4f}')
+        lines.append(f'nodes: {self.nodes_before} -> {self.nodes_after}')
+        lines.append(f'tensors: {self.tensors_before} -> {self.tensors_after}')
+        lines.append(f'path: {"fast path" if self.fast_path else "onnx_graphsurgeon"}')
+        return '\n'.join(lines)
+
+
+def count_nodes_and_tensors(
+    model: onnx.ModelProto,
+) -> Tuple[int, int]:
+    """
+    Number of OPs and distinct tensors of the main graph of model.
+    """
+    graph = model.graph
+    tensor_names = {graph_input.name for graph_input in graph.input}
+    tensor_names.update(initializer.name for initializer in graph.initializer)
+    for node in graph.node:
+        tensor_names.update(node.input)
+        tensor_names.update(node.output)
+    tensor_names.discard('')
+    return len(graph.node), len(tensor_names)
+
+
+class RemoveProfiler:
+    """
+    Collects a RemoveProfile while remove() runs.
+
+    begin() ends the current phase and starts the next one, end() ends the last one.
+    When disabled, every method returns immediately.
+    Memory is traced with tracemalloc, which is started and stopped by the profiler
+    unless the caller is already tracing. Without trace_memory, peak_memory_bytes is 0
+    and remove() runs at full speed.
+    The peak of each phase needs tracemalloc.reset_peak() (Python 3.9+). On older Pythons
+    memory is not traced and peak_memory_bytes is None.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        trace_memory: Optional[bool] = True,
+    ):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        # Without reset_peak() the peak of a phase would include the peaks of all phases before it
+        self._peak_memory_unavailable = self.trace_memory and not hasattr(tracemalloc, 'reset_peak')
+        if self._peak_memory_unavailable:
+            self.trace_memory = False
+        self.report = RemoveProfile() if enabled else None
+        self._phase_name: Optional[str] = None
+        self._phase_start = 0.0
+        self._phase_start_memory = 0
+        self._started_tracemalloc = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def begin(
+        self,
+        name: str,
+    ):
+        if not self.enabled:
+            return
+        self.end()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self._phase_start_memory = tracemalloc.get_traced_memory()[0]
+        self._phase_name = name
+        self._phase_start = time.perf_counter()
+
+    def end(self):
+        if not self.enabled or self._phase_name is None:
+            return
+        wall_time_sec = time.perf_counter() - self._phase_start
+        if self._peak_memory_unavailable:
+            peak_memory_bytes = None
+        elif self.trace_memory:
+            peak_memory_bytes = max(0, tracemalloc.get_traced_memory()[1] - self._phase_start_memory)
+        else:
+            peak_memory_bytes = 0
+        self.report.phases.append(
+            PhaseProfile(
+                name=self._phase_name,
+                wall_time_sec=wall_time_sec,
+                peak_memory_bytes=peak_memory_bytes,
+            )
+        )
+        self._phase_name = None
+
+    def _count(
+        self,
+        model: onnx.ModelProto,
+    ) -> Tuple[int, int]:
+        # Counting is not part of the phase it runs in
+        start = time.perf_counter()
+        counts = count_nodes_and_tensors(model)
+        self._phase_start += time.perf_counter() - start
+        return counts
+
+    def count_before(
+        self,
+        model: onnx.ModelProto,
+    ):
+        if self.enabled:
+            self.report.nodes_before, self.report.tensors_before = self._count(model)
+
+    def count_after(
+        self,
+        model: onnx.ModelProto,
+    ):
+        if self.enabled:
+            self.report.nodes_after, self.report.tensors_after = self._count(model)
+
+    def close(self):
+        """
+        End the current phase and stop tracemalloc if it was started by the profiler.
+        """
+        self.end()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
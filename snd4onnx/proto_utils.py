@@ -0,0 +1,22 @@
+#! /usr/bin/env python
+
+from typing import List
+
+
+def delete_by_index(
+    repeated,
+    delete_idxs: List[int],
+):
+    """
+    Delete elements of a protobuf repeated field in place.
+    Consecutive indices are deleted as one slice, and the remaining elements
+    (e.g. initializers) are neither copied nor re-serialized.
+    """
+    runs = []
+    for idx in sorted(delete_idxs):
+        if runs and runs[-1][1] == idx:
+            runs[-1][1] = idx + 1
+        else:
+            runs.append([idx, idx + 1])
+    for start, stop in reversed(runs):
+        del repeated[start:stop]
@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+
+import hashlib
+from typing import Dict, List, NamedTuple, Tuple
+import onnx
+from onnx.external_data_helper import uses_external_data
+from snd4onnx.external_data import tensor_data_bytes
+from snd4onnx.nested_graphs import outer_references, rename_outer_references
+from snd4onnx.proto_utils import delete_by_index
+
+
+class PruneStats(NamedTuple):
+    """
+    What prune_model() deleted from the main graph.
+    removed_node_positions are the positions of the deleted OPs in graph.node before pruning.
+    """
+    removed_nodes: int
+    removed_graph_inputs: int
+    removed_initializers: int
+    removed_initializer_bytes: int
+    merged_initializers: int
+    merged_initializer_bytes: int
+    removed_node_positions: List[int]
+
+
+def _initializer_data(
+    initializer: onnx.TensorProto,
+) -> bytes:
+    # raw_data as it is, other storage serialized without the name
+    if initializer.HasField('raw_data'):
+        return initializer.raw_data
+    unnamed = onnx.TensorProto()
+    unnamed.CopyFrom(initializer)
+    unnamed.ClearField('name')
+    unnamed.ClearField('doc_string')
+    return unnamed.SerializeToString()
+
+
+def merge_duplicate_initializers(
+    model: onnx.ModelProto,
+) -> Tuple[int, int]:
+    """
+    Replace initializers of the main graph that have the same type, shape and bytes
+    as an earlier initializer with that initializer, in place.
+
+    Initializers that are graph inputs or graph outputs, and initializers whose data
+    is stored as external data, are never merged.
+
+    Returns
+    -------
+    merged_initializers: int
+        Number of initializers deleted.
+
+    merged_initializer_bytes: int
+        Their total data size.
+    """
+    graph = model.graph
+    fixed_names = {graph_input.name for graph_input in graph.input}
+    fixed_names.update(graph_output.name for graph_output in graph.output)
+
+    first_by_key: Dict[Tuple[int, Tuple[int, ...], bytes], onnx.TensorProto] = {}
+    renames: Dict[str, str] = {}
+    merged_idxs: List[int] = []
+    merged_bytes = 0
+    for idx, initializer in enumerate(graph.initializer):
+        if initializer.name in fixed_names or uses_external_data(initializer):
+            continue
+        data = _initializer_data(initializer)
+        key = (initializer.data_type, tuple(initializer.dims), hashlib.sha256(data).digest())
+        first = first_by_key.setdefault(key, initializer)
+        if first is initializer:
+            continue
+        # Equal hashes are confirmed byte by byte
+        if _initializer_data(first) != data:
+            continue
+        renames[initializer.name] = first.name
+        merged_idxs.append(idx)
+        merged_bytes += tensor_data_bytes(initializer)
+    if not renames:
+        return 0, 0
+
+    for node in graph.node:
+        for idx, node_input in enumerate(node.input):
+            if node_input in renames:
+                node.input[idx] = renames[node_input]
+    rename_outer_references(model, renames)
+    delete_by_index(graph.initializer, merged_idxs)
+    delete_by_index(
+        graph.value_info,
+        [idx for idx, value_info in enumerate(graph.value_info) if value_info.name in renames],
+    )
+    return len(merged_idxs), merged_bytes
+
+
+def prune_model(
+    model: onnx.ModelProto,
+    merge_initializers: bool = True,
+) -> PruneStats:
+    """
+    Delete everything of the main graph of model that does not contribute to its outputs, in place.
+
+    model.graph must be topologically sorted, as the graphs generated by remove() are.
+    A single backward sweep over the OPs marks the tensors that are
+    reachable from graph.outputs. Subgraphs keep every tensor of the main graph they refer to.
+    OPs, graph inputs, initializers and value_info of unmarked tensors are then deleted
+    in one pass each, and identical initializers are merged (merge_duplicate_initializers()).
+
+    Returns
+    -------
+    stats: PruneStats
+        Counts of what was deleted.
+    """
+    graph = model.graph
+    live_names = {graph_output.name for graph_output in graph.output}
+    dead_node_idxs = []
+    for idx in reversed(range(len(graph.node))):
+        node = graph.node[idx]
+        if not any(node_output in live_names for node_output in node.output):
+            dead_node_idxs.append(idx)
+            continue
+        live_names.update(node.input)
+        live_names.update(outer_references(node))
+    live_names.discard('')
+    delete_by_index(graph.node, dead_node_idxs)
+
+    dead_graph_input_idxs = [
+        idx for idx, graph_input in enumerate(graph.input) if graph_input.name not in live_names
+    ]
+    delete_by_index(graph.input, dead_graph_input_idxs)
+
+    dead_initializer_idxs = [
+        idx for idx, initializer in enumerate(graph.initializer) if initializer.name not in live_names
+    ]
+    removed_initializer_bytes = sum(tensor_data_bytes(graph.initializer[idx]) for idx in dead_initializer_idxs)
+    delete_by_index(graph.initializer, dead_initializer_idxs)
+
+    delete_by_index(
+        graph.value_info,
+        [idx for idx, value_info in enumerate(graph.value_info) if value_info.name not in live_names],
+    )
+
+    merged_initializers, merged_initializer_bytes = \
+        merge_duplicate_initializers(model) if merge_initializers else (0, 0)
+
+    return PruneStats(
+        removed_nodes=len(dead_node_idxs),
+        removed_graph_inputs=len(dead_graph_input_idxs),
+        removed_initializers=len(dead_initializer_idxs),
+        removed_initializer_bytes=removed_initializer_bytes,
+        merged_initializers=merged_initializers,
+        merged_initializer_bytes=merged_initializer_bytes,
+        removed_node_positions=sorted(dead_node_idxs),
+    )
@@ -0,0 +1,434 @@
+#! /usr/bin/env python
+
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import onnx
+from onnx import helper
+from snd4onnx.exceptions import SndError, InvalidArgumentError, NodeCountError
+from snd4onnx.graph_index import GraphIndex
+from snd4onnx.proto_utils import delete_by_index
+from snd4onnx.nested_graphs import outer_references
+from snd4onnx.removal_plan import _raise_or_collect
+
+
+class Region(NamedTuple):
+    """
+    OPs of the main graph enclosed by boundary tensors, found by find_region().
+
+    Attributes
+    ----------
+    node_ids: List[int]
+        Ids of the OPs of the region, in graph order.
+
+    input_names: List[str]
+        Boundary tensors the region starts from.
+
+    output_names: List[str]
+        Boundary tensors the region ends at.
+
+    graph_input_names: List[str]
+        Graph inputs, other than input_names, that the region reads.
+
+    initializer_names: Set[str]
+        Initializers, other than input_names, that the region reads.
+
+    escaping_names: List[str]
+        Tensors produced in the region, other than output_names,\n\
+        that OPs outside of the region read.
+    """
+    node_ids: List[int]
+    input_names: List[str]
+    output_names: List[str]
+    graph_input_names: List[str]
+    initializer_names: Set[str]
+    escaping_names: List[str]
+
+
+def _node_inputs(
+    index: GraphIndex,
+    node_id: int,
+    references: Dict[int, Set[str]],
+) -> List[str]:
+    # Inputs of the OP, followed by the names of the main graph its subgraphs refer to
+    return index.node_inputs[node_id] + sorted(references.get(node_id, ()))
+
+
+def find_region(
+    graph: onnx.GraphProto,
+    input_names: List[str],
+    output_names: List[str],
+    errors: Optional[List[SndError]] = None,
+) -> Region:
+    """
+    Find the OPs between input_names and output_names in a single backward traversal
+    from output_names that stops at input_names, graph inputs and initializers.
+
+    Parameters
+    ----------
+    graph: onnx.GraphProto
+        Main graph of the model.
+
+    input_names: List[str]
+        Boundary tensors the region starts from. May be empty,\n\
+        then the region reaches up to the graph inputs.
+
+    output_names: List[str]
+        Boundary tensors the region ends at.
+
+    errors: Optional[List[SndError]]
+        If specified, problems are appended to it instead of raised.
+
+    Returns
+    -------
+    region: Region
+        OPs of the region and the tensors it reads.
+    """
+    index = GraphIndex(graph)
+    known_names = set(index.producers) | set(index.graph_input_names) | index.constant_names
+    unknown_names = [
+        name for name in list(input_names) + list(output_names) if name not in known_names
+    ]
+    if unknown_names:
+        _raise_or_collect(
+            InvalidArgumentError(
+                f'The specified boundary tensors do not exist in the graph. tensor_names: {unknown_names}'
+            ),
+            errors,
+        )
+
+    # Names of the main graph used inside subgraphs, per OP
+    references: Dict[int, Set[str]] = {}
+    for node_id, node in enumerate(index.nodes):
+        if any(
+            attribute.type in (onnx.AttributeProto.GRAPH, onnx.AttributeProto.GRAPHS)
+            for attribute in node.attribute
+        ):
+            references[node_id] = outer_references(node) & known_names
+
+    stop_names = set(input_names)
+    graph_input_names = set(index.graph_input_names)
+    reached_input_names: Set[str] = set()
+    reached_graph_input_names: Set[str] = set()
+    initializer_names: Set[str] = set()
+    region_node_ids: Set[int] = set()
+    stack = [name for name in output_names if name in known_names]
+    visited = set(stack)
+    while stack:
+        tensor_name = stack.pop()
+        if tensor_name in stop_names:
+            reached_input_names.add(tensor_name)
+            continue
+        node_id = index.producers.get(tensor_name, None)
+        if node_id is None:
+            if tensor_name in index.constant_names:
+                initializer_names.add(tensor_name)
+            elif tensor_name in graph_input_names:
+                reached_graph_input_names.add(tensor_name)
+            continue
+        if node_id in region_node_ids:
+            continue
+        region_node_ids.add(node_id)
+        for input_name in _node_inputs(index, node_id, references):
+            if input_name and input_name not in visited:
+                visited.add(input_name)
+                stack.append(input_name)
+
+    unreached_names = [
+        name for name in input_names if name in known_names and name not in reached_input_names
+    ]
+    if unreached_names:
+        _raise_or_collect(
+            InvalidArgumentError(
+                f'The specified input boundary tensors are not upstream of the output boundary tensors. '+
+                f'tensor_names: {unreached_names}'
+            ),
+            errors,
+        )
+    if not region_node_ids and not unknown_names:
+        _raise_or_collect(
+            InvalidArgumentError(
+                f'There is no OP between the specified boundary tensors. '+
+                f'input_names: {list(input_names)} output_names: {list(output_names)}'
+            ),
+            errors,
+        )
+
+    # Tensors of the region read by OPs outside of it
+    # Output boundary tensors, and tensors already found
+    skip_names = set(output_names)
+    escaping_names = []
+    for node_id in range(len(index.nodes)):
+        if node_id in region_node_ids:
+            continue
+        for input_name in _node_inputs(index, node_id, references):
+            if input_name in skip_names:
+                continue
+            if index.producers.get(input_name, None) in region_node_ids:
+                escaping_names.append(input_name)
+                skip_names.add(input_name)
+
+    return Region(
+        node_ids=sorted(region_node_ids),
+        input_names=list(input_names),
+        output_names=list(output_names),
+        graph_input_names=[name for name in index.graph_input_names if name in reached_graph_input_names],
+        initializer_names=initializer_names,
+        escaping_names=escaping_names,
+    )
+
+
+def _value_infos(
+    model: onnx.ModelProto,
+    names: List[str],
+) -> Tuple[Dict[str, onnx.ValueInfoProto], List[str]]:
+    """
+    Copies of the value infos of names, for boundary tensors promoted to graph inputs or outputs.
+    Tensors without a known type are looked up once with onnx.shape_inference.
+
+    Returns
+    -------
+    value_infos: Dict[str, onnx.ValueInfoProto]
+        Tensor name -> value info.
+
+    untyped_names: List[str]
+        Names whose type could not be determined. Their value info has no type.
+    """
+    graph = model.graph
+    known = {}
+    for value_info in list(graph.value_info) + list(graph.input) + list(graph.output):
+        if value_info.type.WhichOneof('value') is not None:
+            known.setdefault(value_info.name, value_info)
+    for initializer in graph.initializer:
+        if initializer.name not in known:
+            known[initializer.name] = helper.make_tensor_value_info(
+                initializer.name, initializer.data_type, list(initializer.dims)
+            )
+    if any(name not in known for name in names):
+        try:
+            inferred_graph = onnx.shape_inference.infer_shapes(model).graph
+            for value_info in inferred_graph.value_info:
+                if value_info.type.WhichOneof('value') is not None:
+                    known.setdefault(value_info.name, value_info)
+        except Exception:
+            pass
+
+    value_infos = {}
+    untyped_names = []
+    for name in names:
+        value_info = onnx.ValueInfoProto()
+        if name in known:
+            value_info.CopyFrom(known[name])
+        else:
+            value_info.name = name
+            untyped_names.append(name)
+        value_infos[name] = value_info
+    return value_infos, untyped_names
+
+
+def _removal_boundaries(
+    graph: onnx.GraphProto,
+    region: Region,
+) -> Tuple[Set[str], Set[str], List[str], List[str], List[str]]:
+    """
+    Returns
+    -------
+    produced_names: Set[str]
+        Tensors produced in the region.
+
+    read_names: Set[str]
+        Tensors read by the OPs outside of the region.
+
+    remaining_output_names: List[str]
+        Graph outputs not produced in the region.
+
+    promoted_output_names: List[str]
+        Input boundary tensors that become graph outputs.
+
+    promoted_input_names: List[str]
+        Output boundary tensors that become graph inputs.
+    """
+    region_node_ids = set(region.node_ids)
+    produced_names = {
+        node_output for node_id in region_node_ids for node_output in graph.node[node_id].output
+    }
+    read_names = set()
+    for node_id, node in enumerate(graph.node):
+        if node_id in region_node_ids:
+            continue
+        read_names.update(node.input)
+        read_names.update(outer_references(node))
+
+    graph_input_names = {graph_input.name for graph_input in graph.input}
+    initializer_names = {initializer.name for initializer in graph.initializer}
+    remaining_output_names = [
+        graph_output.name for graph_output in graph.output if graph_output.name not in produced_names
+    ]
+    promoted_output_names = [
+        name for name in region.input_names
+        if name not in produced_names and name not in graph_input_names and name not in initializer_names
+        and name not in remaining_output_names
+    ]
+    promoted_input_names = [
+        name for name in region.output_names
+        if name in produced_names and name in read_names
+    ]
+    return produced_names, read_names, remaining_output_names, promoted_output_names, promoted_input_names
+
+
+def check_region_removal(
+    graph: onnx.GraphProto,
+    region: Region,
+    errors: Optional[List[SndError]] = None,
+):
+    """
+    Check that the OPs of region can be deleted from graph by apply_region_removal().
+
+    Parameters
+    ----------
+    errors: Optional[List[SndError]]
+        If specified, problems are appended to it instead of raised.
+    """
+    if region.escaping_names:
+        _raise_or_collect(
+            InvalidArgumentError(
+                f'Tensors produced in the region are read outside of it. '+
+                f'Specify them as input or output boundary tensors. tensor_names: {region.escaping_names}'
+            ),
+            errors,
+        )
+
+    _, _, remaining_output_names, promoted_output_names, _ = _removal_boundaries(graph, region)
+    def node_count_error(message: str) -> NodeCountError:
+        return NodeCountError(
+            message,
+            num_nodes=len(graph.node),
+            num_remove_nodes=len(region.node_ids),
+            num_graph_outputs=len(graph.output),
+            num_remove_graph_outputs=len(graph.output) - len(remaining_output_names),
+        )
+
+    if not remaining_output_names and not promoted_output_names:
+        _raise_or_collect(
+            node_count_error(
+                'The number of output_nodes in the graph must be at least 1.'
+            ),
+            errors,
+        )
+    if len(graph.node) - len(region.node_ids) < 1:
+        _raise_or_collect(
+            node_count_error(
+                'At least one node is required for the graph after OP deletion.'
+            ),
+            errors,
+        )
+
+
+def apply_region_removal(
+    model: onnx.ModelProto,
+    region: Region,
+) -> List[str]:
+    """
+    Delete the OPs of region from the main graph of model at once, in place.
+    Call check_region_removal() first.
+
+    Output boundary tensors still read by the rest of the graph become graph inputs,
+    and input boundary tensors produced by the rest of the graph become graph outputs.
+    Graph outputs produced in the region are deleted,
+    as are graph inputs and initializers only the region read.
+
+    Returns
+    -------
+    untyped_names: List[str]
+        Promoted boundary tensors whose type could not be determined.
+    """
+    graph = model.graph
+    produced_names, read_names, remaining_output_names, promoted_output_names, promoted_input_names = \
+        _removal_boundaries(graph, region)
+    value_infos, untyped_names = _value_infos(model, promoted_output_names + promoted_input_names)
+
+    delete_by_index(graph.node, region.node_ids)
+    delete_by_index(
+        graph.output,
+        [idx for idx, graph_output in enumerate(graph.output) if graph_output.name in produced_names],
+    )
+    graph.output.extend(value_infos[name] for name in promoted_output_names)
+    # Graph inputs and initializers that only the region read
+    region_read_names = set(region.input_names) | set(region.graph_input_names) | region.initializer_names
+    unused_names = region_read_names - read_names - set(remaining_output_names)
+    delete_by_index(
+        graph.input,
+        [idx for idx, graph_input in enumerate(graph.input) if graph_input.name in unused_names],
+    )
+    graph.input.extend(value_infos[name] for name in promoted_input_names)
+    delete_by_index(
+        graph.initializer,
+        [idx for idx, initializer in enumerate(graph.initializer) if initializer.name in unused_names],
+    )
+    promoted_names = set(promoted_output_names) | set(promoted_input_names)
+    delete_by_index(
+        graph.value_info,
+        [
+            idx for idx, value_info in enumerate(graph.value_info)
+            if value_info.name in produced_names or value_info.name in promoted_names
+        ],
+    )
+    return untyped_names
+
+
+def apply_region_extraction(
+    model: onnx.ModelProto,
+    region: Region,
+) -> List[str]:
+    """
+    Keep only the OPs of region in the main graph of model, in place.
+
+    The graph inputs are the input boundary tensors, followed by the graph inputs the region reads.
+    The graph outputs are the output boundary tensors.
+    Only the initializers the region reads are kept.
+
+    Returns
+    -------
+    untyped_names: List[str]
+        Boundary tensors whose type could not be determined.
+    """
+    graph = model.graph
+    region_node_ids = set(region.node_ids)
+    graph_input_names = {graph_input.name for graph_input in graph.input}
+    boundary_input_names = set(region.input_names)
+    value_infos, untyped_names = _value_infos(model, region.input_names + region.output_names)
+
+    delete_by_index(
+        graph.node,
+        [node_id for node_id in range(len(graph.node)) if node_id not in region_node_ids],
+    )
+    produced_names = {node_output for node in graph.node for node_output in node.output}
+
+    kept_graph_inputs = [
+        graph_input for graph_input in graph.input
+        if graph_input.name in region.graph_input_names and graph_input.name not in boundary_input_names
+    ]
+    new_inputs = [value_infos[name] for name in region.input_names]
+    new_inputs.extend(kept_graph_inputs)
+    graph.ClearField('input')
+    graph.input.extend(new_inputs)
+
+    graph.ClearField('output')
+    graph.output.extend(value_infos[name] for name in region.output_names)
+
+    # Initializers that are graph inputs keep their value as the default of the input
+    delete_by_index(
+        graph.initializer,
+        [
+            idx for idx, initializer in enumerate(graph.initializer)
+            if initializer.name not in region.initializer_names
+            and not (initializer.name in boundary_input_names and initializer.name in graph_input_names)
+        ],
+    )
+    output_names = set(region.output_names)
+    delete_by_index(
+        graph.value_info,
+        [
+            idx for idx, value_info in enumerate(graph.value_info)
+            if value_info.name not in produced_names or value_info.name in output_names
+        ],
+    )
+    return untyped_names
@@ -0,0 +1,399 @@
+#! /usr/bin/env python
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+import onnx
+import onnx_graphsurgeon as gs
+from snd4onnx.external_data import tensor_data_bytes
+from snd4onnx.graph_index import GraphIndex
+from snd4onnx.local_shape_inference import _shape_of
+from snd4onnx.nested_graphs import NestedGraphIndex, NestedRemovalPlan
+from snd4onnx.removal_plan import RemovalPlan
+
+
+class RemovedNode(NamedTuple):
+    """
+    An OP that is not in the generated model.
+
+    graph is empty for the main graph, otherwise the path of the subgraph or function.
+    """
+    name: str
+    op_type: str
+    graph: str
+
+
+class RewiredEdge(NamedTuple):
+    """
+    An input or output of a surviving OP that was reconnected to another tensor.
+
+    port is 'input' or 'output', index the position of the input or output of the OP.
+    """
+    node_name: str
+    port: str
+    index: int
+    old_name: str
+    new_name: str
+    graph: str
+
+
+class ShapeChange(NamedTuple):
+    """
+    A graph input, graph output or reconnected tensor whose shape is different in the generated model.
+
+    Unknown dimensions are None, symbolic ones their name. A shape is None if it is not known.
+    """
+    tensor_name: str
+    old_shape: Optional[Tuple]
+    new_shape: Optional[Tuple]
+
+
+class RemovalDiff:
+    """
+    What remove() changed in a model.
+
+    Attributes
+    ----------
+    removed_nodes: List[RemovedNode]
+        OPs deleted, either selected or left unused by the deletion (cleanup, prune).\n\
+        OPs of the main graph in graph order, followed by those of subgraphs and functions.
+
+    rewired_edges: List[RewiredEdge]
+        Inputs and outputs of the surviving OPs that were reconnected (old tensor -> new tensor),\n\
+        in the same order as removed_nodes.
+
+    added_graph_input_names, removed_graph_input_names: List[str]
+        Graph inputs of the main graph that only the generated model or only the input model has.
+
+    added_graph_output_names, removed_graph_output_names: List[str]
+        Graph outputs of the main graph that only the generated model or only the input model has.
+
+    shape_changes: List[ShapeChange]
+        Graph inputs, graph outputs and reconnected tensors whose shape changed.
+
+    removed_initializer_names: List[str]
+        Initializers of the main graph that are not in the generated model.
+
+    removed_initializer_bytes: int
+        Their total data size, including the data stored in external data files.
+    """
+
+    def __init__(self):
+        self.removed_nodes: List[RemovedNode] = []
+        self.rewired_edges: List[RewiredEdge] = []
+        self.added_graph_input_names: List[str] = []
+        self.removed_graph_input_names: List[str] = []
+        self.added_graph_output_names: List[str] = []
+        self.removed_graph_output_names: List[str] = []
+        self.shape_changes: List[ShapeChange] = []
+        self.removed_initializer_names: List[str] = []
+        self.removed_initializer_bytes = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'removed_nodes': [removed_node._asdict() for removed_node in self.removed_nodes],
+            'rewired_edges': [rewired_edge._asdict() for rewired_edge in self.rewired_edges],
+            'added_graph_input_names': self.added_graph_input_names,
+            'removed_graph_input_names': self.removed_graph_input_names,
+            'added_graph_output_names': self.added_graph_output_names,
+            'removed_graph_output_names': self.removed_graph_output_names,
+            'shape_changes': [
+                {
+                    'tensor_name': shape_change.tensor_name,
+                    'old_shape': list(shape_change.old_shape) if shape_change.old_shape is not None else None,
+                    'new_shape': list(shape_change.new_shape) if shape_change.new_shape is not None else None,
+                } for shape_change in self.shape_changes
+            ],
+            'removed_initializer_names': self.removed_initializer_names,
+            'removed_initializer_bytes': self.removed_initializer_bytes,
+        }
+
+    def format(self) -> str:
+        def format_shape(shape: Optional[Tuple]) -> str:
+            if shape is None:
+                return '?'
+            return '[' + ', '.join('?' if dim is None else str(dim) for dim in shape) + ']'
+        lines = [f'removed OPs: {len(self.removed_nodes)}']
+        for removed_node in self.removed_nodes:
+            graph_note = f'  ({removed_node.graph})' if removed_node.graph else ''
+            lines.append(f'  {removed_node.name} ({removed_node.op_type}){graph_note}')
+        lines.append(f'rewired edges: {len(self.rewired_edges)}')
+        for rewired_edge in self.rewired_edges:
+            graph_note = f'  ({rewired_edge.graph})' if rewired_edge.graph else ''
+            lines.append(
+                f'  {rewired_edge.node_name} {rewired_edge.port}[{rewired_edge.index}]: '+
+                f'{rewired_edge.old_name} -> {rewired_edge.new_name}{graph_note}'
+            )
+        lines.append(f'graph inputs: +{self.added_graph_input_names} -{self.removed_graph_input_names}')
+        lines.append(f'graph outputs: +{self.added_graph_output_names} -{self.removed_graph_output_names}')
+        lines.append(f'shape changes: {len(self.shape_changes)}')
+        for shape_change in self.shape_changes:
+            lines.append(
+                f'  {shape_change.tensor_name}: '+
+                f'{format_shape(shape_change.old_shape)} -> {format_shape(shape_change.new_shape)}'
+            )
+        lines.append(
+            f'removed initializers: {len(self.removed_initializer_names)} ({self.removed_initializer_bytes} bytes)'
+        )
+        return '\n'.join(lines)
+
+
+def _tensor_shapes(
+    graph: onnx.GraphProto,
+    names: Set[str],
+) -> Dict[str, Optional[Tuple]]:
+    # Declared shapes of names only. Tensors without a declaration are left out.
+    shapes = {}
+    for initializer in graph.initializer:
+        if initializer.name in names:
+            shapes[initializer.name] = tuple(initializer.dims)
+    for value_info in list(graph.value_info) + list(graph.input) + list(graph.output):
+        if value_info.name in names:
+            shapes[value_info.name] = _shape_of(value_info.type)
+    return shapes
+
+
+class RemovalDiffRecorder:
+    """
+    Collects a RemovalDiff while remove() runs.
+
+    Deleted OPs are the OPs of the main graph that the deletion did not keep, by node id:
+    those of the plan and those dropped by cleanup or prune. OPs are never matched by name.
+    Inputs of the OPs of subgraphs and functions are compared with their final names,
+    after the tensors of the main graph they refer to have been renamed.
+    Graph inputs, graph outputs and initializers are compared by name, and shapes only
+    for graph inputs, graph outputs and reconnected tensors. When disabled, every method returns immediately.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+    ):
+        self.enabled = enabled
+        self.report = RemovalDiff() if enabled else None
+        self._nodes: Sequence[Union[gs.Node, onnx.NodeProto]] = []
+        self._kept_node_ids: List[int] = []
+        self._removed_node_ids: Set[int] = set()
+        self._graph_input_names_before: List[str] = []
+        self._graph_output_names_before: List[str] = []
+        self._initializer_bytes_before: Dict[str, int] = {}
+        self._shapes_before: Dict[str, Optional[Tuple]] = {}
+        self._shape_tensor_names: Set[str] = set()
+        self._nested_index: Optional[NestedGraphIndex] = None
+        self._nested_removed_node_ids: Set[int] = set()
+        self._nested_inputs_before: Dict[int, List[str]] = {}
+        self._outer_renames: Dict[str, str] = {}
+
+    def record_nested_plan(
+        self,
+        index: NestedGraphIndex,
+        plan: NestedRemovalPlan,
+    ):
+        """
+        OPs deleted from subgraphs and functions, and the inputs of the other OPs there.
+        Call before the plan is applied.
+        """
+        if not self.enabled or not plan.remove_node_ids:
+            return
+        self._nested_index = index
+        self._nested_removed_node_ids = set(plan.remove_node_ids)
+        for node_id in plan.remove_node_ids:
+            node = index.nodes[node_id]
+            self.report.removed_nodes.append(
+                RemovedNode(
+                    name=node.name,
+                    op_type=node.op_type,
+                    graph=index.scopes[index.node_scope_ids[node_id]].path,
+                )
+            )
+        self._nested_inputs_before = {
+            node_id: list(node.input) for node_id, node in enumerate(index.nodes)
+            if node_id not in self._nested_removed_node_ids
+        }
+
+    def record_outer_renames(
+        self,
+        index: NestedGraphIndex,
+        renames: Dict[str, str],
+    ):
+        """
+        Tensors of the main graph renamed in its subgraphs by rename_outer_references().
+        """
+        if not self.enabled or not renames:
+            return
+        self._nested_index = index
+        self._outer_renames = renames
+
+    def record_plan(
+        self,
+        index: GraphIndex,
+        plan: RemovalPlan,
+    ):
+        """
+        Inputs and outputs of the surviving OPs of the main graph reconnected by plan.
+        """
+        if not self.enabled:
+            return
+        rewrites = [
+            ('input', node_id, idx, index.node_inputs[node_id][idx], tensor_name)
+            for (node_id, idx), tensor_name in plan.input_rewrites.items()
+        ] + [
+            ('output', node_id, idx, index.node_outputs[node_id][idx], tensor_name)
+            for (node_id, idx), tensor_name in plan.output_rewrites.items()
+        ]
+        # In graph order, inputs before outputs
+        rewrites.sort(key=lambda rewrite: (rewrite[1], rewrite[0], rewrite[2]))
+        main_rewired_edges = []
+        for port, node_id, idx, old_name, new_name in rewrites:
+            main_rewired_edges.append(
+                RewiredEdge(
+                    node_name=index.nodes[node_id].name,
+                    port=port,
+                    index=idx,
+                    old_name=old_name,
+                    new_name=new_name,
+                    graph='',
+                )
+            )
+        self.report.rewired_edges = main_rewired_edges
+
+    def record_kept_nodes(
+        self,
+        nodes: Sequence[Union[gs.Node, onnx.NodeProto]],
+        kept_node_ids: List[int],
+    ):
+        """
+        Ids of the OPs of nodes (the main graph before deletion) that the deletion kept,
+        in the order of the generated graph. All other OPs were deleted.
+        """
+        if not self.enabled:
+            return
+        self._nodes = nodes
+        self._kept_node_ids = list(kept_node_ids)
+        kept_node_id_set = set(kept_node_ids)
+        self._removed_node_ids = {
+            node_id for node_id in range(len(nodes)) if node_id not in kept_node_id_set
+        }
+
+    def record_pruned_nodes(
+        self,
+        positions: List[int],
+    ):
+        """
+        Positions of the OPs deleted by prune_model() in the graph recorded by record_kept_nodes().
+        """
+        if not self.enabled:
+            return
+        self._removed_node_ids.update(self._kept_node_ids[position] for position in positions)
+
+    def record_before(
+        self,
+        graph: onnx.GraphProto,
+        rewired_tensor_names: Iterable[str],
+    ):
+        """
+        Names of the main graph before it is rewritten,
+        and the shapes of its graph inputs, graph outputs and of rewired_tensor_names.
+        """
+        if not self.enabled:
+            return
+        self._graph_input_names_before = [graph_input.name for graph_input in graph.input]
+        self._graph_output_names_before = [graph_output.name for graph_output in graph.output]
+        self._initializer_bytes_before = {
+            initializer.name: tensor_data_bytes(initializer) for initializer in graph.initializer
+        }
+        self._shape_tensor_names = set(rewired_tensor_names)
+        self._shape_tensor_names.update(self._graph_input_names_before)
+        self._shape_tensor_names.update(self._graph_output_names_before)
+        self._shapes_before = _tensor_shapes(graph, self._shape_tensor_names)
+
+    def record_after(
+        self,
+        graph: onnx.GraphProto,
+    ):
+        """
+        Compare the graph inputs, graph outputs, initializers and shapes of the generated main graph
+        with what record_before() saw.
+        """
+        if not self.enabled:
+            return
+        report = self.report
+
+        main_removed_nodes = []
+        for node_id in sorted(self._removed_node_ids):
+            node = self._nodes[node_id]
+            main_removed_nodes.append(
+                RemovedNode(
+                    name=node.name,
+                    op_type=node.op_type if isinstance(node, onnx.NodeProto) else node.op,
+                    graph='',
+                )
+            )
+        report.removed_nodes = main_removed_nodes + report.removed_nodes
+        report.rewired_edges.extend(self._nested_rewired_edges())
+
+        graph_input_names = [graph_input.name for graph_input in graph.input]
+        graph_output_names = [graph_output.name for graph_output in graph.output]
+        def added(names: List[str], before: List[str]) -> List[str]:
+            before = set(before)
+            return [name for name in names if name not in before]
+        report.added_graph_input_names = added(graph_input_names, self._graph_input_names_before)
+        report.removed_graph_input_names = added(self._graph_input_names_before, graph_input_names)
+        report.added_graph_output_names = added(graph_output_names, self._graph_output_names_before)
+        report.removed_graph_output_names = added(self._graph_output_names_before, graph_output_names)
+
+        initializer_names = {initializer.name for initializer in graph.initializer}
+        report.removed_initializer_names = [
+            name for name in self._initializer_bytes_before if name not in initializer_names
+        ]
+        report.removed_initializer_bytes = sum(
+            self._initializer_bytes_before[name] for name in report.removed_initializer_names
+        )
+
+        shape_tensor_names = set(self._shape_tensor_names)
+        shape_tensor_names.update(graph_input_names)
+        shape_tensor_names.update(graph_output_names)
+        shapes_after = _tensor_shapes(graph, shape_tensor_names)
+        for tensor_name in sorted(shape_tensor_names):
+            if tensor_name not in self._shapes_before or tensor_name not in shapes_after:
+                continue
+            old_shape = self._shapes_before[tensor_name]
+            new_shape = shapes_after[tensor_name]
+            if old_shape != new_shape:
+                report.shape_changes.append(
+                    ShapeChange(
+                        tensor_name=tensor_name,
+                        old_shape=old_shape,
+                        new_shape=new_shape,
+                    )
+                )
+
+    def _nested_rewired_edges(self) -> List[RewiredEdge]:
+        # Inputs of the surviving OPs of subgraphs and functions, before and after the deletion
+        index = self._nested_index
+        if index is None:
+            return []
+        rewired_edges = []
+        for node_id, node in enumerate(index.nodes):
+            if node_id in self._nested_removed_node_ids:
+                continue
+            scope_id = index.node_scope_ids[node_id]
+            owner_id = index.scope_owner_ids[scope_id]
+            if owner_id is not None and owner_id in self._removed_node_ids:
+                # Deleted with the OP of the main graph that holds the subgraph
+                continue
+            # Functions have their own namespace
+            outer_renames = self._outer_renames if owner_id is not None else {}
+            input_names_before = self._nested_inputs_before.get(node_id, node.input)
+            for idx, (old_name, node_input) in enumerate(zip(input_names_before, node.input)):
+                new_name = outer_renames.get(node_input, node_input)
+                if new_name != old_name:
+                    rewired_edges.append(
+                        RewiredEdge(
+                            node_name=node.name,
+                            port='input',
+                            index=idx,
+                            old_name=old_name,
+                            new_name=new_name,
+                            graph=index.scopes[scope_id].path,
+                        )
+                    )
+        return rewired_edges
@@ -0,0 +1,412 @@
+#! /usr/bin/env python
+
+from typing import Dict, List, Optional, Set, Tuple
+import onnx_graphsurgeon as gs
+from snd4onnx.exceptions import SndError, ReconnectError
+from snd4onnx.graph_index import GraphIndex
+
+OP_TYPES_WITH_AUTOMATIC_ADJUSTMENT_OF_OUTPUT_SHAPE = [
+    'Cast',
+]
+
+
+class RemovalPlan:
+    """
+    Complete rewiring of the graph for one batch of OPs to be deleted.
+
+    Produced by plan_removal() without touching the graph,
+    applied to the graph at once by apply_removal_plan().
+
+    Attributes
+    ----------
+    remove_node_ids: List[int]
+        Ids of the OPs to be deleted, in graph order.
+
+    input_rewrites: Dict[Tuple[int, int], str]
+        (node id, input index) -> name of the tensor the input is reconnected to.
+
+    output_rewrites: Dict[Tuple[int, int], str]
+        (node id, output index) -> name of the tensor the output is replaced with.
+
+    graph_output_names: List[str]
+        Names of the graph outputs after deletion.
+
+    shape_overrides: Dict[str, str]
+        Tensor name -> name of the tensor whose shape is copied to it.
+
+    rewired_tensor_names: Set[str]
+        Names of the tensors whose producer or consumers changed.
+
+    warnings: List[str]
+        Warning messages collected while planning.
+    """
+
+    def __init__(self):
+        self.remove_node_ids: List[int] = []
+        self.input_rewrites: Dict[Tuple[int, int], str] = {}
+        self.output_rewrites: Dict[Tuple[int, int], str] = {}
+        self.graph_output_names: List[str] = []
+        self.shape_overrides: Dict[str, str] = {}
+        self.rewired_tensor_names: Set[str] = set()
+        self.warnings: List[str] = []
+
+
+def _raise_or_collect(
+    error: SndError,
+    errors: Optional[List[SndError]],
+):
+    if errors is None:
+        raise error
+    errors.append(error)
+
+
+def plan_removal(
+    index: GraphIndex,
+    remove_node_ids: List[int],
+    errors: Optional[List[SndError]] = None,
+) -> RemovalPlan:
+    """
+    Work out the rewiring for all OPs to be deleted.
+
+    The OPs are processed in graph order on a name-level copy of the connections held by index,
+    so chains of adjacent OPs to be deleted (e.g. Cast -> Identity -> Cast) resolve to the
+    surviving OPs at both ends, and the result does not depend on the order in which the
+    OP names were specified.
+
+    Parameters
+    ----------
+    index: GraphIndex
+        Index of the graph to be processed. It is not modified.
+
+    remove_node_ids: List[int]
+        Ids of the OPs to be deleted.
+
+    errors: Optional[List[SndError]]
+        If specified, errors are appended to it instead of being raised,
+        and the OPs that cannot be deleted are skipped, so that all problems are found in one pass.
+
+    Returns
+    -------
+    plan: RemovalPlan
+        Rewiring to be applied by apply_removal_plan().
+
+    Raises
+    ------
+    ReconnectError
+        An OP cannot be deleted because its neighbors cannot be reconnected.
+    """
+    plan = RemovalPlan()
+    plan.remove_node_ids = sorted(set(remove_node_ids))
+    remove_node_id_set = set(plan.remove_node_ids)
+
+    # Working copies of the connections, updated as each OP is planned
+    node_inputs: Dict[int, List[str]] = {}
+    node_outputs: Dict[int, List[str]] = {}
+    def inputs_of(node_id: int) -> List[str]:
+        if node_id not in node_inputs:
+            node_inputs[node_id] = list(index.node_inputs[node_id])
+        return node_inputs[node_id]
+    def outputs_of(node_id: int) -> List[str]:
+        if node_id not in node_outputs:
+            node_outputs[node_id] = list(index.node_outputs[node_id])
+        return node_outputs[node_id]
+    producers: Dict[str, int] = dict(index.producers)
+    consumers: Dict[str, List[int]] = {}
+    def consumers_of(tensor_name: str) -> List[int]:
+        if tensor_name not in consumers:
+            consumers[tensor_name] = list(index.consumers.get(tensor_name, []))
+        return consumers[tensor_name]
+    graph_input_names = set(index.graph_input_names)
+    graph_output_names = list(index.graph_output_names)
+    graph_output_name_set = set(graph_output_names)
+
+    def set_input(node_id: int, idx: int, tensor_name: str):
+        old_consumers = consumers_of(inputs_of(node_id)[idx])
+        if node_id in old_consumers:
+            old_consumers.remove(node_id)
+        inputs_of(node_id)[idx] = tensor_name
+        consumers_of(tensor_name).append(node_id)
+        plan.rewired_tensor_names.add(tensor_name)
+
+    def set_output(node_id: int, idx: int, tensor_name: str):
+        old_name = outputs_of(node_id)[idx]
+        if producers.get(old_name) == node_id:
+            del producers[old_name]
+        outputs_of(node_id)[idx] = tensor_name
+        producers[tensor_name] = node_id
+        plan.rewired_tensor_names.add(tensor_name)
+
+    def clear_outputs(node_id: int):
+        for output_name in outputs_of(node_id):
+            if producers.get(output_name) == node_id:
+                del producers[output_name]
+        outputs_of(node_id).clear()
+
+    def remove_graph_outputs(output_names: List[str]):
+        nonlocal graph_output_names
+        output_names = set(output_names)
+        if output_names:
+            graph_output_names = [name for name in graph_output_names if name not in output_names]
+            graph_output_name_set.difference_update(output_names)
+
+    def append_graph_output(tensor_name: str):
+        graph_output_names.append(tensor_name)
+        graph_output_name_set.add(tensor_name)
+        plan.rewired_tensor_names.add(tensor_name)
+
+    def first_consumer(node_id: int) -> int:
+        # Equivalent of gs.Node.o()
+        outputs = outputs_of(node_id)
+        if not outputs or not consumers_of(outputs[0]):
+            return None
+        return consumers_of(outputs[0])[0]
+
+    for rmnode_id in plan.remove_node_ids:
+        rmnode_name = index.nodes[rmnode_id].name
+
+        # Check if it is the first OP of the graph
+        rmnode_inputs = [
+            rmnode_input for rmnode_input in inputs_of(rmnode_id)
+            if index.is_variable(rmnode_input) and rmnode_input in graph_input_names
+        ]
+        rmnode_is_first_op = len(rmnode_inputs) > 0
+
+        # Check if it is the last OP in the graph
+        matched_graph_output = [
+            rmnode_output for rmnode_output in outputs_of(rmnode_id)
+            if index.is_variable(rmnode_output) and rmnode_output in graph_output_name_set
+        ]
+        rmnode_is_last_op = len(matched_graph_output) > 0
+
+        # OPs with two or more input OPs of a graph connected are not allowed to be deleted
+        if len(rmnode_inputs) >= 2:
+            _raise_or_collect(
+                ReconnectError(
+                    'It is not possible to delete an OP to which two or more Input OPs of a graph are connected. '+
+                    f'node_name: {rmnode_name}',
+                    node_names=[rmnode_name],
+                ),
+                errors,
+            )
+            continue
+
+        # If the node to be deleted is responsible for one or more of the final outputs,
+        # delete all the outputs of the node to be deleted from the final output of the graph.
+        # However, only when the number of outputs of the OP remains one or more as a result of the deletion,
+        # and not when the number of outputs of the OP becomes zero.
+        remove_outputs = matched_graph_output
+        if len(remove_outputs) > 0 and (len(outputs_of(rmnode_id)) - len(remove_outputs)) >= 1:
+            remove_graph_outputs(remove_outputs)
+            for remove_output in remove_outputs:
+                if producers.get(remove_output) == rmnode_id:
+                    del producers[remove_output]
+                outputs_of(rmnode_id).remove(remove_output)
+
+        if rmnode_is_first_op:
+            # If it is the first OP of the graph,
+            # change the Input of the graph to the Input of the next OP of the OP to be deleted.
+            next_node_id = first_consumer(rmnode_id)
+            if next_node_id is None:
+                # If it is directly connected to the input of the graph, and yet it is located in the middle,
+                # and yet it is directly connected to the output of the graph,
+                # the next OP cannot be obtained.
+                _raise_or_collect(
+                    ReconnectError(
+                        'OPs connected to the input and output of a graph simultaneously cannot be deleted.',
+                        node_names=[rmnode_name],
+                    ),
+                    errors,
+                )
+                continue
+            input_change_var_idxs = [
+                idx for idx, input_change_var in enumerate(inputs_of(next_node_id)) if index.is_variable(input_change_var)
+            ]
+            if len(input_change_var_idxs) < len(rmnode_inputs):
+                # If the number of inputs (Variable) of the OP to be deleted
+                # and the number of inputs (Variable) of the next OP after the deleted OP are different,
+                # the OP cannot be deleted because it cannot be connected.
+                _raise_or_collect(
+                    ReconnectError(
+                        'If the number of inputs (Variable) of the OP to be deleted '+
+                        'and the number of inputs (Variable) of the next OP after the deleted OP are different, '+
+                        'the OP cannot be deleted because it cannot be connected.',
+                        node_names=[rmnode_name, index.nodes[next_node_id].name],
+                        num_remove_op_inputs=len(rmnode_inputs),
+                        num_next_op_inputs=len(input_change_var_idxs),
+                    ),
+                    errors,
+                )
+                continue
+            for input_change_vars_idx, rmnode_input in zip(input_change_var_idxs, rmnode_inputs):
+                # Memorize the modified output shape only for operation types where the next OP
+                # is known to not change the output shape relative to the input shape.
+                change_output_shape_node_id = None
+                next_input_consumers = consumers_of(inputs_of(next_node_id)[input_change_vars_idx])
+                if len(next_input_consumers) == 1 \
+                    and index.node_ops[next_input_consumers[0]] in OP_TYPES_WITH_AUTOMATIC_ADJUSTMENT_OF_OUTPUT_SHAPE:
+                    change_output_shape_node_id = next_input_consumers[0]
+
+                # Set the output of the OP before the OP to be deleted to the input of the OP following the OP to be deleted.
+                # Force the input with the smallest sequential number among multiple inputs.
+                rmnode_variable_inputs = [
+                    rmnode_input for rmnode_input in inputs_of(rmnode_id) if index.is_variable(rmnode_input)
+                ]
+                if len(rmnode_variable_inputs) >= 1:
+                    rmnode_output_names = set(outputs_of(rmnode_id))
+                    for idx, next_node_input in enumerate(inputs_of(next_node_id)):
+                        if next_node_input in rmnode_output_names:
+                            set_input(next_node_id, idx, rmnode_variable_inputs[0])
+                            break
+
+                    plan.warnings.append(
+                        'There may be a mismatch in the input/output shapes '+
+                        'before and after the OP to be deleted. Check the graph carefully.'
+                    )
+
+                    # Forces the shape of the Output of the next OP to fit the input shape of the OP to be deleted.
+                    if change_output_shape_node_id is not None:
+                        for output_name in outputs_of(change_output_shape_node_id):
+                            if index.is_variable(output_name):
+                                plan.shape_overrides[output_name] = rmnode_input
+                                break
+
+            # Clear all output of OPs to be deleted
+            clear_outputs(rmnode_id)
+
+        if rmnode_is_last_op:
+            # If it was the last OP in the graph
+            # Reassign the output specified as Input for the OP to be deleted to the output of the graph.
+            remove_graph_outputs(matched_graph_output)
+            for rmnode_input in inputs_of(rmnode_id):
+                append_graph_output(rmnode_input)
+            clear_outputs(rmnode_id)
+
+        if not rmnode_is_first_op and not rmnode_is_last_op:
+            # If it was neither the first nor the last OP
+            # The OP immediately before the OP to be deleted takes over the outputs of the OP to be deleted.
+            # However, if there is a gap between the number of outputs of the OP immediately before
+            # and the number of inputs in the next OP, an error occurs.
+            rmnode_inputs_ = inputs_of(rmnode_id)
+            inp_node_id = producers.get(rmnode_inputs_[0], None) if rmnode_inputs_ else None
+            out_node_id = first_consumer(rmnode_id)
+            if inp_node_id is None or out_node_id is None:
+                _raise_or_collect(
+                    ReconnectError(
+                        'The OP immediately before or immediately after the OP to be deleted does not exist, '+
+                        f'so the OP cannot be automatically reconnected. node_name: {rmnode_name}',
+                        node_names=[rmnode_name],
+                    ),
+                    errors,
+                )
+                continue
+
+            output_change_var_idxs = [
+                idx for idx, output_change_var in enumerate(outputs_of(inp_node_id)) if index.is_variable(output_change_var)
+            ]
+            input_change_var_idxs = [
+                idx for idx, input_change_var in enumerate(inputs_of(out_node_id)) if index.is_variable(input_change_var)
+            ]
+            if len(output_change_var_idxs) != len(input_change_var_idxs):
+                _raise_or_collect(
+                    ReconnectError(
+                        'If the number of outputs of the OP immediately before the OP to be deleted '+
+                        'is different from the number of inputs of the OP immediately after the OP to be deleted, '+
+                        'the OP cannot be automatically reconnected.',
+                        node_names=[index.nodes[inp_node_id].name, rmnode_name, index.nodes[out_node_id].name],
+                        num_remove_op_inputs=len(rmnode_inputs),
+                        num_next_op_inputs=len(input_change_var_idxs),
+                    ),
+                    errors,
+                )
+                continue
+            for output_change_var_idx, input_change_var_idx in zip(output_change_var_idxs, input_change_var_idxs):
+                set_output(inp_node_id, output_change_var_idx, inputs_of(out_node_id)[input_change_var_idx])
+
+            # Clear all output of OPs to be deleted
+            clear_outputs(rmnode_id)
+
+        if rmnode_is_first_op and rmnode_is_last_op:
+            # If it is both the first and the last OP,
+            # it is considered too complicated to process and is warn for the time being.
+            plan.warnings.append(
+                'Since the OP to be deleted is both the beginning and the end of the graph, '+
+                'it is treated as unprocessable at this time. '+
+                'Carefully check the geometry of the generated model.'
+            )
+
+    # Only the connections of the surviving OPs that actually changed are rewritten
+    for node_id, input_names in node_inputs.items():
+        if node_id in remove_node_id_set:
+            continue
+        for idx, (old_name, new_name) in enumerate(zip(index.node_inputs[node_id], input_names)):
+            if old_name != new_name:
+                plan.input_rewrites[(node_id, idx)] = new_name
+    for node_id, output_names in node_outputs.items():
+        if node_id in remove_node_id_set:
+            continue
+        for idx, (old_name, new_name) in enumerate(zip(index.node_outputs[node_id], output_names)):
+            if old_name != new_name:
+                plan.output_rewrites[(node_id, idx)] = new_name
+    plan.graph_output_names = graph_output_names
+
+    # The rewiring must leave a valid graph, whichever path applies it.
+    # A tensor is lost when its producer is deleted or takes over the outputs of a deleted OP.
+    for node_id, input_names in enumerate(index.node_inputs):
+        if node_id in remove_node_id_set:
+            continue
+        for input_name in node_inputs.get(node_id, input_names):
+            if input_name in index.producers and input_name not in producers:
+                _raise_or_collect(
+                    ReconnectError(
+                        f'{index.nodes[node_id].name} takes {input_name}, which is no longer output by any OP '+
+                        'after the OP to be deleted has been deleted.',
+                        node_names=[index.nodes[index.producers[input_name]].name, index.nodes[node_id].name],
+                    ),
+                    errors,
+                )
+    original_graph_output_names = set(index.graph_output_names)
+    for graph_output_name in graph_output_names:
+        if graph_output_name in index.producers and graph_output_name not in producers \
+            and graph_output_name not in graph_input_names:
+            _raise_or_collect(
+                ReconnectError(
+                    f'The graph output {graph_output_name} is no longer output by any OP '+
+                    'after the OP to be deleted has been deleted.',
+                    node_names=[index.nodes[index.producers[graph_output_name]].name],
+                ),
+                errors,
+            )
+        elif graph_output_name not in original_graph_output_names and graph_output_name not in index.typed_names:
+            _raise_or_collect(
+                ReconnectError(
+                    f'{graph_output_name} becomes a graph output, but its type is unknown. '+
+                    'Set the type of the tensor in the input model.',
+                    node_names=[
+                        index.nodes[rmnode_id].name for rmnode_id in plan.remove_node_ids
+                        if graph_output_name in index.node_inputs[rmnode_id]
+                    ],
+                ),
+                errors,
+            )
+
+    return plan
+
+
+def apply_removal_plan(
+    graph: gs.Graph,
+    index: GraphIndex,
+    plan: RemovalPlan,
+):
+    """
+    Rewrite the edges of graph according to plan in a single pass.
+    The OPs to be deleted are disconnected and left for graph.cleanup().
+    """
+    for rmnode_id in plan.remove_node_ids:
+        index.nodes[rmnode_id].outputs.clear()
+    for (node_id, idx), tensor_name in plan.input_rewrites.items():
+        index.nodes[node_id].inputs[idx] = index.tensors[tensor_name]
+    for (node_id, idx), tensor_name in plan.output_rewrites.items():
+        index.nodes[node_id].outputs[idx] = index.tensors[tensor_name]
+    for tensor_name, shape_tensor_name in plan.shape_overrides.items():
+        index.tensors[tensor_name].shape = index.tensors[shape_tensor_name].shape
+    graph.outputs = [index.tensors[tensor_name] for tensor_name in plan.graph_output_names]
@@ -0,0 +1,310 @@
+#! /usr/bin/env python
+
+import io
+import os
+import sys
+import json
+import stat
+import time
+import contextlib
+import threading
+import socketserver
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, IO, Optional
+
+# Keyword arguments of remove() that can be passed as JSON
+REQUEST_KEYS = [
+    'remove_node_names',
+    'input_onnx_file_path',
+    'output_onnx_file_path',
+    'non_verbose',
+    'cleanup_once',
+    'shape_inference',
+    'remove_op_types',
+    'remove_node_name_patterns',
+    'load_external_data',
+    'disable_fast_path',
+    'dry_run',
+    'profile',
+    'verify',
+    'verify_num_samples',
+    'prune',
+    'region_input_names',
+    'region_output_names',
+    'extract_region',
+    'profile_memory',
+    'skip_unchanged_output',
+    'diff',
+]
+
+# Parsed models of each worker process, shared by its requests
+_worker_model_cache = None
+
+
+def handle_request(
+    request: Dict,
+    model_cache=None,
+) -> Dict:
+    """
+    Run remove() for one request and build its response. Never raises.
+
+    Parameters
+    ----------
+    request: Dict
+        Keyword arguments of remove() (REQUEST_KEYS) and an optional 'id',
+        which is copied to the response as it is.\n\
+        e.g. {"id": 1, "input_onnx_file_path": "a.onnx", "output_onnx_file_path": "b.onnx", "remove_op_types": ["Identity"]}
+
+    model_cache: Optional[ModelCache]
+        Cache of parsed models shared by the requests.
+
+    Returns
+    -------
+    response: Dict
+        id, success, elapsed_sec, and error_type, error and node_names if the request failed.\n\
+        nodes_before, nodes_after and output_bytes (size of the output .onnx file) if it succeeded.\n\
+        'errors' lists the problems found by dry_run, 'profile' holds the report of profile,\n\
+        'verification' the report of verify and 'diff' the RemovalDiff of diff.
+    """
+    from snd4onnx.exceptions import SndError
+    from snd4onnx.onnx_remove_node import remove
+
+    response = {
+        'id': request.get('id', None) if isinstance(request, dict) else None,
+        'success': False,
+    }
+    start = time.perf_counter()
+    try:
+        if not isinstance(request, dict):
+            raise ValueError('A request must be a JSON object.')
+        unknown_keys = sorted(set(request) - set(REQUEST_KEYS) - {'id'})
+        if unknown_keys:
+            raise ValueError(f'Unknown request keys: {unknown_keys}')
+        kwargs = {key: request[key] for key in REQUEST_KEYS if key in request}
+        if model_cache is not None:
+            kwargs['model_cache'] = model_cache
+        # OP counts of every request, memory only if the profile was requested
+        kwargs['profile_callback'] = lambda remove_profile: response.update(
+            nodes_before=remove_profile.nodes_before,
+            nodes_after=remove_profile.nodes_after,
+        )
+        kwargs.setdefault('profile_memory', kwargs.get('profile', False))
+        if kwargs.pop('verify', False):
+            kwargs['verify_callback'] = \
+                lambda verification_report: response.update(verification=verification_report.to_dict())
+        if kwargs.pop('diff', False):
+            kwargs['diff_callback'] = \
+                lambda removal_diff: response.update(diff=removal_diff.to_dict())
+        result = remove(**kwargs)
+        if kwargs.get('dry_run', False):
+            response['errors'] = [
+                {
+                    'error_type': type(error).__name__,
+                    'error': str(error),
+                    'node_names': error.node_names,
+                } for error in result
+            ]
+            response['success'] = len(result) == 0
+        else:
+            if kwargs.get('profile', False):
+                _, remove_profile = result
+                response['profile'] = remove_profile.to_dict()
+            output_onnx_file_path = kwargs.get('output_onnx_file_path', '')
+            if output_onnx_file_path and os.path.isfile(output_onnx_file_path):
+                response['output_bytes'] = os.path.getsize(output_onnx_file_path)
+            response['success'] = True
+    except SndError as ex:
+        response['error_type'] = type(ex).__name__
+        response['error'] = str(ex)
+        response['node_names'] = ex.node_names
+    except Exception as ex:
+        response['error_type'] = type(ex).__name__
+        response['error'] = str(ex)
+    response['elapsed_sec'] = time.perf_counter() - start
+    return response
+
+
+def _error_response(
+    request_id,
+    ex: Exception,
+) -> Dict:
+    return {
+        'id': request_id,
+        'success': False,
+        'error_type': type(ex).__name__,
+        'error': str(ex),
+    }
+
+
+def _init_worker():
+    global _worker_model_cache
+    # Pay the import cost once per worker, before the first request
+    import snd4onnx.onnx_remove_node
+    from snd4onnx.model_cache import ModelCache
+    _worker_model_cache = ModelCache()
+
+
+def _handle_request_in_worker(
+    request: Dict,
+) -> Dict:
+    # Logs of remove() must not mix with the responses on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return handle_request(request, _worker_model_cache)
+
+
+def serve_stream(
+    rfile: IO,
+    wfile: IO,
+    executor: Optional[ProcessPoolExecutor] = None,
+    max_pending: Optional[int] = 1,
+    model_cache=None,
+):
+    """
+    Read one JSON request per line from rfile and write one JSON response per line to wfile,
+    until rfile is closed. Logs of remove() are written to stderr.
+    Requests without 'id' and lines that are not a JSON object get their line number as 'id'.
+
+    Parameters
+    ----------
+    executor: Optional[ProcessPoolExecutor]
+        If specified, requests are processed concurrently by the worker processes of executor\n\
+        and each response is written as soon as its request has finished, in completion order.\n\
+        If not specified, requests are processed one by one in the order they are read.
+
+    max_pending: Optional[int]
+        Maximum number of requests submitted to executor and not finished yet.\n\
+        Reading rfile pauses while the limit is reached.
+
+    model_cache: Optional[ModelCache]
+        Cache of parsed models shared by the requests processed without executor.
+    """
+    write_lock = threading.Lock()
+    def write(response: Dict):
+        data = f'{json.dumps(response)}\n'
+        with write_lock:
+            wfile.write(data if isinstance(wfile, io.TextIOBase) else data.encode('utf-8'))
+            wfile.flush()
+
+    max_pending = max(1, max_pending)
+    pending = threading.BoundedSemaphore(max_pending)
+    for line_number, line in enumerate(rfile, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as ex:
+            write(_error_response(line_number, ex))
+            continue
+        if not isinstance(request, dict):
+            # Answered here, so that it gets its line number as 'id' too
+            write(_error_response(line_number, ValueError('A request must be a JSON object.')))
+            continue
+        request.setdefault('id', line_number)
+
+        if executor is None:
+            with contextlib.redirect_stdout(sys.stderr):
+                write(handle_request(request, model_cache))
+            continue
+
+        request_id = request['id']
+        pending.acquire()
+        try:
+            future = executor.submit(_handle_request_in_worker, request)
+        except Exception as ex:
+            # e.g. A worker process died and the pool is broken
+            pending.release()
+            write(_error_response(request_id, ex))
+            continue
+
+        def done(future: Future, request_id=request_id):
+            try:
+                write(future.result())
+            except Exception as ex:
+                write(_error_response(request_id, ex))
+            finally:
+                pending.release()
+
+        future.add_done_callback(done)
+
+    # Until the responses of the last requests have been written
+    for _ in range(max_pending):
+        pending.acquire()
+    for _ in range(max_pending):
+        pending.release()
+
+
+class _StreamRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        serve_stream(self.rfile, self.wfile, **self.server.serve_stream_kwargs)
+
+
+def serve(
+    address: Optional[str] = None,
+    num_workers: Optional[int] = 1,
+):
+    """
+    Keep onnx and onnx_graphsurgeon loaded and process requests until stopped.
+    Models that are requested repeatedly are parsed once (ModelCache).
+
+    Parameters
+    ----------
+    address: Optional[str]
+        None: Requests are read from stdin and responses are written to stdout.\n\
+        'HOST:PORT': TCP socket.\n\
+        Anything else: Path of a Unix domain socket.\n\
+        Connections are served one at a time, each one can send any number of requests.
+
+    num_workers: Optional[int]
+        Number of worker processes. If more than 1, requests are processed concurrently\n\
+        and the responses are written in completion order.\n\
+        Default: 1
+    """
+    from snd4onnx.model_cache import ModelCache
+
+    executor = None
+    serve_stream_kwargs = {}
+    if num_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker)
+        serve_stream_kwargs = {
+            'executor': executor,
+            # Enough requests queued to keep every worker busy
+            'max_pending': 2 * num_workers,
+        }
+    else:
+        # Pay the import cost once, before the first request
+        import snd4onnx.onnx_remove_node
+        serve_stream_kwargs = {
+            'model_cache': ModelCache(),
+        }
+
+    try:
+        _serve(address, serve_stream_kwargs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _serve(
+    address: Optional[str],
+    serve_stream_kwargs: Dict,
+):
+    if address is None:
+        serve_stream(sys.stdin, sys.stdout, **serve_stream_kwargs)
+        return
+
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        server = socketserver.TCPServer((host, int(port)), _StreamRequestHandler)
+    else:
+        # A socket file left by a previous server
+        if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+            os.remove(address)
+        server = socketserver.UnixStreamServer(address, _StreamRequestHandler)
+    server.serve_stream_kwargs = serve_stream_kwargs
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
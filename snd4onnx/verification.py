@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+import onnx
+from onnx.external_data_helper import load_external_data_for_model, uses_external_data
+
+VERIFY_NUM_SAMPLES = 8
+
+
+def import_onnxruntime():
+    """
+    onnxruntime is only needed for verification and is not a dependency of snd4onnx.
+    """
+    try:
+        import onnxruntime
+    except ImportError as ex:
+        raise ImportError(
+            'onnxruntime is required to verify the generated model. pip install onnxruntime'
+        ) from ex
+    return onnxruntime
+
+
+class InputSpec(NamedTuple):
+    """
+    Name, numpy dtype and shape of a graph input. Unknown dimensions are None.
+    """
+    name: str
+    dtype: np.dtype
+    shape: Tuple[Optional[int], ...]
+
+
+class OutputError(NamedTuple):
+    """
+    Difference of one graph output shared by the original and the generated model.
+    """
+    name: str
+    max_abs_error: float
+    max_rel_error: float
+    shape_matched: bool
+
+
+class VerificationReport:
+    """
+    Numeric comparison of the original and the generated model on random inputs.
+
+    Attributes
+    ----------
+    outputs: List[OutputError]
+        Graph outputs that both models have, in the order of the generated model.\n\
+        The errors are inf if the shapes differ.
+
+    skipped_output_names: List[str]
+        Graph outputs that only one of the models has. They are not compared.
+
+    num_samples: int
+        Number of random inputs.
+
+    batched: bool
+        Whether all samples were run at once along the first (dynamic) dimension of the inputs.
+
+    error: Optional[str]
+        Error raised by onnxruntime if one of the models could not be loaded or run.\n\
+        No outputs are compared then.
+    """
+
+    def __init__(self):
+        self.outputs: List[OutputError] = []
+        self.skipped_output_names: List[str] = []
+        self.num_samples = 0
+        self.batched = False
+        self.error: Optional[str] = None
+
+    @property
+    def max_abs_error(self) -> float:
+        return max((output.max_abs_error for output in self.outputs), default=0.0)
+
+    @property
+    def max_rel_error(self) -> float:
+        return max((output.max_rel_error for output in self.outputs), default=0.0)
+
+    def to_dict(self) -> Dict:
+        return {
+            'num_samples': self.num_samples,
+            'batched': self.batched,
+            'max_abs_error': self.max_abs_error,
+            'max_rel_error': self.max_rel_error,
+            'outputs': [output._asdict() for output in self.outputs],
+            'skipped_output_names': self.skipped_output_names,
+            'error': self.error,
+        }
+
+    def format(self) -> str:
+        if self.error is not None:
+            return f'onnxruntime failed: {self.error}'
+        name_width = max([len('output')] + [len(output.name) for output in self.outputs])
+        lines = [
+            f'{"output":<{name_width}} {"max abs error":>14} {"max rel error":>14}',
+        ]
+        for output in self.outputs:
+            shape_note = '' if output.shape_matched else '  shape mismatch'
+            lines.append(
+                f'{output.name:<{name_width}} {output.max_abs_error:>14.6g} {output.max_rel_error:>14.6g}{shape_note}'
+            )
+        if self.skipped_output_names:
+            lines.append(f'not compared: {self.skipped_output_names}')
+        lines.append(f'samples: {self.num_samples}{" (batched)" if self.batched else ""}')
+        return '\n'.join(lines)
+
+
+def input_specs(
+    graph: onnx.GraphProto,
+) -> List[InputSpec]:
+    """
+    Graph inputs of graph that are not initializers.
+
+    Raises
+    ------
+    ValueError
+        An input is not a tensor or has a type that cannot be generated randomly.
+    """
+    initializer_names = {initializer.name for initializer in graph.initializer}
+    specs = []
+    for graph_input in graph.input:
+        if graph_input.name in initializer_names:
+            continue
+        if not graph_input.type.HasField('tensor_type'):
+            raise ValueError(f'Only tensor inputs can be generated. input: {graph_input.name}')
+        tensor_type = graph_input.type.tensor_type
+        dtype = np.dtype(onnx.helper.tensor_dtype_to_np_dtype(tensor_type.elem_type))
+        if dtype.kind not in 'biuf':
+            raise ValueError(f'Inputs of type {dtype} cannot be generated. input: {graph_input.name}')
+        shape = tuple(
+            dim.dim_value if dim.HasField('dim_value') and dim.dim_value > 0 else None
+            for dim in tensor_type.shape.dim
+        )
+        specs.append(InputSpec(name=graph_input.name, dtype=dtype, shape=shape))
+    return specs
+
+
+def _random_samples(
+    spec: InputSpec,
+    num_samples: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # All samples at once, stacked along a new first axis. Unknown dimensions are 1.
+    shape = (num_samples,) + tuple(1 if dim is None else dim for dim in spec.shape)
+    if spec.dtype.kind == 'f':
+        return rng.standard_normal(shape).astype(spec.dtype)
+    if spec.dtype.kind == 'b':
+        return rng.integers(0, 2, shape).astype(spec.dtype)
+    # Small non-negative integers, which are also valid as indices and sizes of most models
+    return rng.integers(0, 4, shape).astype(spec.dtype)
+
+
+def _errors(
+    expected: np.ndarray,
+    actual: np.ndarray,
+) -> Tuple[float, float]:
+    if expected.size == 0:
+        return 0.0, 0.0
+    expected = expected.astype(np.float64)
+    actual = actual.astype(np.float64)
+    with np.errstate(invalid='ignore'):
+        abs_error = np.abs(expected - actual)
+    # NaN or inf at the same position in both outputs is not an error
+    abs_error[(expected == actual) | (np.isnan(expected) & np.isnan(actual))] = 0.0
+    rel_error = abs_error / np.maximum(np.abs(expected), np.finfo(np.float32).tiny)
+    return float(np.max(abs_error)), float(np.max(rel_error))
+
+
+def _session(
+    onnxruntime,
+    model: Union[str, onnx.ModelProto],
+    external_data_dir: Optional[str],
+):
+    if not isinstance(model, str):
+        if external_data_dir is not None and any(
+            uses_external_data(initializer) for initializer in model.graph.initializer
+        ):
+            # The weights are on disk, relative to external_data_dir
+            in_memory_model = onnx.ModelProto()
+            in_memory_model.CopyFrom(model)
+            load_external_data_for_model(in_memory_model, external_data_dir)
+            model = in_memory_model
+        model = model.SerializeToString()
+    session_options = onnxruntime.SessionOptions()
+    session_options.log_severity_level = 3
+    return onnxruntime.InferenceSession(
+        model,
+        sess_options=session_options,
+        providers=['CPUExecutionProvider'],
+    )
+
+
+def _load_graph(
+    model: Union[str, onnx.ModelProto],
+) -> onnx.GraphProto:
+    if isinstance(model, str):
+        return onnx.load(model, load_external_data=False).graph
+    return model.graph
+
+
+def verify_models(
+    original_model: Union[str, onnx.ModelProto],
+    removed_model: Union[str, onnx.ModelProto],
+    num_samples: Optional[int] = VERIFY_NUM_SAMPLES,
+    seed: Optional[int] = 0,
+    original_external_data_dir: Optional[str] = None,
+    removed_external_data_dir: Optional[str] = None,
+) -> VerificationReport:
+    """
+    Run the original and the generated model with onnxruntime on CPU on the same random inputs,
+    and compare the graph outputs that both models have.
+
+    The inputs are generated from the shapes and dtypes of the graph inputs.
+    Unknown dimensions are 1. Each model is loaded into one session that is used for all samples.
+    If the first dimension of every input of both models is dynamic, all samples are run as one batch.
+
+    Parameters
+    ----------
+    original_model, removed_model: Union[str, onnx.ModelProto]
+        onnx file path or ModelProto of the models to be compared.
+
+    num_samples: Optional[int]
+        Number of random inputs.\n\
+        Default: 8
+
+    seed: Optional[int]
+        Seed of the random inputs.\n\
+        Default: 0
+
+    original_external_data_dir, removed_external_data_dir: Optional[str]
+        Directory of the external data of a ModelProto whose weights were not loaded into memory.
+
+    Returns
+    -------
+    report: VerificationReport
+        Max abs/rel error of each shared output.
+    """
+    onnxruntime = import_onnxruntime()
+
+    original_graph = _load_graph(original_model)
+    removed_graph = _load_graph(removed_model)
+    original_specs = input_specs(original_graph)
+    removed_specs = input_specs(removed_graph)
+    # Inputs of the same name get the same values. The original model decides their shape.
+    specs = {spec.name: spec for spec in removed_specs}
+    specs.update({spec.name: spec for spec in original_specs})
+
+    rng = np.random.default_rng(seed)
+    samples = {
+        name: _random_samples(spec, num_samples, rng) for name, spec in specs.items()
+    }
+
+    report = VerificationReport()
+    report.num_samples = num_samples
+    report.batched = num_samples > 1 and all(
+        len(spec.shape) > 0 and spec.shape[0] is None
+        for spec in original_specs + removed_specs
+    )
+    if report.batched:
+        # (num_samples, 1, ...) -> (num_samples, ...)
+        feeds = [
+            {name: values.reshape((num_samples,) + values.shape[2:]) for name, values in samples.items()}
+        ]
+    else:
+        feeds = [
+            {name: values[sample_idx] for name, values in samples.items()}
+            for sample_idx in range(num_samples)
+        ]
+
+    removed_output_names = [graph_output.name for graph_output in removed_graph.output]
+    original_output_names = {graph_output.name for graph_output in original_graph.output}
+    shared_output_names = [name for name in removed_output_names if name in original_output_names]
+    report.skipped_output_names = sorted(
+        (original_output_names | set(removed_output_names)) - set(shared_output_names)
+    )
+
+    def run_all(session) -> List[List[np.ndarray]]:
+        session_input_names = [session_input.name for session_input in session.get_inputs()]
+        return [
+            session.run(
+                shared_output_names,
+                {name: feed[name] for name in session_input_names},
+            ) for feed in feeds
+        ]
+
+    results = []
+    for model_kind, model, external_data_dir in [
+        ('original', original_model, original_external_data_dir),
+        ('generated', removed_model, removed_external_data_dir),
+    ]:
+        try:
+            results.append(run_all(_session(onnxruntime, model, external_data_dir)))
+        except Exception as ex:
+            # e.g. A deletion that left the graph disconnected
+            report.error = f'{model_kind} model: {ex}'
+            return report
+    original_results, removed_results = results
+
+    for output_idx, name in enumerate(shared_output_names):
+        max_abs_error = 0.0
+        max_rel_error = 0.0
+        shape_matched = True
+        for original_result, removed_result in zip(original_results, removed_results):
+            expected = np.asarray(original_result[output_idx])
+            actual = np.asarray(removed_result[output_idx])
+            if expected.shape != actual.shape:
+                shape_matched = False
+                max_abs_error = max_rel_error = float('inf')
+                break
+            abs_error, rel_error = _errors(expected, actual)
+            max_abs_error = max(max_abs_error, abs_error)
+            max_rel_error = max(max_rel_error, rel_error)
+        report.outputs.append(
+            OutputError(
+                name=name,
+                max_abs_error=max_abs_error,
+                max_rel_error=max_rel_error,
+                shape_matched=shape_matched,
+            )
+        )
+    return report
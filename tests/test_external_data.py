@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+"""
+save_model() and the atomic writes it is built on.
+"""
+
+import io
+import os
+import stat
+import numpy as np
+import onnx
+import pytest
+from onnx import helper, numpy_helper, TensorProto
+from snd4onnx.external_data import save_model, _write_atomic
+
+
+def make_model() -> onnx.ModelProto:
+    nodes = [helper.make_node('Add', ['x', 'w'], ['y'], name='add')]
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1024])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [1024])],
+        initializer=[numpy_helper.from_array(np.arange(1024, dtype=np.float32), 'w')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+    return model
+
+
+def save_with_external_data(
+    dir_path: str,
+) -> str:
+    model_path = os.path.join(dir_path, 'model.onnx')
+    onnx.save(make_model(), model_path, save_as_external_data=True, location='model.data', size_threshold=0)
+    return model_path
+
+
+def weights(
+    model: onnx.ModelProto,
+) -> np.ndarray:
+    return numpy_helper.to_array(model.graph.initializer[0])
+
+
+def test_unchanged_resave_is_skipped(tmp_path):
+    output_path = os.path.join(tmp_path, 'out.onnx')
+    assert save_model(make_model(), output_path, skip_unchanged=True)
+    stat_before = os.stat(output_path)
+    # The file is neither rewritten nor replaced
+    assert not save_model(make_model(), output_path, skip_unchanged=True)
+    stat_after = os.stat(output_path)
+    assert (stat_after.st_ino, stat_after.st_mtime_ns) == (stat_before.st_ino, stat_before.st_mtime_ns)
+    # Another content is written
+    model = make_model()
+    model.graph.node[0].op_type = 'Mul'
+    assert save_model(model, output_path, skip_unchanged=True)
+    assert onnx.load(output_path).graph.node[0].op_type == 'Mul'
+
+
+def test_save_to_bytes_io(tmp_path):
+    src_dir = os.path.join(tmp_path, 'src')
+    os.makedirs(src_dir)
+    model = onnx.load(save_with_external_data(src_dir), load_external_data=False)
+    buffer = io.BytesIO()
+    assert save_model(model, buffer, external_data_dir=src_dir)
+    # The weights are embedded in what is written, the model passed in still refers to model.data
+    saved_model = onnx.load_model_from_string(buffer.getvalue())
+    assert len(saved_model.graph.initializer[0].external_data) == 0
+    np.testing.assert_array_equal(weights(saved_model), np.arange(1024, dtype=np.float32))
+    assert len(model.graph.initializer[0].external_data) > 0
+
+
+def test_copy_external_data(tmp_path):
+    src_dir = os.path.join(tmp_path, 'src')
+    dst_dir = os.path.join(tmp_path, 'dst')
+    os.makedirs(src_dir)
+    os.makedirs(dst_dir)
+    model = onnx.load(save_with_external_data(src_dir), load_external_data=False)
+    output_path = os.path.join(dst_dir, 'out.onnx')
+
+    assert save_model(model, output_path, external_data_dir=src_dir, skip_unchanged=True)
+    with open(os.path.join(src_dir, 'model.data'), 'rb') as f, open(os.path.join(dst_dir, 'model.data'), 'rb') as dst_f:
+        assert f.read() == dst_f.read()
+    np.testing.assert_array_equal(weights(onnx.load(output_path)), np.arange(1024, dtype=np.float32))
+
+    # Neither the model nor the data file is written again
+    data_stat = os.stat(os.path.join(dst_dir, 'model.data'))
+    assert not save_model(model, output_path, external_data_dir=src_dir, skip_unchanged=True)
+    assert os.stat(os.path.join(dst_dir, 'model.data')).st_ino == data_stat.st_ino
+
+
+def test_reuse_external_data_in_same_dir(tmp_path):
+    model_path = save_with_external_data(tmp_path)
+    data_stat = os.stat(os.path.join(tmp_path, 'model.data'))
+    model = onnx.load(model_path, load_external_data=False)
+    save_model(model, os.path.join(tmp_path, 'out.onnx'), external_data_dir=str(tmp_path))
+    assert os.stat(os.path.join(tmp_path, 'model.data')).st_ino == data_stat.st_ino
+
+
+def test_write_atomic_failure_keeps_file(tmp_path):
+    file_path = os.path.join(tmp_path, 'out.onnx')
+    with open(file_path, 'wb') as f:
+        f.write(b'old')
+    os.chmod(file_path, 0o600)
+
+    def failing_write(tmp_file_path: str):
+        with open(tmp_file_path, 'wb') as f:
+            f.write(b'partial')
+        raise RuntimeError('write failed')
+
+    with pytest.raises(RuntimeError):
+        _write_atomic(file_path, failing_write)
+    with open(file_path, 'rb') as f:
+        assert f.read() == b'old'
+    # The temporary file is deleted
+    assert os.listdir(tmp_path) == ['out.onnx']
+
+    def write(tmp_file_path: str):
+        with open(tmp_file_path, 'wb') as f:
+            f.write(b'new')
+
+    _write_atomic(file_path, write)
+    with open(file_path, 'rb') as f:
+        assert f.read() == b'new'
+    # The permissions of the replaced file are kept
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == 0o600
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+"""
+The fast path (onnx.GraphProto edited directly) and the onnx_graphsurgeon path
+must accept and reject the same deletions.
+"""
+
+import contextlib
+import io
+from typing import List, Optional
+import onnx
+import pytest
+from onnx import helper, TensorProto
+from snd4onnx import remove
+from snd4onnx.exceptions import ReconnectError
+
+
+def make_model(
+    nodes: List[onnx.NodeProto],
+    output_names: List[str],
+    typed_names: Optional[List[str]] = None,
+) -> onnx.ModelProto:
+    """
+    Graph input x [2, 3]. The graph outputs and the tensors in typed_names are FLOAT [2, 3].
+    """
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [2, 3])],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, [2, 3]) for name in output_names],
+        value_info=[helper.make_tensor_value_info(name, TensorProto.FLOAT, [2, 3]) for name in typed_names or []],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+    return model
+
+
+def run_both_paths(
+    model: onnx.ModelProto,
+    remove_node_names: List[str],
+    **kwargs,
+) -> List[ReconnectError]:
+    errors = []
+    for disable_fast_path in [False, True]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with pytest.raises(ReconnectError) as excinfo:
+                remove(
+                    remove_node_names=remove_node_names,
+                    onnx_graph=onnx.ModelProto.FromString(model.SerializeToString()),
+                    disable_fast_path=disable_fast_path,
+                    **kwargs,
+                )
+        errors.append(excinfo.value)
+    return errors
+
+
+@pytest.mark.parametrize('typed_names', [None, ['a']], ids=['untyped', 'typed'])
+@pytest.mark.parametrize('shape_inference', ['none', 'local', 'full'])
+def test_graph_output_with_other_consumers(
+    typed_names: Optional[List[str]],
+    shape_inference: str,
+):
+    # b is a graph output and the input of n3. Deleting n1 would leave n3 without its input.
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['a'], name='n0'),
+            helper.make_node('Identity', ['a'], ['b'], name='n1'),
+            helper.make_node('Neg', ['b'], ['c'], name='n3'),
+        ],
+        ['b', 'c'],
+        typed_names,
+    )
+    fast_path_error, graphsurgeon_error = run_both_paths(model, ['n1'], shape_inference=shape_inference)
+    assert str(fast_path_error) == str(graphsurgeon_error)
+    assert fast_path_error.node_names == graphsurgeon_error.node_names == ['n1', 'n3']
+
+
+def test_output_taken_over_by_previous_op():
+    # n0 takes over b when n1 is deleted, so n4 loses a
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['a'], name='n0'),
+            helper.make_node('Identity', ['a'], ['b'], name='n1'),
+            helper.make_node('Neg', ['b'], ['c'], name='n2'),
+            helper.make_node('Neg', ['a'], ['d'], name='n4'),
+        ],
+        ['c', 'd'],
+    )
+    fast_path_error, graphsurgeon_error = run_both_paths(model, ['n1'])
+    assert str(fast_path_error) == str(graphsurgeon_error)
+    assert fast_path_error.node_names == graphsurgeon_error.node_names == ['n0', 'n4']
+
+
+def test_graph_output_taken_over_by_previous_op():
+    # n0 takes over b when n1 is deleted, so the graph output a is lost
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['a'], name='n0'),
+            helper.make_node('Identity', ['a'], ['b'], name='n1'),
+            helper.make_node('Neg', ['b'], ['c'], name='n2'),
+        ],
+        ['a', 'c'],
+    )
+    fast_path_error, graphsurgeon_error = run_both_paths(model, ['n1'])
+    assert str(fast_path_error) == str(graphsurgeon_error)
+    assert fast_path_error.node_names == graphsurgeon_error.node_names == ['n0']
+
+
+@pytest.mark.parametrize('shape_inference', ['none', 'local', 'full'])
+def test_untyped_new_graph_output(
+    shape_inference: str,
+):
+    # r becomes the graph output, but only y has a type
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['r'], name='relu'),
+            helper.make_node('Identity', ['r'], ['y'], name='id'),
+        ],
+        ['y'],
+    )
+    fast_path_error, graphsurgeon_error = run_both_paths(model, ['id'], shape_inference=shape_inference)
+    assert str(fast_path_error) == str(graphsurgeon_error)
+    assert fast_path_error.node_names == graphsurgeon_error.node_names == ['id']
+
+
+def test_typed_new_graph_output():
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['r'], name='relu'),
+            helper.make_node('Identity', ['r'], ['y'], name='id'),
+        ],
+        ['y'],
+        ['r'],
+    )
+    new_models = []
+    for disable_fast_path in [False, True]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_model = remove(
+                remove_node_names=['id'],
+                onnx_graph=onnx.ModelProto.FromString(model.SerializeToString()),
+                disable_fast_path=disable_fast_path,
+                shape_inference='none',
+            )
+        onnx.checker.check_model(new_model, full_check=True)
+        new_models.append(new_model)
+    assert [graph_output.name for graph_output in new_models[0].graph.output] \
+        == [graph_output.name for graph_output in new_models[1].graph.output] == ['r']
+
+
+def test_shape_override_with_duplicate_names():
+    # Deleting the first OP ahead of a Cast forces the shape of c, which the fast path leaves to onnx_graphsurgeon.
+    # Only the Transpose is selected, even though the Relu has the same name.
+    model = make_model(
+        [
+            helper.make_node('Transpose', ['x'], ['t'], name='dup', perm=[1, 0]),
+            helper.make_node('Cast', ['t'], ['c'], name='cast', to=TensorProto.FLOAT),
+            helper.make_node('Relu', ['c'], ['y'], name='dup'),
+        ],
+        ['y'],
+        ['t', 'c'],
+    )
+    for disable_fast_path in [False, True]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_model = remove(
+                remove_op_types=['Transpose'],
+                onnx_graph=onnx.ModelProto.FromString(model.SerializeToString()),
+                disable_fast_path=disable_fast_path,
+            )
+        assert [node.op_type for node in new_model.graph.node] == ['Cast', 'Relu']
+        assert [graph_output.name for graph_output in new_model.graph.output] == ['y']
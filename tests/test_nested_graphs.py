@@ -0,0 +1,176 @@
+#! /usr/bin/env python
+"""
+Deleting OPs inside If/Loop/Scan bodies and model-local functions,
+and OPs of the main graph whose outputs subgraphs refer to.
+"""
+
+import contextlib
+import io
+from typing import List, Optional
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+from snd4onnx import remove
+
+
+def value_info(
+    name: str,
+    elem_type: int = TensorProto.FLOAT,
+    shape: Optional[List[int]] = None,
+) -> onnx.ValueInfoProto:
+    return helper.make_tensor_value_info(name, elem_type, [2, 3] if shape is None else shape)
+
+
+def make_model(
+    nodes: List[onnx.NodeProto],
+    input_names: List[str],
+    output_names: List[str],
+    **kwargs,
+) -> onnx.ModelProto:
+    """
+    Inputs and outputs are FLOAT [2, 3], except cond, a BOOL scalar.
+    """
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [value_info(name, TensorProto.BOOL, []) if name == 'cond' else value_info(name) for name in input_names],
+        [value_info(name) for name in output_names],
+        initializer=kwargs.pop('initializer', None),
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)], **kwargs)
+    model.ir_version = 10
+    return model
+
+
+def run_remove(
+    model: onnx.ModelProto,
+    remove_node_names: List[str],
+) -> onnx.ModelProto:
+    with contextlib.redirect_stdout(io.StringIO()):
+        new_model = remove(onnx_graph=model, remove_node_names=remove_node_names)
+    onnx.checker.check_model(new_model, full_check=True)
+    return new_model
+
+
+def if_model() -> onnx.ModelProto:
+    then_branch = helper.make_graph(
+        [
+            helper.make_node('Identity', ['b'], ['s'], name='then_identity'),
+            helper.make_node('Neg', ['s'], ['o1'], name='then_neg'),
+        ],
+        'then', [], [value_info('o1')],
+    )
+    else_branch = helper.make_graph(
+        [helper.make_node('Neg', ['b'], ['o2'], name='else_neg')],
+        'else', [], [value_info('o2')],
+    )
+    return make_model(
+        [
+            helper.make_node('Identity', ['x'], ['b'], name='B'),
+            helper.make_node('Relu', ['b'], ['c'], name='C'),
+            helper.make_node('If', ['cond'], ['d'], name='D', then_branch=then_branch, else_branch=else_branch),
+        ],
+        ['x', 'cond'],
+        ['c', 'd'],
+    )
+
+
+def subgraph_node_inputs(
+    model: onnx.ModelProto,
+    attribute_name: str,
+) -> List[List[str]]:
+    attribute = [attribute for attribute in model.graph.node[-1].attribute if attribute.name == attribute_name][0]
+    return [list(node.input) for node in attribute.g.node]
+
+
+def test_remove_in_if_branch():
+    new_model = run_remove(if_model(), ['then_identity'])
+    assert [node.name for node in new_model.graph.node] == ['B', 'C', 'D']
+    assert subgraph_node_inputs(new_model, 'then_branch') == [['b']]
+    assert subgraph_node_inputs(new_model, 'else_branch') == [['b']]
+
+
+def test_outer_reference_rename():
+    # b is replaced by x in the main graph and in both branches that refer to it
+    new_model = run_remove(if_model(), ['B', 'then_identity'])
+    assert [list(node.input) for node in new_model.graph.node] == [['x'], ['cond']]
+    assert subgraph_node_inputs(new_model, 'then_branch') == [['x']]
+    assert subgraph_node_inputs(new_model, 'else_branch') == [['x']]
+
+
+def test_remove_in_loop_body():
+    body = helper.make_graph(
+        [
+            helper.make_node('Identity', ['cond_in'], ['cond_out'], name='cond_identity'),
+            helper.make_node('Identity', ['v_in'], ['v'], name='body_identity'),
+            helper.make_node('Neg', ['v'], ['v_out'], name='body_neg'),
+        ],
+        'body',
+        [value_info('i', TensorProto.INT64, []), value_info('cond_in', TensorProto.BOOL, []), value_info('v_in')],
+        [value_info('cond_out', TensorProto.BOOL, []), value_info('v_out')],
+    )
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['r'], name='relu'),
+            helper.make_node('Loop', ['trip_count', 'cond', 'r'], ['y'], name='loop', body=body),
+        ],
+        ['x', 'cond'],
+        ['y'],
+        initializer=[numpy_helper.from_array(np.array(3, dtype=np.int64), 'trip_count')],
+    )
+    new_model = run_remove(model, ['body_identity'])
+    assert subgraph_node_inputs(new_model, 'body') == [['cond_in'], ['v_in']]
+
+
+def test_remove_in_scan_body():
+    body = helper.make_graph(
+        [
+            helper.make_node('Add', ['sum_in', 'row'], ['s'], name='body_add'),
+            helper.make_node('Identity', ['s'], ['sum_out'], name='body_identity'),
+            helper.make_node('Neg', ['row'], ['neg_row'], name='body_neg'),
+        ],
+        'body',
+        [value_info('sum_in', shape=[3]), value_info('row', shape=[3])],
+        [value_info('sum_out', shape=[3]), value_info('neg_row', shape=[3])],
+    )
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['r'], name='relu'),
+            helper.make_node('Scan', ['init', 'r'], ['total', 'y'], name='scan', body=body, num_scan_inputs=1),
+        ],
+        ['x'],
+        ['y'],
+        initializer=[numpy_helper.from_array(np.zeros([3], dtype=np.float32), 'init')],
+    )
+    model.graph.output.insert(0, value_info('total', shape=[3]))
+    new_model = run_remove(model, ['body_identity'])
+    body = [attribute.g for attribute in new_model.graph.node[-1].attribute if attribute.name == 'body'][0]
+    assert [node.name for node in body.node] == ['body_add', 'body_neg']
+    assert [graph_output.name for graph_output in body.output] == ['s', 'neg_row']
+
+
+def test_remove_in_function():
+    function = helper.make_function(
+        'local',
+        'NegRelu',
+        ['fx'],
+        ['fy'],
+        [
+            helper.make_node('Identity', ['fx'], ['fi'], name='function_identity'),
+            helper.make_node('Neg', ['fi'], ['fn'], name='function_neg'),
+            helper.make_node('Relu', ['fn'], ['fy'], name='function_relu'),
+        ],
+        [helper.make_opsetid('', 17)],
+    )
+    model = make_model(
+        [
+            helper.make_node('Relu', ['x'], ['r'], name='relu'),
+            helper.make_node('NegRelu', ['r'], ['y'], name='call', domain='local'),
+        ],
+        ['x'],
+        ['y'],
+        functions=[function],
+    )
+    model.opset_import.append(helper.make_opsetid('local', 1))
+    new_model = run_remove(model, ['function_identity'])
+    assert [list(node.input) for node in new_model.functions[0].node] == [['fx'], ['fn']]
@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+"""
+prune_model() and merge_duplicate_initializers() on small hand-built graphs.
+"""
+
+import os
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+from snd4onnx.pruning import merge_duplicate_initializers, prune_model
+
+
+def make_model(
+    graph: onnx.GraphProto,
+) -> onnx.ModelProto:
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+    return model
+
+
+def dead_branch_model() -> onnx.ModelProto:
+    # a0 -> a1 -> y is live, d0 -> d1 -> dead and the graph input z are not
+    nodes = [
+        helper.make_node('Add', ['x', 'w'], ['a'], name='a0'),
+        helper.make_node('Mul', ['x', 'dw'], ['d'], name='d0'),
+        helper.make_node('Relu', ['a'], ['y'], name='a1'),
+        helper.make_node('Relu', ['d'], ['dead'], name='d1'),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [
+            helper.make_tensor_value_info('x', TensorProto.FLOAT, [4]),
+            helper.make_tensor_value_info('z', TensorProto.FLOAT, [4]),
+        ],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [4])],
+        initializer=[
+            numpy_helper.from_array(np.ones([4], dtype=np.float32), 'w'),
+            numpy_helper.from_array(np.full([256], 2, dtype=np.float32), 'dw'),
+        ],
+        value_info=[
+            helper.make_tensor_value_info('a', TensorProto.FLOAT, [4]),
+            helper.make_tensor_value_info('d', TensorProto.FLOAT, [4]),
+        ],
+    )
+    return make_model(graph)
+
+
+def test_prune_dead_tensors():
+    model = dead_branch_model()
+    stats = prune_model(model, merge_initializers=False)
+    onnx.checker.check_model(model, full_check=True)
+
+    assert [node.name for node in model.graph.node] == ['a0', 'a1']
+    assert [graph_input.name for graph_input in model.graph.input] == ['x']
+    assert [initializer.name for initializer in model.graph.initializer] == ['w']
+    assert [value_info.name for value_info in model.graph.value_info] == ['a']
+    assert stats.removed_nodes == 2
+    assert stats.removed_graph_inputs == 1
+    assert stats.removed_initializers == 1
+    assert stats.removed_initializer_bytes == 256 * 4
+    assert stats.removed_node_positions == [1, 3]
+
+
+def test_prune_external_initializer_bytes(tmp_path):
+    model_path = os.path.join(tmp_path, 'model.onnx')
+    onnx.save(dead_branch_model(), model_path, save_as_external_data=True, location='model.data', size_threshold=0)
+    model = onnx.load(model_path, load_external_data=False)
+    stats = prune_model(model, merge_initializers=False)
+    # The length of the data in model.data, not the size of the TensorProto that points to it
+    assert stats.removed_initializer_bytes == 256 * 4
+
+
+def test_merge_qdq_scales():
+    # Every QuantizeLinear/DequantizeLinear pair has its own copy of the same scale and zero point
+    nodes = []
+    initializers = []
+    tensor_name = 'x'
+    for i in range(3):
+        initializers.append(numpy_helper.from_array(np.array(0.05, dtype=np.float32), f'scale{i}'))
+        initializers.append(numpy_helper.from_array(np.array(128, dtype=np.uint8), f'zero_point{i}'))
+        nodes.append(helper.make_node('QuantizeLinear', [tensor_name, f'scale{i}', f'zero_point{i}'], [f'q{i}'], name=f'q{i}'))
+        nodes.append(helper.make_node('DequantizeLinear', [f'q{i}', f'scale{i}', f'zero_point{i}'], [f'dq{i}'], name=f'dq{i}'))
+        tensor_name = f'dq{i}'
+    # Same bytes, different shape: not merged
+    initializers.append(numpy_helper.from_array(np.array([0.05], dtype=np.float32), 'scale_1d'))
+    nodes.append(helper.make_node('Mul', [tensor_name, 'scale_1d'], ['y'], name='mul'))
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [1])],
+        initializer=initializers,
+    )
+    model = make_model(graph)
+
+    merged_initializers, merged_initializer_bytes = merge_duplicate_initializers(model)
+    onnx.checker.check_model(model, full_check=True)
+
+    assert merged_initializers == 4
+    assert merged_initializer_bytes == 2 * 4 + 2 * 1
+    assert [initializer.name for initializer in model.graph.initializer] == ['scale0', 'zero_point0', 'scale_1d']
+    for node in model.graph.node[:6]:
+        assert list(node.input[1:]) == ['scale0', 'zero_point0']
+    assert list(model.graph.node[6].input) == ['dq2', 'scale_1d']
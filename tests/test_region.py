@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+"""
+find_region(), check_region_removal(), apply_region_removal() and apply_region_extraction()
+on a small chain of OPs.
+"""
+
+from typing import List, Optional
+import numpy as np
+import onnx
+import pytest
+from onnx import helper, numpy_helper, TensorProto
+from snd4onnx.exceptions import InvalidArgumentError
+from snd4onnx.region import (
+    find_region,
+    check_region_removal,
+    apply_region_removal,
+    apply_region_extraction,
+)
+
+
+def make_model(
+    extra_nodes: Optional[List[onnx.NodeProto]] = None,
+    extra_output_names: Optional[List[str]] = None,
+) -> onnx.ModelProto:
+    """
+    x -> A -> a -> B (+ w) -> b -> C -> c -> D -> y
+    """
+    nodes = [
+        helper.make_node('Relu', ['x'], ['a'], name='A'),
+        helper.make_node('Add', ['a', 'w'], ['b'], name='B'),
+        helper.make_node('Neg', ['b'], ['c'], name='C'),
+        helper.make_node('Relu', ['c'], ['y'], name='D'),
+    ] + list(extra_nodes or [])
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [2, 3])],
+        [helper.make_tensor_value_info(name, TensorProto.FLOAT, [2, 3]) for name in ['y'] + list(extra_output_names or [])],
+        initializer=[numpy_helper.from_array(np.ones([2, 3], dtype=np.float32), 'w')],
+        value_info=[helper.make_tensor_value_info(name, TensorProto.FLOAT, [2, 3]) for name in ['a', 'b', 'c']],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+    return model
+
+
+def test_find_region():
+    region = find_region(make_model().graph, ['a'], ['c'])
+    assert region.node_ids == [1, 2]
+    assert region.graph_input_names == []
+    assert region.initializer_names == {'w'}
+    assert region.escaping_names == []
+
+
+def test_find_open_region():
+    # Without input boundary tensors, the region reaches up to the graph inputs
+    region = find_region(make_model().graph, [], ['b'])
+    assert region.node_ids == [0, 1]
+    assert region.graph_input_names == ['x']
+    assert region.initializer_names == {'w'}
+
+
+def test_find_region_errors():
+    graph = make_model().graph
+    with pytest.raises(InvalidArgumentError):
+        find_region(graph, ['a'], ['missing'])
+    # y is downstream of c, so the traversal from c never reaches it
+    errors = []
+    find_region(graph, ['y'], ['c'], errors)
+    assert len(errors) == 1 and isinstance(errors[0], InvalidArgumentError)
+
+
+def test_escaping_tensor():
+    # E reads b, which is produced inside the region
+    model = make_model([helper.make_node('Neg', ['b'], ['e'], name='E')], ['e'])
+    region = find_region(model.graph, ['a'], ['c'])
+    assert region.escaping_names == ['b']
+    with pytest.raises(InvalidArgumentError):
+        check_region_removal(model.graph, region)
+    errors = []
+    check_region_removal(model.graph, region, errors)
+    assert len(errors) == 1
+
+
+def test_apply_region_removal():
+    model = make_model()
+    region = find_region(model.graph, ['a'], ['c'])
+    check_region_removal(model.graph, region)
+    untyped_names = apply_region_removal(model, region)
+    onnx.checker.check_model(model, full_check=True)
+
+    assert untyped_names == []
+    assert [node.name for node in model.graph.node] == ['A', 'D']
+    # a is no longer read and becomes a graph output, c is no longer produced and becomes a graph input
+    assert [graph_input.name for graph_input in model.graph.input] == ['x', 'c']
+    assert [graph_output.name for graph_output in model.graph.output] == ['y', 'a']
+    assert len(model.graph.initializer) == 0
+    assert [value_info.name for value_info in model.graph.value_info] == []
+
+
+def test_apply_region_extraction():
+    model = make_model()
+    region = find_region(model.graph, ['a'], ['c'])
+    untyped_names = apply_region_extraction(model, region)
+    onnx.checker.check_model(model, full_check=True)
+
+    assert untyped_names == []
+    assert [node.name for node in model.graph.node] == ['B', 'C']
+    assert [graph_input.name for graph_input in model.graph.input] == ['a']
+    assert [graph_output.name for graph_output in model.graph.output] == ['c']
+    assert [initializer.name for initializer in model.graph.initializer] == ['w']
+    assert [value_info.name for value_info in model.graph.value_info] == ['b']
+
+
+def test_apply_open_region_extraction():
+    model = make_model()
+    region = find_region(model.graph, [], ['b'])
+    apply_region_extraction(model, region)
+    onnx.checker.check_model(model, full_check=True)
+
+    assert [node.name for node in model.graph.node] == ['A', 'B']
+    assert [graph_input.name for graph_input in model.graph.input] == ['x']
+    assert [graph_output.name for graph_output in model.graph.output] == ['b']
@@ -0,0 +1,98 @@
+#! /usr/bin/env python
+"""
+RemovalDiff reported by remove(diff_callback=...).
+"""
+
+import contextlib
+import io
+import os
+from typing import List
+import numpy as np
+import onnx
+import pytest
+from onnx import helper, numpy_helper, TensorProto
+from snd4onnx import remove
+from snd4onnx.removal_diff import RemovalDiff, RewiredEdge
+
+
+def value_info(
+    name: str,
+    shape: List[int],
+) -> onnx.ValueInfoProto:
+    return helper.make_tensor_value_info(name, TensorProto.FLOAT, shape)
+
+
+def run_diff(
+    **kwargs,
+) -> RemovalDiff:
+    removal_diffs = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        remove(diff_callback=removal_diffs.append, **kwargs)
+    return removal_diffs[0]
+
+
+@pytest.mark.parametrize('disable_fast_path', [False, True], ids=['fast_path', 'graphsurgeon'])
+def test_removed_external_initializer_bytes(
+    tmp_path,
+    disable_fast_path: bool,
+):
+    nodes = [
+        helper.make_node('Relu', ['x'], ['r'], name='r0'),
+        helper.make_node('Add', ['r', 'w1'], ['a'], name='a1'),
+        helper.make_node('Add', ['a', 'w2'], ['b'], name='a2'),
+        helper.make_node('Relu', ['b'], ['y'], name='r1'),
+    ]
+    initializers = [
+        numpy_helper.from_array(np.full([1000], 1, dtype=np.float32), 'w1'),
+        numpy_helper.from_array(np.full([1000], 2, dtype=np.float32), 'w2'),
+    ]
+    graph = helper.make_graph(nodes, 'test', [value_info('x', [1000])], [value_info('y', [1000])], initializer=initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+    input_onnx_file_path = os.path.join(tmp_path, 'model.onnx')
+    onnx.save(model, input_onnx_file_path, save_as_external_data=True, location='model.data', size_threshold=0)
+
+    removal_diff = run_diff(
+        input_onnx_file_path=input_onnx_file_path,
+        remove_node_names=['a1', 'a2'],
+        disable_fast_path=disable_fast_path,
+    )
+    assert removal_diff.removed_initializer_names == ['w1', 'w2']
+    # The data in model.data, not the size of the TensorProto that points to it
+    assert removal_diff.removed_initializer_bytes == 2 * 1000 * 4
+
+
+def test_subgraph_edges_after_outer_rename():
+    # B is deleted, so b is replaced by x in the main graph and in both branches of D.
+    # si is deleted in the then branch, so then_neg takes b, i.e. x.
+    then_branch = helper.make_graph(
+        [
+            helper.make_node('Identity', ['b'], ['s'], name='si'),
+            helper.make_node('Neg', ['s'], ['o1'], name='then_neg'),
+        ],
+        'then', [], [value_info('o1', [2, 3])],
+    )
+    else_branch = helper.make_graph(
+        [helper.make_node('Neg', ['b'], ['o2'], name='else_neg')],
+        'else', [], [value_info('o2', [2, 3])],
+    )
+    nodes = [
+        helper.make_node('Identity', ['x'], ['b'], name='B'),
+        helper.make_node('Relu', ['b'], ['c'], name='C'),
+        helper.make_node('If', ['cond'], ['d'], name='D', then_branch=then_branch, else_branch=else_branch),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        'test',
+        [value_info('x', [2, 3]), helper.make_tensor_value_info('cond', TensorProto.BOOL, [])],
+        [value_info('c', [2, 3]), value_info('d', [2, 3])],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 10
+
+    removal_diff = run_diff(onnx_graph=model, remove_node_names=['B', 'si'])
+    assert sorted(removal_diff.rewired_edges) == sorted([
+        RewiredEdge('C', 'input', 0, 'b', 'x', ''),
+        RewiredEdge('else_neg', 'input', 0, 'b', 'x', '/D.else_branch'),
+        RewiredEdge('then_neg', 'input', 0, 's', 'x', '/D.then_branch'),
+    ])
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+"""
+The batched removal (plan_removal() + apply_removal_plan()) against the sequential
+one-OP-at-a-time remove() it replaced, on every 1-, 2- and 3-OP combination
+of the OPs of test_model/test*.onnx, in both orders for pairs.
+
+tests/golden/removal_plan.json holds the graphs generated by the sequential remove().
+To regenerate it, run this file with a checkout of the sequential implementation first on PYTHONPATH:
+
+    PYTHONPATH=/path/to/sequential/snd4onnx python tests/test_removal_plan.py
+"""
+
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+from typing import Dict, List, Tuple
+import onnx
+import pytest
+from snd4onnx import remove
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_MODEL_PATHS = sorted(glob.glob(os.path.join(ROOT_DIR, 'test_model', 'test*.onnx')))
+GOLDEN_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'removal_plan.json')
+
+
+def removal_cases() -> List[Tuple[str, List[str]]]:
+    cases = []
+    for model_path in TEST_MODEL_PATHS:
+        model_name = os.path.basename(model_path)
+        node_names = [node.name for node in onnx.load(model_path).graph.node]
+        combinations = [[node_name] for node_name in node_names]
+        for pair in itertools.combinations(node_names, 2):
+            combinations.append(list(pair))
+            combinations.append(list(reversed(pair)))
+        combinations.extend(list(triple) for triple in itertools.combinations(node_names, 3))
+        cases.extend((model_name, combination) for combination in combinations)
+    return cases
+
+
+def case_key(
+    model_name: str,
+    remove_node_names: List[str],
+) -> str:
+    return f'{model_name}:{"|".join(remove_node_names)}'
+
+
+def summarize(
+    model: onnx.ModelProto,
+) -> Dict:
+    """
+    The structure of the main graph: OPs with their connections, graph inputs and outputs with
+    their types, and the initializer names. OPs are sorted, since a topological order is not unique.
+    """
+    def value_info_summary(value_info: onnx.ValueInfoProto) -> List:
+        tensor_type = value_info.type.tensor_type
+        shape = [
+            dim.dim_value if dim.HasField('dim_value') else dim.dim_param or None
+            for dim in tensor_type.shape.dim
+        ] if tensor_type.HasField('shape') else None
+        return [value_info.name, tensor_type.elem_type, shape]
+    graph = model.graph
+    return {
+        'nodes': sorted(
+            [node.name, node.op_type, list(node.input), list(node.output)] for node in graph.node
+        ),
+        'inputs': [value_info_summary(graph_input) for graph_input in graph.input],
+        'outputs': [value_info_summary(graph_output) for graph_output in graph.output],
+        'initializers': sorted(initializer.name for initializer in graph.initializer),
+    }
+
+
+def run_remove(
+    model_name: str,
+    remove_node_names: List[str],
+    **kwargs,
+):
+    """
+    summarize() of the generated model, or 'error' if remove() refused to delete the OPs.
+    """
+    model = onnx.load(os.path.join(ROOT_DIR, 'test_model', model_name))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_model = remove(
+                remove_node_names=remove_node_names,
+                onnx_graph=model,
+                **kwargs,
+            )
+    except (SystemExit, Exception):
+        # The sequential remove() exits, the batched one raises SndError
+        return 'error'
+    return summarize(new_model)
+
+
+def load_golden() -> Dict:
+    with open(GOLDEN_FILE_PATH) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('disable_fast_path', [False, True], ids=['fast_path', 'graphsurgeon'])
+@pytest.mark.parametrize(
+    'model_name, remove_node_names',
+    removal_cases(),
+    ids=[case_key(*case) for case in removal_cases()],
+)
+def test_matches_sequential_remove(
+    model_name: str,
+    remove_node_names: List[str],
+    disable_fast_path: bool,
+):
+    expected = load_golden()[case_key(model_name, remove_node_names)]
+    actual = run_remove(model_name, remove_node_names, disable_fast_path=disable_fast_path)
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    'model_name, remove_node_names',
+    [case for case in removal_cases() if len(case[1]) == 2],
+    ids=[case_key(*case) for case in removal_cases() if len(case[1]) == 2],
+)
+def test_independent_of_order(
+    model_name: str,
+    remove_node_names: List[str],
+):
+    assert run_remove(model_name, remove_node_names) == run_remove(model_name, list(reversed(remove_node_names)))
+
+
+if __name__ == '__main__':
+    golden = {
+        case_key(model_name, remove_node_names): run_remove(model_name, remove_node_names)
+        for model_name, remove_node_names in removal_cases()
+    }
+    with open(GOLDEN_FILE_PATH, 'w') as f:
+        json.dump(golden, f, indent=1, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+"""
+The JSON-lines protocol of serve_stream(), with and without worker processes.
+"""
+
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import pytest
+from snd4onnx.server import serve_stream, _init_worker
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def request_lines(
+    tmp_path,
+) -> List[str]:
+    request = {
+        'input_onnx_file_path': os.path.join(ROOT_DIR, 'test_model', 'test3.onnx'),
+        'output_onnx_file_path': os.path.join(tmp_path, 'out.onnx'),
+        'remove_node_names': ['model/tf.math.multiply/Mul'],
+        'non_verbose': True,
+    }
+    return [
+        json.dumps(dict(request, id='first')),
+        json.dumps(request),
+        '',
+        '[1, 2]',
+        '{"id": ',
+        json.dumps({'unknown_key': 1}),
+    ]
+
+
+def serve_lines(
+    lines: List[str],
+    executor=None,
+) -> Dict:
+    wfile = io.StringIO()
+    serve_stream(io.StringIO(''.join(f'{line}\n' for line in lines)), wfile, executor=executor, max_pending=2)
+    responses = [json.loads(line) for line in wfile.getvalue().splitlines()]
+    return {response['id']: response for response in responses}
+
+
+@pytest.mark.parametrize('num_workers', [0, 2], ids=['serial', 'workers'])
+def test_response_ids(
+    tmp_path,
+    num_workers: int,
+):
+    if num_workers > 0:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker) as executor:
+            responses = serve_lines(request_lines(tmp_path), executor)
+    else:
+        responses = serve_lines(request_lines(tmp_path))
+
+    # The explicit id, then the line numbers of the other lines. The empty line gets no response.
+    assert sorted(responses, key=str) == sorted(['first', 2, 4, 5, 6], key=str)
+    assert responses['first']['success'] and responses[2]['success']
+    assert responses['first']['nodes_before'] - responses['first']['nodes_after'] == 1
+    assert responses[4]['error_type'] == 'ValueError'
+    assert responses[5]['error_type'] == 'JSONDecodeError'
+    assert responses[6]['error_type'] == 'ValueError'
+    assert 'unknown_key' in responses[6]['error']